@@ -0,0 +1,162 @@
+import json
+import os
+import queue
+import threading
+from flask import Response, jsonify, request, stream_with_context
+from change_events import ensure_listener, subscribe
+from db_config import get_db_connection
+from gevent_support import gevent_active
+from metrics import SSE_CONNECTIONS
+
+# GET /api/announcements/stream: server-sent events for announcements that
+# appear ("announcement") or stop being active ("expired"). Each worker
+# turns the change feed into events once, fetching each changed row once,
+# and fans them out to every connected client. A connection waits on its
+# own queue, so under gevent (or asgi_app.py) a client costs a greenlet
+# (or a task). A sync worker would be held by a single client for as long as
+# it stays connected, so there the route answers 503 instead.
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', '15'))
+# Events buffered per client; a client that falls this far behind is dropped
+SSE_CLIENT_BUFFER = int(os.environ.get('SSE_CLIENT_BUFFER', '100'))
+# Reconnect delay suggested to EventSource clients, in milliseconds
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', '3000'))
+
+ANNOUNCEMENT_EVENT_ROW = """
+    SELECT a.*, s.name AS store_name, s.category AS store_category
+    FROM announcements a
+    LEFT JOIN stores s ON a.store_id = s.id
+    WHERE a.id = %s
+"""
+
+_clients = set()
+_clients_lock = threading.Lock()
+_changes = queue.Queue()
+_publisher_pid = None
+
+def format_event(event, data):
+    """One server-sent event; `default=str` covers timestamps and decimals"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+def describe_change(row_id, row):
+    """
+    Event for a changed announcement
+
+    Args:
+        row_id (int): Id from the change notification
+        row (dict): The row as ANNOUNCEMENT_EVENT_ROW returns it, or None if deleted
+
+    Returns:
+        tuple: (event name, data)
+    """
+    if row is not None and row['is_active']:
+        return 'announcement', row
+    data = {"id": row_id}
+    if row is not None:
+        data.update(store_id=row['store_id'], store_category=row['store_category'])
+    return 'expired', data
+
+def wants(filters, data):
+    """
+    Whether a client subscribed with these filters receives an event
+
+    Events for deleted rows carry no store, so they reach every client;
+    expiring an id a client never saw is harmless.
+    """
+    store_id, category = filters
+    if store_id is not None and data.get('store_id', store_id) != store_id:
+        return False
+    if category and data.get('store_category', category) != category:
+        return False
+    return True
+
+class StreamClient:
+    """One connected client: its filters and its queue of formatted events"""
+
+    def __init__(self, filters, events):
+        self.filters = filters
+        self.events = events
+        self.dropped = False
+
+def _broadcast(event, data):
+    message = format_event(event, data)
+    with _clients_lock:
+        clients = list(_clients)
+    for client in clients:
+        if client.dropped or not wants(client.filters, data):
+            continue
+        try:
+            client.events.put_nowait(message)
+        except queue.Full:
+            # Never let one slow reader hold up the others
+            client.dropped = True
+
+def _on_change(table, row_id, operation):
+    if table == 'announcements' and _clients:
+        _changes.put(row_id)
+
+def _publish_forever():
+    while True:
+        row_id = _changes.get()
+        connection = get_db_connection()
+        if not connection:
+            print("Announcement stream: database connection failed")
+            continue
+        try:
+            cursor = connection.cursor()
+            cursor.execute(ANNOUNCEMENT_EVENT_ROW, (row_id,))
+            _broadcast(*describe_change(row_id, cursor.fetchone()))
+        except Exception as e:
+            print(f"Announcement stream error: {e}")
+        finally:
+            connection.close()
+
+def _ensure_publisher():
+    global _publisher_pid
+    # Threads do not survive fork(), so each worker starts its own
+    if _publisher_pid != os.getpid():
+        with _clients_lock:
+            if _publisher_pid != os.getpid():
+                threading.Thread(target=_publish_forever, name='announcement-stream', daemon=True).start()
+                _publisher_pid = os.getpid()
+
+def stream_announcements():
+    """
+    Server-sent events for new and expired announcements
+
+    Query parameters `storeId` and `category` (the store's category) narrow
+    the stream. Needs gevent workers and the PostgreSQL change feed;
+    elsewhere it answers 503 and clients keep polling /api/announcements.
+    """
+    store_id = request.args.get('storeId', type=int)
+    category = request.args.get('category') or None
+
+    if not gevent_active() or not ensure_listener():
+        return jsonify({"status": "error", "message": "Announcement stream is not available"}), 503
+    _ensure_publisher()
+
+    client = StreamClient((store_id, category), queue.Queue(SSE_CLIENT_BUFFER))
+
+    def generate():
+        with _clients_lock:
+            _clients.add(client)
+        SSE_CONNECTIONS.inc()
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while not client.dropped:
+                try:
+                    yield client.events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    # Comment line: keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+        finally:
+            with _clients_lock:
+                _clients.discard(client)
+            SSE_CONNECTIONS.dec()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+subscribe(_on_change)
@@ -1,12 +1,17 @@
 import jwt
-import os
+import bcrypt
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from flask import jsonify
+from gevent_support import run_blocking
+from metrics import track_bcrypt
 
 load_dotenv()
 
-JWT_SECRET = os.getenv('JWT_SECRET', 'your-jwt-secret-key')
+# One secret and one verifier for api/ handlers and app.py's own routes, so a
+# token from either /api/login is accepted by both
+from marketplace import JWT_SECRET, decode_jwt
+
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
 
@@ -30,28 +35,32 @@ def encode_jwt(payload: dict) -> str:
     except Exception as e:
         raise Exception(f"JWT encoding failed: {str(e)}")
 
-def decode_jwt(token: str) -> dict:
+def hash_password(password: str) -> str:
     """
-    Decode a JWT token and return the payload
+    Hash a password with bcrypt
     
     Args:
-        token (str): The JWT token to decode
+        password (str): The plain-text password
         
     Returns:
-        dict: The decoded payload
+        str: The bcrypt hash
+    """
+    with track_bcrypt('hash'):
+        return run_blocking(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def check_password(password: str, password_hash: str) -> bool:
+    """
+    Check a password against a stored bcrypt hash
+    
+    Args:
+        password (str): The plain-text password
+        password_hash (str): The stored bcrypt hash
         
-    Raises:
-        Exception: If token is invalid or expired
+    Returns:
+        bool: True if the password matches
     """
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise Exception("Token has expired")
-    except jwt.InvalidTokenError:
-        raise Exception("Invalid token")
-    except Exception as e:
-        raise Exception(f"JWT decoding failed: {str(e)}")
+    with track_bcrypt('check'):
+        return run_blocking(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
 
 def verify_jwt_token(request):
     """
@@ -0,0 +1,82 @@
+import os
+from db_config import get_db_connection
+
+# ?ids=1,2,3 on the list routes: several rows by id in one query instead of
+# one detail request each (cart and favourites screens)
+BATCH_MAX_IDS = int(os.environ.get('BATCH_MAX_IDS', '100'))
+
+def parse_ids(raw):
+    """
+    Ids from a comma-separated ?ids= value, duplicates dropped
+
+    Returns:
+        list: The ids in request order, or None if any is not an integer
+    """
+    ids = []
+    for item in raw.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            row_id = int(item)
+        except ValueError:
+            return None
+        if row_id not in ids:
+            ids.append(row_id)
+    return ids
+
+def in_request_order(rows, ids):
+    """
+    Rows ordered as their ids were requested
+
+    Args:
+        rows (dict): Rows found, by id
+        ids (list): Requested ids
+
+    Returns:
+        tuple: (rows in request order, ids that were not found)
+    """
+    return [rows[row_id] for row_id in ids if row_id in rows], [row_id for row_id in ids if row_id not in rows]
+
+def load_rows(cursor, ids, held, query):
+    """
+    Rows by id: those already held, the rest in one query
+
+    Args:
+        cursor: Database cursor
+        ids (list): Ids to load
+        held (dict): Rows already found (e.g. in the catalog snapshot), by id
+        query (PreparedStatement): Statement taking the list of ids as `= ANY(%s)`
+
+    Returns:
+        dict: Rows found, by id
+    """
+    rows = dict(held)
+    remaining = [row_id for row_id in ids if row_id not in rows]
+    if remaining:
+        query.execute(cursor, (remaining,))
+        rows.update((row['id'], row) for row in cursor.fetchall())
+    return rows
+
+def fetch_by_ids(ids, held, query):
+    """
+    Rows for a batch lookup: those the catalog snapshot holds, the rest in one query
+
+    Args:
+        ids (list): Requested ids, as parse_ids() returns them
+        held (dict): Rows already found in the catalog snapshot, by id
+        query (PreparedStatement): Statement taking the list of ids as `= ANY(%s)`
+
+    Returns:
+        tuple: (rows in request order, ids that were not found)
+    """
+    rows = held
+    if any(row_id not in held for row_id in ids):
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            raise RuntimeError("Database connection failed")
+        try:
+            rows = load_rows(connection.cursor(), ids, held, query)
+        finally:
+            connection.close()
+    return in_request_order(rows, ids)
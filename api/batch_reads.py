@@ -0,0 +1,224 @@
+import math
+import os
+from flask import request, jsonify
+from auth_utils import require_jwt_auth
+from batch_lookup import BATCH_MAX_IDS, in_request_order, load_rows
+from catalog_snapshot import product_details, store_details
+from db_config import get_db_connection
+from get_announcements import ANNOUNCEMENTS_QUERY
+from get_jobs import JOBS_QUERY
+from get_products import PRODUCTS_QUERY
+from get_services import SERVICES_QUERY
+from get_stores import STORES_QUERY
+from prepared_statements import LISTING_DETAILS, PRODUCT_DETAILS, STORE_DETAILS, execute_prepared
+
+# POST /api/batch: many small reads in one request (the admin dashboard).
+#   {"queries": [{"resource": "products", "ids": [3, 1]},
+#                {"resource": "stores", "filters": {"category": "food"}, "limit": 5}]}
+# Id lookups are collected from every sub-query first and loaded
+# DataLoader-style: each id once, one `= ANY(%s)` statement per table.
+# Filtered sub-queries run their list route's ListQuery. Results come back
+# in query order.
+BATCH_MAX_QUERIES = int(os.environ.get('BATCH_MAX_QUERIES', '20'))
+BATCH_PAGE_SIZE = 20
+BATCH_MAX_PAGE_SIZE = 100
+
+# Filter values as the list routes read them from the query string
+# (storeId and ownerId as ids, prices as floats); others are strings
+FILTER_TYPES = {
+    'store_id': int,
+    'owner_id': int,
+    'min_price': float,
+    'max_price': float,
+    'active_only': bool,
+}
+_TYPE_NAMES = {int: 'an integer', float: 'a number', bool: 'true or false', str: 'a string'}
+
+def _nothing_held(ids):
+    return {}
+
+# resource -> (list query, rows held by the catalog snapshot, by-id statement)
+RESOURCES = {
+    'products': (PRODUCTS_QUERY, product_details, PRODUCT_DETAILS),
+    'stores': (STORES_QUERY, store_details, STORE_DETAILS),
+    'services': (SERVICES_QUERY, _nothing_held, LISTING_DETAILS['services']),
+    'jobs': (JOBS_QUERY, _nothing_held, LISTING_DETAILS['jobs']),
+    'announcements': (ANNOUNCEMENTS_QUERY, _nothing_held, LISTING_DETAILS['announcements']),
+}
+
+class IdLoader:
+    """
+    Id lookups of a batch, coalesced per table
+
+    load() only records ids; dispatch() then loads every recorded id not
+    loaded yet with one statement per table, and get() reads the results.
+    """
+
+    def __init__(self):
+        self.wanted = {}
+        self.rows = {}
+
+    def load(self, resource, ids):
+        self.wanted.setdefault(resource, {}).update(dict.fromkeys(ids))
+
+    def dispatch(self, cursor):
+        for resource, ids in self.wanted.items():
+            rows = self.rows.setdefault(resource, {})
+            pending = [row_id for row_id in ids if row_id not in rows]
+            if pending:
+                _, held, query = RESOURCES[resource]
+                rows.update(load_rows(cursor, pending, held(pending), query))
+        self.wanted = {}
+
+    def get(self, resource, ids):
+        """(rows in the order of `ids`, ids that were not found)"""
+        return in_request_order(self.rows.get(resource, {}), ids)
+
+def _coerce(name, value):
+    """A filter value as FILTER_TYPES has it, or ValueError with the message for the client"""
+    kind = FILTER_TYPES.get(name, str)
+    if isinstance(value, kind) and (kind is bool or not isinstance(value, bool)):
+        if kind is not float or math.isfinite(value):
+            return value
+    elif kind in (int, float) and isinstance(value, (str, int)) and not isinstance(value, bool):
+        # Numbers sent as strings, as in the query string
+        try:
+            value = kind(value)
+            if kind is int or math.isfinite(value):
+                return value
+        except ValueError:
+            pass
+    raise ValueError(f"filter {name} must be {_TYPE_NAMES[kind]}")
+
+def parse_query(query):
+    """
+    Validate one sub-query of a batch
+
+    Returns:
+        dict: resource, and either ids (unique, in order) or the list
+        query's filters, sort, after and limit
+
+    Raises:
+        ValueError: With the message for the client
+    """
+    if not isinstance(query, dict) or query.get('resource') not in RESOURCES:
+        raise ValueError(f"resource must be one of: {', '.join(RESOURCES)}")
+    resource = query['resource']
+    if 'ids' in query:
+        ids = query['ids']
+        if 'filters' in query or not isinstance(ids, list) or not all(
+                isinstance(row_id, int) and not isinstance(row_id, bool) for row_id in ids):
+            raise ValueError("ids must be a list of integers, without filters")
+        ids = list(dict.fromkeys(ids))
+        if len(ids) > BATCH_MAX_IDS:
+            raise ValueError(f"At most {BATCH_MAX_IDS} ids per query")
+        return {'resource': resource, 'ids': ids}
+
+    list_query = RESOURCES[resource][0]
+    filters = query.get('filters') or {}
+    if not isinstance(filters, dict):
+        raise ValueError("filters must be an object")
+    for f in list_query.filters:
+        value = filters.get(f.name)
+        if value is None:
+            continue
+        if isinstance(value, dict) or isinstance(value, list) != f.many:
+            raise ValueError(f"filter {f.name} must be {'a list' if f.many else 'a single value'}")
+        filters[f.name] = [_coerce(f.name, item) for item in value] if f.many else _coerce(f.name, value)
+    unknown = set(filters) - {f.name for f in list_query.filters}
+    if unknown:
+        raise ValueError(f"Unknown filters for {resource}: {', '.join(sorted(unknown))}")
+    filters.setdefault('active_only', True)
+
+    sort = query.get('sort', list_query.default_sort)
+    if sort != list_query.default_sort and sort not in list_query.sorts:
+        raise ValueError(f"Unknown sort for {resource}")
+    after = None
+    if query.get('cursor'):
+        after = list_query.parse_cursor(query['cursor'], sort) if list_query.sorts else None
+        if after is None:
+            raise ValueError("Invalid cursor")
+    limit = query.get('limit', BATCH_PAGE_SIZE)
+    if not isinstance(limit, int) or not 1 <= limit <= BATCH_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {BATCH_MAX_PAGE_SIZE}")
+    return {'resource': resource, 'filters': filters, 'sort': sort, 'after': after, 'limit': limit}
+
+def _list(cursor, query):
+    list_query = RESOURCES[query['resource']][0]
+    sql, params = list_query.build(limit=query['limit'], sort=query['sort'], after=query['after'], **query['filters'])
+    execute_prepared(cursor, sql, params)
+    rows = cursor.fetchall()
+    result = {"resource": query['resource'], "data": rows, "count": len(rows)}
+    if list_query.sorts:
+        full = len(rows) == query['limit']
+        result["next"] = list_query.cursor_for(rows[-1], query['sort']) if full else None
+    return result
+
+def run_batch(data):
+    """
+    Body and status of POST /api/batch (also served by asgi_app.py)
+
+    Args:
+        data (dict): The request's JSON body
+
+    Returns:
+        tuple: (response body, HTTP status)
+    """
+    queries = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries:
+        return {"status": "error", "message": "queries must be a non-empty list"}, 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return {"status": "error", "message": f"At most {BATCH_MAX_QUERIES} queries per batch"}, 400
+    try:
+        queries = [parse_query(query) for query in queries]
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+
+    connection = get_db_connection(read_only=True)
+    if not connection:
+        return {"status": "error", "message": "Database connection failed"}, 500
+
+    try:
+        cursor = connection.cursor()
+        loader = IdLoader()
+        for query in queries:
+            if 'ids' in query:
+                loader.load(query['resource'], query['ids'])
+        loader.dispatch(cursor)
+
+        results = []
+        for query in queries:
+            if 'ids' in query:
+                rows, missing = loader.get(query['resource'], query['ids'])
+                results.append({"resource": query['resource'], "data": rows, "count": len(rows), "missing": missing})
+            else:
+                results.append(_list(cursor, query))
+
+        return {
+            "status": "success",
+            "message": "Batch retrieved successfully",
+            "data": results,
+            "count": len(results)
+        }, 200
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}, 500
+    finally:
+        connection.close()
+
+def batch_read():
+    """
+    Run a list of read sub-queries in one request
+
+    Each sub-query names a resource (products, stores, services, jobs,
+    announcements) and either "ids", or "filters" (the names its list
+    query takes, e.g. store_id, categories, min_price), "sort", "cursor"
+    and "limit". Id results keep the requested order and report the ids
+    not found in "missing"; sortable list results carry a "next" cursor.
+    """
+    payload, error_response = require_jwt_auth(request)
+    if error_response:
+        return error_response
+
+    body, status = run_batch(request.get_json(silent=True) or {})
+    return jsonify(body), status
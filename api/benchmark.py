@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Load-test and benchmark suite for the Bayt AlSudani API
+
+Runs weighted scenarios (browse feed, search, store detail, login burst,
+merchant edits) from concurrent virtual users against a running server
+(app.py or api/main_server.py) and reports p50/p95/p99 latency and
+throughput per request. Results can be saved as a baseline and later runs
+compared against it, failing when latency or throughput regress.
+
+Usage:
+    python benchmark.py --users 20 --iterations 50
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.15
+    python benchmark.py --statements --iterations 2000
+    python benchmark.py --compare-workers sync,gevent --users 50
+
+--compare-workers starts app.py under gunicorn once per worker class on
+--port and runs the catalog scenarios (browse_feed, search, unless
+--scenarios says otherwise) against each, then prints throughput side by side.
+
+--statements skips HTTP and times the hot SQL statements directly against
+DATABASE_URL, once as plain statements and once as server-side prepared
+statements, to show what PREPARE saves per execution.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuration
+BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:5000')
+BENCH_USERNAME = os.environ.get('BENCH_USERNAME', 'admin')
+BENCH_PASSWORD = os.environ.get('BENCH_PASSWORD', 'admin')
+
+CATEGORIES = ['مطاعم', 'ملابس', 'إلكترونيات', 'بقالة', 'عطور', 'Electronics']
+LOCATIONS = ['الخرطوم', 'أم درمان', 'بحري', 'Khartoum']
+
+class Recorder:
+    """Thread-safe collection of request timings keyed by request name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, name, elapsed, ok):
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+class VirtualUser:
+    """One simulated client with its own HTTP session and random stream"""
+
+    def __init__(self, base_url, recorder, fixtures, seed):
+        self.base_url = base_url
+        self.recorder = recorder
+        self.fixtures = fixtures
+        self.random = random.Random(seed)
+        self.session = requests.Session()
+        self.session.headers['Content-Type'] = 'application/json'
+        if fixtures.get('token'):
+            self.session.headers['Authorization'] = f"Bearer {fixtures['token']}"
+
+    def request(self, name, method, path, **kwargs):
+        started = time.perf_counter()
+        ok = False
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=30, **kwargs)
+            # Drain the body so transfer time is part of the measurement
+            response.content
+            ok = response.status_code < 400
+        except requests.RequestException:
+            pass
+        self.recorder.record(name, time.perf_counter() - started, ok)
+
+# Scenarios
+def browse_feed(user):
+    """Home screen: latest announcements, products and stores"""
+    user.request('GET /api/announcements', 'GET', '/api/announcements')
+    user.request('GET /api/products', 'GET', '/api/products', params={'limit': 20})
+    user.request('GET /api/stores', 'GET', '/api/stores')
+
+def search(user):
+    """Category and location filters"""
+    user.request('GET /api/products?category', 'GET', '/api/products',
+                 params={'category': user.random.choice(CATEGORIES), 'limit': 20})
+    user.request('GET /api/jobs?location', 'GET', '/api/jobs',
+                 params={'location': user.random.choice(LOCATIONS)})
+
+def store_detail(user):
+    """Open a store page"""
+    store_ids = user.fixtures.get('store_ids') or [1]
+    store_id = user.random.choice(store_ids)
+    user.request('GET /api/stores/<id>', 'GET', f'/api/stores/{store_id}')
+
+def login_burst(user):
+    """Repeated logins, dominated by bcrypt"""
+    user.request('POST /api/login', 'POST', '/api/login',
+                 json={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})
+
+def merchant_edits(user):
+    """Merchant updating product prices"""
+    product_ids = user.fixtures.get('product_ids')
+    if not product_ids:
+        return
+    product_id = user.random.choice(product_ids)
+    price = round(user.random.uniform(100, 5000), 2)
+    user.request('PUT /api/products/<id>', 'PUT', f'/api/products/{product_id}',
+                 json={'price': price})
+
+SCENARIOS = {
+    'browse_feed': (browse_feed, 50),
+    'search': (search, 25),
+    'store_detail': (store_detail, 15),
+    'login_burst': (login_burst, 5),
+    'merchant_edits': (merchant_edits, 5),
+}
+
+# Read-only catalog traffic, used when comparing worker classes
+CATALOG_SCENARIOS = ['browse_feed', 'search']
+
+def load_fixtures(base_url):
+    """Log in once and collect ids the scenarios pick from"""
+    fixtures = {}
+    session = requests.Session()
+    try:
+        response = session.post(f"{base_url}/api/login",
+                                json={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}, timeout=30)
+    except requests.RequestException as e:
+        sys.exit(f"Cannot reach {base_url}: {e}")
+    if response.status_code == 200:
+        fixtures['token'] = response.json().get('token')
+        session.headers['Authorization'] = f"Bearer {fixtures['token']}"
+    else:
+        print(f"Warning: login as {BENCH_USERNAME} failed ({response.status_code}); running unauthenticated")
+
+    for resource, key in (('stores', 'store_ids'), ('products', 'product_ids')):
+        try:
+            body = session.get(f"{base_url}/api/{resource}", timeout=30).json()
+        except (requests.RequestException, ValueError):
+            continue
+        # app.py returns {"stores": [...]}, api/main_server.py returns {"data": [...]}
+        rows = body.get(resource) or body.get('data') or []
+        fixtures[key] = sorted(row['id'] for row in rows if isinstance(row, dict) and 'id' in row)
+    return fixtures
+
+def run_user(base_url, recorder, fixtures, scenarios, iterations, seed):
+    user = VirtualUser(base_url, recorder, fixtures, seed)
+    names = list(scenarios)
+    weights = [scenarios[name][1] for name in names]
+    for _ in range(iterations):
+        name = user.random.choices(names, weights)[0]
+        scenarios[name][0](user)
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(recorder, wall_time):
+    results = {}
+    for name, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        results[name] = {
+            'count': len(ordered),
+            'errors': recorder.errors.get(name, 0),
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 2),
+            'p50_ms': round(percentile(ordered, 50) * 1000, 2),
+            'p95_ms': round(percentile(ordered, 95) * 1000, 2),
+            'p99_ms': round(percentile(ordered, 99) * 1000, 2),
+            'throughput_rps': round(len(ordered) / wall_time, 2) if wall_time else 0.0,
+        }
+    return results
+
+def run_benchmark(base_url, scenarios, users, iterations, seed, warmup=0):
+    """
+    Run the selected scenarios with concurrent virtual users
+
+    Args:
+        base_url (str): Server under test
+        scenarios (dict): Scenario name -> (function, weight)
+        users (int): Number of concurrent virtual users
+        iterations (int): Scenario runs per virtual user
+        seed (int): Seed for scenario and id selection
+        warmup (int): Untimed scenario runs per user before measuring
+
+    Returns:
+        dict: Per-request latency percentiles and throughput, plus run settings
+    """
+    fixtures = load_fixtures(base_url)
+
+    if warmup:
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            for i in range(users):
+                executor.submit(run_user, base_url, Recorder(), fixtures, scenarios, warmup, seed - i - 1)
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        futures = [
+            executor.submit(run_user, base_url, recorder, fixtures, scenarios, iterations, seed + i)
+            for i in range(users)
+        ]
+        for future in futures:
+            future.result()
+    wall_time = time.perf_counter() - started
+
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        'settings': {
+            'base_url': base_url,
+            'scenarios': sorted(scenarios),
+            'users': users,
+            'iterations': iterations,
+            'seed': seed,
+        },
+        'wall_time_s': round(wall_time, 2),
+        'total_requests': total,
+        'total_throughput_rps': round(total / wall_time, 2) if wall_time else 0.0,
+        'requests': summarize(recorder, wall_time),
+    }
+
+def print_report(report):
+    print(f"\n{'request':34} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    print("-" * 90)
+    for name, stats in report['requests'].items():
+        print(f"{name:34} {stats['count']:>7} {stats['errors']:>7} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['throughput_rps']:>9}")
+    print("-" * 90)
+    print(f"{report['total_requests']} requests in {report['wall_time_s']}s "
+          f"({report['total_throughput_rps']} req/s)")
+
+def compare_to_baseline(report, baseline, tolerance):
+    """
+    Compare a run against a stored baseline
+
+    Returns:
+        list: Human-readable descriptions of every regression found
+    """
+    regressions = []
+    for name, base in baseline.get('requests', {}).items():
+        current = report['requests'].get(name)
+        if not current:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current['errors'] > base['errors']:
+            regressions.append(f"{name}: errors {base['errors']} -> {current['errors']}")
+    return regressions
+
+def benchmark_statements(iterations, warmup):
+    """
+    Time the hot statements plain vs. prepared on one pooled connection
+
+    Args:
+        iterations (int): Timed executions per statement and mode
+        warmup (int): Untimed executions per statement and mode
+
+    Returns:
+        dict: Statement name -> plain and prepared p50/p95 plus the p50 reduction
+    """
+    from db_config import get_backend, get_db_connection
+    from prepared_statements import PRODUCT_DETAIL, STORE_OWNER, USER_BY_USERNAME
+
+    connection = get_db_connection()
+    if not connection:
+        sys.exit("Database connection failed")
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT id FROM stores ORDER BY id LIMIT 1")
+        store = cursor.fetchone()
+        cursor.execute("SELECT id FROM products ORDER BY id LIMIT 1")
+        product = cursor.fetchone()
+        cases = [
+            (USER_BY_USERNAME, (BENCH_USERNAME,)),
+            (STORE_OWNER, (store['id'] if store else 1,)),
+            (PRODUCT_DETAIL, (product['id'] if product else 1,)),
+        ]
+
+        def plain(prepared, params):
+            cursor.execute(prepared.sql, params)
+
+        def by_name(prepared, params):
+            prepared.execute(cursor, params)
+
+        results = {}
+        for prepared, params in cases:
+            timings = {}
+            for mode, run in (('plain', plain), ('prepared', by_name)):
+                samples = []
+                for i in range(warmup + iterations):
+                    started = time.perf_counter()
+                    run(prepared, params)
+                    cursor.fetchall()
+                    if i >= warmup:
+                        samples.append(time.perf_counter() - started)
+                connection.rollback()
+                samples.sort()
+                timings[mode] = samples
+            plain_p50 = percentile(timings['plain'], 50)
+            prepared_p50 = percentile(timings['prepared'], 50)
+            results[prepared.name] = {
+                'plain_p50_ms': round(plain_p50 * 1000, 3),
+                'plain_p95_ms': round(percentile(timings['plain'], 95) * 1000, 3),
+                'prepared_p50_ms': round(prepared_p50 * 1000, 3),
+                'prepared_p95_ms': round(percentile(timings['prepared'], 95) * 1000, 3),
+                'p50_reduction_pct': round((1 - prepared_p50 / plain_p50) * 100, 1) if plain_p50 else 0.0,
+            }
+        cursor.close()
+    finally:
+        connection.close()
+
+    return {
+        'settings': {'backend': get_backend().name, 'iterations': iterations},
+        'statements': results,
+    }
+
+def print_statement_report(report):
+    print(f"\nbackend: {report['settings']['backend']}")
+    print(f"{'statement':20} {'plain p50':>10} {'plain p95':>10} {'prep p50':>10} {'prep p95':>10} {'p50 saved':>10}")
+    print("-" * 75)
+    for name, stats in report['statements'].items():
+        print(f"{name:20} {stats['plain_p50_ms']:>10} {stats['plain_p95_ms']:>10} {stats['prepared_p50_ms']:>10} "
+              f"{stats['prepared_p95_ms']:>10} {stats['p50_reduction_pct']:>9}%")
+
+def spawn_server(worker_class, port, workers):
+    """Start app.py under gunicorn with the given worker class and wait until it answers"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_WORKERS=str(workers))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', 'main:app'],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"gunicorn ({worker_class}) exited with status {process.returncode}")
+        try:
+            requests.get(f"http://127.0.0.1:{port}/api/health", timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"gunicorn ({worker_class}) did not start within 30s")
+
+def compare_worker_classes(worker_classes, port, workers, scenarios, users, iterations, seed, warmup):
+    """
+    Benchmark the same scenarios against a fresh server per worker class
+
+    Returns:
+        dict: Worker class -> benchmark report
+    """
+    reports = {}
+    for worker_class in worker_classes:
+        process = spawn_server(worker_class, port, workers)
+        try:
+            reports[worker_class] = run_benchmark(f"http://127.0.0.1:{port}", scenarios,
+                                                  users, iterations, seed, warmup)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    return reports
+
+def print_worker_comparison(reports):
+    names = sorted({name for report in reports.values() for name in report['requests']})
+    classes = list(reports)
+    header = f"{'request':34}" + "".join(f" {c + ' p95':>14} {c + ' req/s':>14}" for c in classes)
+    print("\n" + header)
+    print("-" * len(header))
+    for name in names:
+        line = f"{name:34}"
+        for worker_class in classes:
+            stats = reports[worker_class]['requests'].get(name, {})
+            line += f" {stats.get('p95_ms', '-'):>14} {stats.get('throughput_rps', '-'):>14}"
+        print(line)
+    print("-" * len(header))
+    for worker_class in classes:
+        report = reports[worker_class]
+        errors = sum(stats['errors'] for stats in report['requests'].values())
+        print(f"{worker_class:>8}: {report['total_throughput_rps']} req/s total, {errors} errors")
+
+def main():
+    parser = argparse.ArgumentParser(description="Bayt AlSudani API benchmark")
+    parser.add_argument('--base-url', default=BASE_URL)
+    parser.add_argument('--scenarios',
+                        help=f"Comma-separated subset of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--users', type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument('--iterations', type=int, default=50, help="Scenario runs per user")
+    parser.add_argument('--warmup', type=int, default=5, help="Untimed scenario runs per user")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--json', help="Write the report to this file")
+    parser.add_argument('--baseline', help="Compare against this baseline report")
+    parser.add_argument('--save-baseline', help="Save this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="Allowed relative p95/throughput regression (default 0.15)")
+    parser.add_argument('--statements', action='store_true',
+                        help="Time the hot SQL statements plain vs. prepared against DATABASE_URL")
+    parser.add_argument('--compare-workers', metavar='CLASSES',
+                        help="Comma-separated gunicorn worker classes to compare, e.g. sync,gevent")
+    parser.add_argument('--port', type=int, default=5099, help="Port for servers started by --compare-workers")
+    parser.add_argument('--gunicorn-workers', type=int, default=1, help="Worker processes per compared server")
+    args = parser.parse_args()
+
+    if args.statements:
+        report = benchmark_statements(args.iterations, args.warmup)
+        print_statement_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        return
+
+    if args.scenarios:
+        names = args.scenarios.split(',')
+    else:
+        names = CATALOG_SCENARIOS if args.compare_workers else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    scenarios = {name: SCENARIOS[name] for name in names}
+
+    if args.compare_workers:
+        reports = compare_worker_classes(args.compare_workers.split(','), args.port, args.gunicorn_workers,
+                                         scenarios, args.users, args.iterations, args.seed, args.warmup)
+        print_worker_comparison(reports)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(reports, f, indent=2, ensure_ascii=False)
+        return
+
+    report = run_benchmark(args.base_url, scenarios, args.users, args.iterations, args.seed, args.warmup)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,505 @@
+import datetime
+import os
+import threading
+import time
+from change_events import ensure_listener, subscribe
+from db_config import get_db_connection, reads_from_primary
+from metrics import CATALOG_SNAPSHOT_READS, CATALOG_SNAPSHOT_REFRESHES
+
+# Optional mode: each worker keeps the active catalog in memory and answers
+# the list and detail routes from it. The snapshot is rebuilt in the
+# background from the change feed (change_events), so it needs PostgreSQL;
+# whenever it cannot be trusted the routes fall back to SQL.
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', 'false').lower() == 'true'
+# Longest start_catalog_snapshot() waits for the first load
+CATALOG_SNAPSHOT_LOAD_TIMEOUT = float(os.environ.get('CATALOG_SNAPSHOT_LOAD_TIMEOUT', '10'))
+
+LISTINGS = ('products', 'services', 'jobs', 'announcements')
+CATALOG_TABLES = ('stores',) + LISTINGS
+# Tables whose list routes filter by category
+CATEGORY_TABLES = ('stores', 'products', 'services')
+
+_snapshot = None
+_stale = True
+_loaded = threading.Event()
+_pending = {}
+_full_reload = False
+_wake = threading.Event()
+_state_lock = threading.Lock()
+_refresher_pid = None
+
+def _order(row):
+    # ORDER BY created_at DESC puts NULLs first; id breaks ties
+    return (row['created_at'] is None, row['created_at'] or datetime.datetime.min, row['id'])
+
+def _newest_first(rows):
+    return tuple(sorted(rows, key=_order, reverse=True))
+
+def _index(rows, column):
+    index = {}
+    for row in rows:
+        index.setdefault(row[column], []).append(row)
+    return {key: tuple(group) for key, group in index.items()}
+
+def _position(rows, row):
+    """Where `row` belongs in newest-first `rows` (binary search on its order)"""
+    key = _order(row)
+    low, high = 0, len(rows)
+    while low < high:
+        middle = (low + high) // 2
+        if _order(rows[middle]) > key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def _removed(rows, row):
+    """`rows` without the row with row's id, found at row's place in the order"""
+    i = _position(rows, row)
+    if i < len(rows) and rows[i]['id'] == row['id']:
+        return rows[:i] + rows[i + 1:]
+    return rows
+
+def _inserted(rows, row):
+    i = _position(rows, row)
+    return rows[:i] + (row,) + rows[i:]
+
+def _index_removed(index, key, row):
+    group = _removed(index.get(key, ()), row)
+    if group:
+        index[key] = group
+    else:
+        index.pop(key, None)
+
+def _index_inserted(index, key, row):
+    index[key] = _inserted(index.get(key, ()), row)
+
+def _join_listing(row, stores):
+    store = stores.get(row['store_id'], {})
+    return dict(row, store_name=store.get('name'), store_category=store.get('category'))
+
+def _join_store(store, owners):
+    owner = owners.get(store['owner_id'], {})
+    return dict(store, owner_name=owner.get('username'), owner_full_name=owner.get('full_name'))
+
+class CatalogSnapshot:
+    """
+    Immutable, indexed copy of the catalog
+
+    Holds every store (list rows of other tables join to inactive stores
+    too), the active products, services, jobs and announcements, and the
+    users who own stores. List rows are pre-joined and kept newest first,
+    globally and per store, category and owner. A change produces a new
+    snapshot, so readers never see one half-updated; updated() builds it
+    from the changed rows only, sharing every untouched index.
+    """
+
+    def __init__(self, rows, owners):
+        self.rows = rows
+        self.owners = owners
+        stores = rows['stores']
+
+        self.listings = {}
+        for table in LISTINGS:
+            self.listings[table] = _newest_first(_join_listing(row, stores) for row in rows[table].values())
+        self.listings['stores'] = _newest_first(
+            _join_store(store, owners) for store in stores.values() if store['is_active']
+        )
+
+        self.by_store = {table: _index(self.listings[table], 'store_id') for table in LISTINGS}
+        self.by_category = {
+            table: _index(self.listings[table], 'category') for table in CATEGORY_TABLES
+        }
+        self.by_owner = _index(self.listings['stores'], 'owner_id')
+        self.plain = {
+            table: tuple(rows[table][row['id']] for row in self.listings[table]) for table in CATALOG_TABLES
+        }
+
+    def updated(self, changed, owners):
+        """
+        New snapshot with some rows replaced
+
+        Each changed row is taken out of, and put back into, only the
+        ordered tuples it belongs to (by binary search on its order); every
+        other table, store, category and owner index is shared.
+
+        Args:
+            changed (dict): Per table, {id: row} for the changed rows, with
+                None for rows deleted or (listings) no longer active
+            owners (dict): Store owners after the change, by id
+
+        Returns:
+            CatalogSnapshot: The new snapshot
+        """
+        snapshot = object.__new__(CatalogSnapshot)
+        snapshot.rows = dict(self.rows)
+        snapshot.owners = owners
+        snapshot.listings = dict(self.listings)
+        snapshot.plain = dict(self.plain)
+        snapshot.by_store = dict(self.by_store)
+        snapshot.by_category = dict(self.by_category)
+        snapshot.by_owner = self.by_owner
+        snapshot._owned = set()
+        for table, rows in changed.items():
+            if rows:
+                snapshot.rows[table] = dict(self.rows[table])
+                snapshot.rows[table].update(rows)
+                for row_id, row in rows.items():
+                    if row is None:
+                        del snapshot.rows[table][row_id]
+
+        stores = snapshot.rows['stores']
+        # Listings first, so a store's rejoin below only sees current rows
+        for table in LISTINGS:
+            for row_id in changed.get(table, {}):
+                old, new = self.rows[table].get(row_id), snapshot.rows[table].get(row_id)
+                snapshot._replace_listing(table, old, new and _join_listing(new, stores))
+
+        for store_id in changed.get('stores', {}):
+            old, new = self.rows['stores'].get(store_id), stores.get(store_id)
+            snapshot._replace_store(old, new)
+            if old is None or new is None or (old['name'], old['category']) != (new['name'], new['category']):
+                snapshot._rejoin_listings(store_id)
+
+        # Unchanged owners are the same row objects as in self.owners
+        for owner_id, owner in owners.items():
+            if self.owners.get(owner_id) is not owner:
+                for store in snapshot.by_owner.get(owner_id, ()):
+                    snapshot._replace_store(stores[store['id']], stores[store['id']])
+        del snapshot._owned
+        return snapshot
+
+    def _own(self, attribute, table=None):
+        # Copy an index before its first change in this snapshot
+        index = getattr(self, attribute)
+        if (attribute, table) not in self._owned:
+            self._owned.add((attribute, table))
+            if table is None:
+                index = dict(index)
+                setattr(self, attribute, index)
+            else:
+                index[table] = dict(index[table])
+        return index if table is None else index[table]
+
+    def _replace_row(self, table, old, new, raw):
+        # old: any version of the row (only its order and id are used) or
+        # None; new: the joined row or None; raw: new's row for self.plain
+        listings, plain = self.listings[table], self.plain[table]
+        if old is not None:
+            listings, plain = _removed(listings, old), _removed(plain, old)
+        if new is not None:
+            listings, plain = _inserted(listings, new), _inserted(plain, raw)
+        self.listings[table], self.plain[table] = listings, plain
+
+    def _replace_listing(self, table, old, new):
+        if old is not None:
+            _index_removed(self._own('by_store', table), old['store_id'], old)
+            if table in CATEGORY_TABLES:
+                _index_removed(self._own('by_category', table), old['category'], old)
+        raw = None
+        if new is not None:
+            raw = self.rows[table][new['id']]
+            _index_inserted(self._own('by_store', table), new['store_id'], new)
+            if table in CATEGORY_TABLES:
+                _index_inserted(self._own('by_category', table), new['category'], new)
+        self._replace_row(table, old, new, raw)
+
+    def _replace_store(self, old, new):
+        # Only active stores are listed
+        old = old if old is not None and old['is_active'] else None
+        new = _join_store(new, self.owners) if new is not None and new['is_active'] else None
+        if old is not None:
+            _index_removed(self._own('by_category', 'stores'), old['category'], old)
+            _index_removed(self._own('by_owner'), old['owner_id'], old)
+        if new is not None:
+            _index_inserted(self._own('by_category', 'stores'), new['category'], new)
+            _index_inserted(self._own('by_owner'), new['owner_id'], new)
+        self._replace_row('stores', old, new, new and self.rows['stores'][new['id']])
+
+    def _rejoin_listings(self, store_id):
+        # The store's name or category changed: its listings carry both. Their
+        # order and plain rows stay as they are, so this is one pass per tuple
+        stores = self.rows['stores']
+        for table in LISTINGS:
+            group = self.by_store[table].get(store_id, ())
+            if not group:
+                continue
+            joined = {row['id']: _join_listing(self.rows[table][row['id']], stores) for row in group}
+
+            def rejoin(rows):
+                return tuple(joined.get(row['id'], row) for row in rows)
+
+            self.listings[table] = rejoin(self.listings[table])
+            self._own('by_store', table)[store_id] = rejoin(group)
+            if table in CATEGORY_TABLES:
+                by_category = self._own('by_category', table)
+                for category in {row['category'] for row in group}:
+                    by_category[category] = rejoin(by_category[category])
+
+    def list(self, table, limit=None, category=None, store_id=None, owner_id=None, location=None):
+        """
+        Active rows of a list route, as its ListQuery would return them
+
+        Returns:
+            list: The rows, or None if the filters cannot be answered exactly
+        """
+        try:
+            store_id = int(store_id) if store_id else None
+            owner_id = int(owner_id) if owner_id else None
+        except ValueError:
+            return None
+        if location and ('%' in location or '_' in location):
+            return None
+        if limit is not None and limit < 0:
+            return None
+
+        if category and store_id is None and owner_id is None:
+            rows = self.by_category[table].get(category, ())
+        else:
+            if store_id is not None:
+                rows = self.by_store[table].get(store_id, ())
+            elif owner_id is not None:
+                rows = self.by_owner.get(owner_id, ())
+            else:
+                rows = self.listings[table]
+            if category:
+                rows = [row for row in rows if row['category'] == category]
+        if location:
+            rows = [row for row in rows if row['location'] is not None and location in row['location']]
+        return list(rows[:limit] if limit else rows)
+
+    def product(self, product_id):
+        """Product detail as PRODUCT_DETAIL returns it, or None if not held"""
+        product = self.rows['products'].get(product_id)
+        if product is None:
+            return None
+        store = self.rows['stores'].get(product['store_id'], {})
+        owner = self.owners.get(store.get('owner_id'), {})
+        return dict(
+            product,
+            store_name=store.get('name'),
+            store_category=store.get('category'),
+            store_address=store.get('address'),
+            store_phone=store.get('phone'),
+            store_owner_name=owner.get('username'),
+            store_owner_full_name=owner.get('full_name')
+        )
+
+    def store(self, store_id):
+        """Store detail with its active listing counts, or None if not held"""
+        store = self.rows['stores'].get(store_id)
+        if store is None:
+            return None
+        owner = self.owners.get(store['owner_id'], {})
+        return dict(
+            store,
+            owner_name=owner.get('username'),
+            owner_full_name=owner.get('full_name'),
+            owner_email=owner.get('email'),
+            statistics={table: len(self.by_store[table].get(store_id, ())) for table in LISTINGS}
+        )
+
+def _fetch(cursor, table, ids=None):
+    query = f"SELECT * FROM {table}"
+    conditions = [] if table == 'stores' else ["is_active = TRUE"]
+    params = ()
+    if ids is not None:
+        conditions.append("id = ANY(%s)")
+        params = (list(ids),)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    cursor.execute(query, params)
+    return {row['id']: dict(row) for row in cursor.fetchall()}
+
+def _fetch_owners(cursor, ids):
+    cursor.execute("SELECT id, username, full_name, email FROM users WHERE id = ANY(%s)", (list(ids),))
+    return {row['id']: dict(row) for row in cursor.fetchall()}
+
+def _load(cursor):
+    rows = {table: _fetch(cursor, table) for table in CATALOG_TABLES}
+    owner_ids = {store['owner_id'] for store in rows['stores'].values() if store['owner_id'] is not None}
+    return CatalogSnapshot(rows, _fetch_owners(cursor, owner_ids))
+
+def _apply(cursor, snapshot, changes):
+    """New snapshot with the changed rows re-read; rows no longer active are dropped"""
+    owners = dict(snapshot.owners)
+    changed = {}
+    for table, ids in changes.items():
+        if table == 'users':
+            ids = ids & owners.keys()
+            if ids:
+                for user_id in ids:
+                    owners.pop(user_id, None)
+                owners.update(_fetch_owners(cursor, ids))
+            continue
+        fetched = _fetch(cursor, table, ids)
+        changed[table] = {row_id: fetched.get(row_id) for row_id in ids}
+    if 'stores' in changed:
+        missing = {
+            store['owner_id'] for store in changed['stores'].values() if store is not None
+        } - owners.keys() - {None}
+        if missing:
+            owners.update(_fetch_owners(cursor, missing))
+    return snapshot.updated(changed, owners)
+
+def _on_change(table, row_id, operation):
+    global _full_reload, _stale
+    with _state_lock:
+        if table is None:
+            # (Re)connected: changes may have been missed, reload everything
+            _full_reload = True
+            _stale = True
+            _pending.clear()
+        elif table in CATALOG_TABLES or table == 'users':
+            _pending.setdefault(table, set()).add(row_id)
+        else:
+            return
+    _wake.set()
+
+def _refresh_forever():
+    global _snapshot, _full_reload, _stale
+    while True:
+        _wake.wait()
+        with _state_lock:
+            _wake.clear()
+            full = _full_reload or _snapshot is None
+            changes = dict(_pending)
+            _full_reload = False
+            _pending.clear()
+        if not full and not changes:
+            continue
+
+        connection = get_db_connection()
+        try:
+            if connection is None:
+                raise RuntimeError("Database connection failed")
+            cursor = connection.cursor()
+            if full:
+                snapshot = _load(cursor)
+            else:
+                snapshot = _apply(cursor, _snapshot, changes)
+            with _state_lock:
+                _snapshot = snapshot
+                # Unless the listener reconnected while this load was running
+                if full and not _full_reload:
+                    _stale = False
+            _loaded.set()
+            CATALOG_SNAPSHOT_REFRESHES.labels('full' if full else 'incremental').inc()
+        except Exception as e:
+            print(f"Catalog snapshot refresh error: {e}")
+            with _state_lock:
+                _full_reload = True
+            _wake.set()
+            time.sleep(1)
+        finally:
+            if connection is not None:
+                connection.close()
+
+def _ensure_refresher():
+    global _refresher_pid, _snapshot, _stale
+    # Threads do not survive fork(), so each worker runs its own refresher
+    if _refresher_pid != os.getpid():
+        with _state_lock:
+            if _refresher_pid != os.getpid():
+                _snapshot = None
+                _stale = True
+                _loaded.clear()
+                threading.Thread(target=_refresh_forever, name='catalog-snapshot', daemon=True).start()
+                _refresher_pid = os.getpid()
+                _wake.set()
+
+def current():
+    """
+    This worker's catalog snapshot, if it may answer the current request
+
+    Returns:
+        CatalogSnapshot: None when the mode is off, the snapshot is not loaded
+        or may have missed changes, or the user is inside their
+        read-your-writes window
+    """
+    if not CATALOG_SNAPSHOT or reads_from_primary():
+        return None
+    _ensure_refresher()
+    if not ensure_listener() or _stale:
+        return None
+    return _snapshot
+
+def start_catalog_snapshot():
+    """Load the snapshot at startup so the first requests are served from memory"""
+    if CATALOG_SNAPSHOT:
+        _ensure_refresher()
+        if ensure_listener():
+            _loaded.wait(CATALOG_SNAPSHOT_LOAD_TIMEOUT)
+
+def _read(answer):
+    snapshot = current()
+    result = answer(snapshot) if snapshot else None
+    CATALOG_SNAPSHOT_READS.labels('hit' if result is not None else 'miss').inc()
+    return result
+
+def list_catalog(table, active_only=True, **filters):
+    """
+    Rows for a get_* list route, served from the snapshot
+
+    Args:
+        table (str): 'stores', 'products', 'services', 'jobs' or 'announcements'
+        active_only (bool): The snapshot only holds active rows, so False
+            always falls back to the database
+        **filters: limit and the route's filters (category, store_id,
+            owner_id, location)
+
+    Returns:
+        list: The rows, or None when the caller must query the database
+    """
+    if not active_only or not CATALOG_SNAPSHOT:
+        return None
+    return _read(lambda snapshot: snapshot.list(table, **filters))
+
+def active_rows(table):
+    """Plain active rows of a table, newest first (app.py's list routes), or None"""
+    if not CATALOG_SNAPSHOT:
+        return None
+    return _read(lambda snapshot: list(snapshot.plain[table]))
+
+def product_detail(product_id):
+    """Row for GET /api/products/<id>, or None when the caller must query the database"""
+    if not CATALOG_SNAPSHOT:
+        return None
+    return _read(lambda snapshot: snapshot.product(product_id))
+
+def _held(lookup, ids):
+    rows = {}
+    for row_id in ids:
+        row = lookup(row_id)
+        if row is not None:
+            rows[row_id] = row
+    return rows
+
+def product_details(ids):
+    """
+    Rows for GET /api/products?ids=, as far as the snapshot holds them
+
+    Returns:
+        dict: Rows by id; ids missing here must be looked up in the database
+    """
+    if not CATALOG_SNAPSHOT:
+        return {}
+    return _read(lambda snapshot: _held(snapshot.product, ids)) or {}
+
+def store_details(ids):
+    """Rows for GET /api/stores?ids= held by the snapshot, by id, without statistics"""
+    if not CATALOG_SNAPSHOT:
+        return {}
+    rows = _read(lambda snapshot: _held(snapshot.store, ids)) or {}
+    for row in rows.values():
+        del row['statistics']
+    return rows
+
+def store_detail(store_id):
+    """Row for GET /api/stores/<id>, or None when the caller must query the database"""
+    if not CATALOG_SNAPSHOT:
+        return None
+    return _read(lambda snapshot: snapshot.store(store_id))
+
+if CATALOG_SNAPSHOT:
+    subscribe(_on_change)
@@ -0,0 +1,113 @@
+import os
+import select
+import threading
+import time
+from db_config import CHANGE_CHANNEL, CHANGE_RESET, get_backend
+
+# Each worker LISTENs for the row changes announced by the triggers that
+# init_database() installs (see db_config.CHANGE_CHANNEL)
+CHANGE_LISTENER_RETRY_SECONDS = float(os.environ.get('CHANGE_LISTENER_RETRY_SECONDS', '2'))
+
+_subscribers = []
+_listener = None
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+def parse_change(payload):
+    """
+    Decode a notification payload
+
+    Returns:
+        tuple: (table, row id, operation), or None if the payload is malformed
+    """
+    try:
+        table, row_id, operation = payload.split(':')
+        return table, int(row_id), operation
+    except ValueError:
+        return None
+
+def subscribe(callback):
+    """
+    Register callback(table, row_id, operation) for every committed change
+
+    The callback is also called as callback(None, None, None) whenever the
+    listener (re)connects, since notifications sent while it was
+    disconnected are lost and anything derived from them must be dropped,
+    and when a bulk load announces CHANGE_RESET.
+    Callbacks run on the listener thread and must be quick.
+    """
+    _subscribers.append(callback)
+
+def _dispatch(table, row_id, operation):
+    for callback in list(_subscribers):
+        try:
+            callback(table, row_id, operation)
+        except Exception as e:
+            print(f"Change subscriber error: {e}")
+
+class ChangeListener(threading.Thread):
+    """Daemon thread holding one LISTEN connection per worker process"""
+
+    def __init__(self):
+        super().__init__(name='change-listener', daemon=True)
+        self.connected = threading.Event()
+
+    def run(self):
+        while True:
+            connection = None
+            try:
+                connection = get_backend().connect()
+                connection.autocommit = True
+                cursor = connection.cursor()
+                cursor.execute(f"LISTEN {CHANGE_CHANNEL}")
+                self.connected.set()
+                _dispatch(None, None, None)
+                self._listen(connection)
+            except Exception as e:
+                print(f"Change listener error: {e}")
+            finally:
+                self.connected.clear()
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+            time.sleep(CHANGE_LISTENER_RETRY_SECONDS)
+
+    def _listen(self, connection):
+        while True:
+            select.select([connection], [], [], 30)
+            connection.poll()
+            while connection.notifies:
+                payload = connection.notifies.pop(0).payload
+                if payload == CHANGE_RESET:
+                    _dispatch(None, None, None)
+                    continue
+                change = parse_change(payload)
+                if change:
+                    _dispatch(*change)
+
+def ensure_listener():
+    """
+    Start this process's change listener if needed
+
+    Returns:
+        bool: True while the listener is connected, i.e. while in-process
+        caches can rely on being told about changes; always False on
+        backends without LISTEN/NOTIFY
+    """
+    global _listener, _listener_pid
+    if get_backend().name != 'postgresql':
+        return False
+    # Threads do not survive fork(), so each worker starts its own
+    if _listener is None or _listener_pid != os.getpid():
+        with _listener_lock:
+            if _listener is None or _listener_pid != os.getpid():
+                _listener = ChangeListener()
+                _listener.started = time.monotonic()
+                _listener.start()
+                _listener_pid = os.getpid()
+    if not _listener.connected.is_set():
+        # Give requests arriving while it first connects a moment to find it connected
+        _listener.connected.wait(max(0.0, _listener.started + 1 - time.monotonic()))
+    return _listener.connected.is_set()
@@ -33,17 +33,17 @@ def create_announcement():
         
         # Insert new announcement
         cursor.execute("""
-            INSERT INTO announcements (title, content, storeId, isActive, createdAt)
-            VALUES (%s, %s, %s, %s, NOW())
+            INSERT INTO announcements (title, content, store_id)
+            VALUES (%s, %s, %s) RETURNING id
         """, (
             data['title'],
             data['content'],
-            data['storeId'],
-            True
+            data['storeId']
         ))
         
+        # The announcements_feed_fanout trigger copies it into followers' feeds
+        announcement_id = cursor.fetchone()['id']
         connection.commit()
-        announcement_id = cursor.lastrowid
         
         return jsonify({
             "status": "success",
@@ -43,19 +43,18 @@ def create_job():
         
         # Insert new job
         cursor.execute("""
-            INSERT INTO jobs (title, description, salary, location, storeId, isActive, createdAt)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            INSERT INTO jobs (title, description, salary, location, store_id)
+            VALUES (%s, %s, %s, %s, %s) RETURNING id
         """, (
             data['title'],
             data['description'],
             salary,
             data.get('location', ''),
-            data['storeId'],
-            True
+            data['storeId']
         ))
         
+        job_id = cursor.fetchone()['id']
         connection.commit()
-        job_id = cursor.lastrowid
         
         return jsonify({
             "status": "success",
@@ -2,6 +2,7 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
 from auth_utils import require_jwt_auth
+from view_counter import track_product
 
 app = Flask(__name__)
 CORS(app)
@@ -41,19 +42,19 @@ def create_product():
         
         # Insert new product
         cursor.execute("""
-            INSERT INTO products (name, description, price, storeId, category, isActive, createdAt)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            INSERT INTO products (name, description, price, store_id, category)
+            VALUES (%s, %s, %s, %s, %s) RETURNING id
         """, (
             data['name'],
             data['description'],
             price,
             data['storeId'],
-            data['category'],
-            True
+            data['category']
         ))
         
+        product_id = cursor.fetchone()['id']
+        track_product(cursor, product_id)
         connection.commit()
-        product_id = cursor.lastrowid
         
         return jsonify({
             "status": "success",
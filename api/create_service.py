@@ -41,19 +41,18 @@ def create_service():
         
         # Insert new service
         cursor.execute("""
-            INSERT INTO services (name, description, price, storeId, category, isActive, createdAt)
-            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            INSERT INTO services (name, description, price, store_id, category)
+            VALUES (%s, %s, %s, %s, %s) RETURNING id
         """, (
             data['name'],
             data['description'],
             price,
             data['storeId'],
-            data['category'],
-            True
+            data['category']
         ))
         
+        service_id = cursor.fetchone()['id']
         connection.commit()
-        service_id = cursor.lastrowid
         
         return jsonify({
             "status": "success",
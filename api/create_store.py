@@ -33,20 +33,19 @@ def create_store():
         
         # Insert new store
         cursor.execute("""
-            INSERT INTO stores (name, description, ownerId, category, address, phone, isActive, createdAt)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+            INSERT INTO stores (name, description, owner_id, category, address, phone)
+            VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
         """, (
             data['name'],
             data['description'],
             data['ownerId'],
             data['category'],
             data.get('address', ''),
-            data.get('phone', ''),
-            True
+            data.get('phone', '')
         ))
         
+        store_id = cursor.fetchone()['id']
         connection.commit()
-        store_id = cursor.lastrowid
         
         return jsonify({
             "status": "success",
@@ -0,0 +1,230 @@
+import os
+import re
+from decimal import Decimal
+from functools import lru_cache
+from urllib.parse import unquote, urlparse
+from gevent_support import gevent_active, make_psycopg2_green
+from metrics import track_db_connect
+
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))
+
+# All application SQL is written once in PostgreSQL style (%s placeholders,
+# SERIAL, RETURNING, ON CONFLICT); each backend rewrites it for its dialect.
+_RETURNING = re.compile(r"\s+RETURNING\s+(?P<columns>.+?)\s*$", re.IGNORECASE | re.DOTALL)
+_INSERT_TABLE = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+(?P<table>\w+)", re.IGNORECASE)
+_UPDATE_BY_ID = re.compile(r"^\s*UPDATE\s+(?P<table>\w+)\s+SET\s+.+\s+WHERE\s+id\s*=\s*%s\s*$",
+                           re.IGNORECASE | re.DOTALL)
+_VALUES = re.compile(r"\bVALUES\s*\(", re.IGNORECASE)
+_MORE_ROWS = re.compile(r"\)\s*,\s*\(")
+_ON_CONFLICT_NOTHING = re.compile(r"\s+ON\s+CONFLICT\s*(\([^)]*\))?\s+DO\s+NOTHING", re.IGNORECASE)
+_ON_CONFLICT_UPDATE = re.compile(r"\s+ON\s+CONFLICT\s*\([^)]*\)\s+DO\s+UPDATE\s+SET\s+", re.IGNORECASE)
+_EXCLUDED = re.compile(r"\bEXCLUDED\.(\w+)", re.IGNORECASE)
+_INSERT = re.compile(r"^\s*INSERT\s+INTO", re.IGNORECASE)
+_SERIAL_PK = re.compile(r"\bBIGSERIAL\s+PRIMARY\s+KEY\b|\bSERIAL\s+PRIMARY\s+KEY\b", re.IGNORECASE)
+_NOW = re.compile(r"\bNOW\(\)", re.IGNORECASE)
+# "= ANY(%s)" with a list parameter; other dialects have only IN lists
+_ANY = re.compile(r"=\s*ANY\(%s\)", re.IGNORECASE)
+
+def returning_error(query):
+    """
+    Why MySQL cannot emulate a statement's RETURNING clause, or None
+
+    MySQLBackend reads the written row back by id: LAST_INSERT_ID() after a
+    single-row INSERT ... VALUES (optionally ON CONFLICT DO NOTHING), the id
+    parameter after UPDATE ... WHERE id = %s. Other shapes (multi-row or
+    INSERT ... SELECT, upserts, DELETE, UPDATE by other conditions) have no
+    id to read back, so application SQL must not use them.
+    """
+    match = _RETURNING.search(query)
+    if not match:
+        return None
+    statement = query[:match.start()]
+    if _UPDATE_BY_ID.match(statement):
+        return None
+    if (_INSERT_TABLE.match(statement) and _VALUES.search(statement)
+            and not _MORE_ROWS.search(statement) and not _ON_CONFLICT_UPDATE.search(statement)):
+        return None
+    return ("MySQL can only emulate RETURNING for a single-row INSERT ... VALUES "
+            f"or UPDATE ... WHERE id = %s, not: {' '.join(statement.split())}")
+
+class Backend:
+    """
+    Dialect adapter for one database engine
+
+    Subclasses open driver connections that return dict rows and translate
+    the application's PostgreSQL-flavoured SQL into their own dialect.
+    """
+
+    name = None
+    # Prefix used by the slow-query log to capture a plan
+    explain_prefix = None
+    supports_returning = True
+
+    def __init__(self, url):
+        self.url = url
+
+    def connect(self):
+        raise NotImplementedError
+
+    def translate(self, query):
+        """Rewrite a PostgreSQL-style statement for this dialect"""
+        return query
+
+    def execute(self, cursor, query, params):
+        """Run an already translated statement on a raw driver cursor"""
+        if params is None:
+            return cursor.execute(query)
+        return cursor.execute(query, params)
+
+    def statement_timeout_sql(self, milliseconds):
+        """SQL that bounds statement run time for the current transaction, or None"""
+        return None
+
+class PostgresBackend(Backend):
+    name = 'postgresql'
+    explain_prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+
+    def connect(self):
+        import psycopg2
+        import psycopg2.extras
+        if gevent_active():
+            make_psycopg2_green()
+        with track_db_connect():
+            return psycopg2.connect(
+                self.url,
+                cursor_factory=psycopg2.extras.RealDictCursor,
+                connect_timeout=DB_CONNECT_TIMEOUT
+            )
+
+    def statement_timeout_sql(self, milliseconds):
+        return f"SET LOCAL statement_timeout = {int(milliseconds)}"
+
+class MySQLBackend(Backend):
+    name = 'mysql'
+    explain_prefix = 'EXPLAIN ANALYZE '
+    supports_returning = False
+
+    def connect(self):
+        import pymysql
+        import pymysql.cursors
+        parsed = urlparse(self.url)
+        with track_db_connect():
+            return pymysql.connect(
+                host=parsed.hostname or 'localhost',
+                port=parsed.port or 3306,
+                user=unquote(parsed.username or ''),
+                password=unquote(parsed.password or ''),
+                database=parsed.path.lstrip('/'),
+                charset='utf8mb4',
+                cursorclass=pymysql.cursors.DictCursor,
+                connect_timeout=DB_CONNECT_TIMEOUT
+            )
+
+    @lru_cache(maxsize=1024)
+    def translate(self, query):
+        # Before the write runs, not after it
+        error = returning_error(query)
+        if error:
+            raise ValueError(error)
+        query = _SERIAL_PK.sub('INT AUTO_INCREMENT PRIMARY KEY', query)
+        # pymysql renders a list parameter as a parenthesised value list
+        query = _ANY.sub('IN %s', query)
+        if _ON_CONFLICT_NOTHING.search(query):
+            query = _INSERT.sub('INSERT IGNORE INTO', _ON_CONFLICT_NOTHING.sub('', query))
+        if _ON_CONFLICT_UPDATE.search(query):
+            query = _EXCLUDED.sub(r'VALUES(\1)', _ON_CONFLICT_UPDATE.sub(' ON DUPLICATE KEY UPDATE ', query))
+        return query
+
+    def execute(self, cursor, query, params):
+        # MySQL has no RETURNING: run the write, then read the row back
+        match = _RETURNING.search(query)
+        if not match:
+            return super().execute(cursor, query, params)
+
+        # translate() has rejected every other shape (see returning_error)
+        statement = query[:match.start()]
+        columns = match.group('columns')
+        insert = _INSERT_TABLE.match(statement)
+        super().execute(cursor, statement, params)
+        if insert:
+            return cursor.execute(f"SELECT {columns} FROM {insert.group('table')} WHERE id = %s",
+                                  (cursor.lastrowid,))
+        update = _UPDATE_BY_ID.match(statement)
+        return cursor.execute(f"SELECT {columns} FROM {update.group('table')} WHERE id = %s",
+                              (list(params)[-1],))
+
+class SQLiteBackend(Backend):
+    name = 'sqlite'
+    explain_prefix = 'EXPLAIN QUERY PLAN '
+
+    def __init__(self, url):
+        super().__init__(url)
+        # sqlite:///relative.db, sqlite:////absolute.db or sqlite:///:memory:
+        self.path = url.split('sqlite:///', 1)[1] if url.startswith('sqlite:///') else ':memory:'
+
+    def connect(self):
+        import sqlite3
+        sqlite3.register_converter('BOOLEAN', lambda value: value not in (b'0', b''))
+        sqlite3.register_converter('DECIMAL', lambda value: Decimal(value.decode()))
+        sqlite3.register_adapter(Decimal, str)
+        with track_db_connect():
+            # Pooled connections are handed between threads, one at a time
+            connection = sqlite3.connect(self.path, timeout=DB_CONNECT_TIMEOUT,
+                                         detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        connection.row_factory = _dict_row
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        return connection
+
+    @lru_cache(maxsize=1024)
+    def translate(self, query):
+        query = _SERIAL_PK.sub('INTEGER PRIMARY KEY AUTOINCREMENT', query)
+        query = _NOW.sub('CURRENT_TIMESTAMP', query)
+        query = _ANY.sub('IN (%s)', query)
+        return query.replace('%s', '?').replace('%%', '%')
+
+    def execute(self, cursor, query, params):
+        # A list parameter (from "= ANY(%s)", now "IN (?)") gets one
+        # placeholder per element
+        if params and any(isinstance(value, (list, tuple)) for value in params):
+            parts = query.split('?')
+            expanded, flat = [parts[0]], []
+            for value, part in zip(params, parts[1:]):
+                if isinstance(value, (list, tuple)):
+                    expanded.append(", ".join(["?"] * len(value)))
+                    flat.extend(value)
+                else:
+                    expanded.append("?")
+                    flat.append(value)
+                expanded.append(part)
+            query, params = "".join(expanded), flat
+        return super().execute(cursor, query, params)
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+BACKENDS = {
+    'postgres': PostgresBackend,
+    'postgresql': PostgresBackend,
+    'mysql': MySQLBackend,
+    'mysql+pymysql': MySQLBackend,
+    'sqlite': SQLiteBackend,
+}
+
+def create_backend(url):
+    """
+    Pick the dialect adapter for a database URL
+
+    Args:
+        url (str): DATABASE_URL, e.g. postgresql://..., mysql://... or sqlite:///marketplace.db
+
+    Returns:
+        Backend: The matching backend; PostgreSQL when no URL is configured
+    """
+    if not url:
+        # libpq falls back to the PG* environment variables
+        return PostgresBackend(url)
+    scheme = url.split('://', 1)[0].lower()
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unsupported database URL scheme: {scheme}")
+    return BACKENDS[scheme](url)
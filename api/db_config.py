@@ -1,18 +1,185 @@
+import hashlib
+import itertools
+import math
 import os
-import psycopg2
-import psycopg2.extras
+import threading
+import time
+import jwt
 from dotenv import load_dotenv
+from flask import after_this_request, g, has_request_context, request
+from db_backend import create_backend
+from db_pool import ConnectionPool
+from query_log import TimedCursor
 
 load_dotenv()
 
-def get_db_connection():
-    """Get PostgreSQL database connection"""
+# Imported after load_dotenv: both read their settings from the environment
+from feeds import FEED_FANOUT_MAX_FOLLOWERS
+from marketplace import JWT_SECRET, verify_jwt_token
+
+# Bump when init_database() gains new tables or columns; /api/ready reports it
+SCHEMA_VERSION = 11
+
+# Row changes on these tables are announced on CHANGE_CHANNEL by triggers (so
+# writes from the PHP dashboard are seen too), delivered when the writer
+# commits. Payload: "<table>:<id>:<INSERT|UPDATE|DELETE>"
+CHANGE_CHANNEL = 'catalog_changes'
+CHANGE_TABLES = ('users', 'stores', 'products', 'services', 'jobs', 'announcements')
+# The same triggers append every change to this log, keyed by the writing
+# transaction's id, for incremental sync (see delta_sync.py)
+CHANGE_LOG_TABLE = 'catalog_change_log'
+# Sent (and logged) after a bulk load that bypassed the triggers: listeners
+# drop everything derived from the catalog, sync clients get a full sync
+CHANGE_RESET = 'reset'
+
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '5'))
+
+# Optional comma-separated read replica URLs; read-only routes are spread over them
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+# With replicas, after a user commits a write their reads stay on the
+# primary (and skip shared or cached responses) this long, so they see their
+# own change even while replicas and other workers' caches are catching up
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', '5'))
+# The window travels with the client, not in a worker: the response to a
+# write carries a signed token (user id and expiry) as a cookie for browsers
+# and a header for apps to send back, so it holds on every worker and host
+PRIMARY_PIN_COOKIE = 'primary_pin'
+PRIMARY_PIN_HEADER = 'X-Primary-Pin'
+# Pins are signed with their own key and audience, so a pin can never pass
+# as a login token (decode_jwt rejects both)
+PRIMARY_PIN_AUDIENCE = 'primary_pin'
+_PRIMARY_PIN_KEY = hashlib.sha256(f"{PRIMARY_PIN_AUDIENCE}:{JWT_SECRET}".encode('utf-8')).hexdigest()
+
+_backend = None
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_replica_pools = None
+_replica_pools_pid = None
+_replica_turn = itertools.count()
+
+def get_backend():
+    """Get the dialect adapter selected by DATABASE_URL (PostgreSQL, MySQL or SQLite)"""
+    global _backend
+    if _backend is None:
+        _backend = create_backend(os.environ.get('DATABASE_URL'))
+    return _backend
+
+def get_pool():
+    """Get this process's connection pool, creating it on first use"""
+    global _pool, _pool_pid
+    # Connections must not be shared across fork(), so each worker gets its own pool
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                backend = get_backend()
+                # Every connection to an in-memory SQLite database is a separate database
+                maxconn = 1 if getattr(backend, 'path', None) == ':memory:' else DB_POOL_MAX
+                _pool = ConnectionPool(
+                    backend.connect,
+                    maxconn=maxconn,
+                    timeout=DB_POOL_TIMEOUT,
+                    wrap_cursor=lambda cursor: TimedCursor(cursor, backend),
+                    # Pins only matter when reads can go to a replica
+                    on_commit=_note_write if DATABASE_REPLICA_URLS else None
+                )
+                _pool_pid = os.getpid()
+    return _pool
+
+def get_replica_pools():
+    """Get this process's read replica pools (empty when no replicas are configured)"""
+    global _replica_pools, _replica_pools_pid
+    if _replica_pools is None or _replica_pools_pid != os.getpid():
+        with _pool_lock:
+            if _replica_pools is None or _replica_pools_pid != os.getpid():
+                pools = []
+                for url in DATABASE_REPLICA_URLS:
+                    backend = create_backend(url)
+                    pools.append(ConnectionPool(
+                        backend.connect,
+                        maxconn=DB_POOL_MAX,
+                        timeout=DB_POOL_TIMEOUT,
+                        wrap_cursor=lambda cursor, backend=backend: TimedCursor(cursor, backend)
+                    ))
+                _replica_pools = pools
+                _replica_pools_pid = os.getpid()
+    return _replica_pools
+
+def _current_user_id():
+    """User id of the request's bearer token, only if its signature checks out"""
+    if not has_request_context():
+        return None
+    if 'request_user_id' not in g:
+        payload = verify_jwt_token(request)
+        g.request_user_id = payload.get('user_id') if payload else None
+    return g.request_user_id
+
+def _note_write():
+    """Pin the current user's reads to the primary for READ_YOUR_WRITES_SECONDS"""
+    user_id = _current_user_id()
+    if user_id is None:
+        return
+    if 'primary_pin' not in g:
+        after_this_request(_send_primary_pin)
+    g.primary_pin = jwt.encode(
+        {
+            'user_id': user_id,
+            'aud': PRIMARY_PIN_AUDIENCE,
+            'exp': math.ceil(time.time() + READ_YOUR_WRITES_SECONDS)
+        },
+        _PRIMARY_PIN_KEY, algorithm='HS256'
+    )
+
+def _send_primary_pin(response):
+    response.set_cookie(PRIMARY_PIN_COOKIE, g.primary_pin, max_age=math.ceil(READ_YOUR_WRITES_SECONDS),
+                        httponly=True, samesite='Lax')
+    response.headers[PRIMARY_PIN_HEADER] = g.primary_pin
+    return response
+
+def reads_from_primary():
+    """True while the current user is inside their read-your-writes window"""
+    if not DATABASE_REPLICA_URLS:
+        return False
+    user_id = _current_user_id()
+    if user_id is None:
+        return False
+    if 'primary_pin' in g:
+        # Wrote earlier in this request
+        return True
+    token = request.headers.get(PRIMARY_PIN_HEADER) or request.cookies.get(PRIMARY_PIN_COOKIE)
+    if not token:
+        return False
     try:
-        connection = psycopg2.connect(
-            os.environ.get('DATABASE_URL'),
-            cursor_factory=psycopg2.extras.DictCursor
-        )
-        return connection
+        # Rejects expired and forged pins alike
+        payload = jwt.decode(token, _PRIMARY_PIN_KEY, algorithms=['HS256'], audience=PRIMARY_PIN_AUDIENCE)
+    except jwt.InvalidTokenError:
+        return False
+    return payload.get('user_id') == user_id
+
+def get_db_connection(timeout=None, read_only=False):
+    """
+    Get a pooled database connection; close() returns it to the pool
+
+    Args:
+        timeout (float): Seconds to wait for a free connection
+        read_only (bool): The caller only reads, so a replica may serve it
+
+    Returns:
+        PooledConnection: A replica connection for reads when replicas are
+        configured and the user has not written recently, otherwise a
+        primary connection; None if no connection could be opened
+    """
+    if read_only and DATABASE_REPLICA_URLS and not reads_from_primary():
+        pools = get_replica_pools()
+        pool = pools[next(_replica_turn) % len(pools)]
+        try:
+            return pool.acquire(timeout)
+        except Exception as e:
+            print(f"Replica connection error, falling back to primary: {e}")
+    try:
+        return get_pool().acquire(timeout)
     except Exception as e:
         print(f"Database connection error: {e}")
         return None
@@ -110,6 +277,111 @@ def init_database():
             )
         """)
         
+        # Store follows and the per-user announcement feeds built from them
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS store_follows (
+                user_id INTEGER NOT NULL REFERENCES users(id),
+                store_id INTEGER NOT NULL REFERENCES stores(id),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, store_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS store_follow_counts (
+                store_id INTEGER PRIMARY KEY REFERENCES stores(id),
+                followers INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Whether new announcements are copied to the followers' feeds (feeds.py)
+        if _add_column(cursor, 'store_follow_counts', 'fan_out', 'BOOLEAN NOT NULL DEFAULT TRUE'):
+            cursor.execute(
+                "UPDATE store_follow_counts SET fan_out = FALSE WHERE followers > %s",
+                (FEED_FANOUT_MAX_FOLLOWERS,)
+            )
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_feed (
+                user_id INTEGER NOT NULL,
+                announcement_id INTEGER NOT NULL,
+                store_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, announcement_id)
+            )
+        """)
+        # View counts live outside products so batched flushes neither lock
+        # product rows nor fire their change triggers. No foreign key: a
+        # product deleted before a flush must not fail the whole batch
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS product_views (
+                product_id INTEGER PRIMARY KEY,
+                views BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        # When each product's count was last flushed (unix time), so trending
+        # refreshes only look at products viewed since the previous one
+        _add_column(cursor, 'product_views', 'flushed_at', 'DOUBLE PRECISION NOT NULL DEFAULT 0')
+        # Popularity of products and stores, maintained by trending.py
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS trending_scores (
+                kind VARCHAR(10) NOT NULL,
+                item_id INTEGER NOT NULL,
+                category VARCHAR(50),
+                score DOUBLE PRECISION NOT NULL DEFAULT 0,
+                views_seen BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, item_id)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS trending_state (
+                name VARCHAR(50) PRIMARY KEY,
+                value DOUBLE PRECISION NOT NULL
+            )
+        """)
+        # Distinct visitors per store and day as HyperLogLog sketches
+        # (store_visitors.py); version makes concurrent merges compare-and-set
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS store_visitor_sketches (
+                store_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                registers TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (store_id, day)
+            )
+        """)
+        _create_index(cursor, 'idx_store_follows_store', 'store_follows', 'store_id')
+        _create_index(cursor, 'idx_trending_scores_rank', 'trending_scores', 'kind, score')
+        _create_index(cursor, 'idx_trending_scores_category', 'trending_scores', 'kind, category, score')
+        _create_index(cursor, 'idx_announcements_store', 'announcements', 'store_id, id')
+        # Keyset orderings of the product and service lists (get_products.py,
+        # get_services.py), alone and after an equality filter
+        for table in ('products', 'services'):
+            for order in ('created_at', 'price'):
+                _create_index(cursor, f'idx_{table}_{order}', table, f'{order}, id')
+                _create_index(cursor, f'idx_{table}_category_{order}', table, f'category, {order}, id')
+                _create_index(cursor, f'idx_{table}_store_{order}', table, f'store_id, {order}, id')
+        _create_index(cursor, 'idx_product_views_rank', 'product_views', 'views, product_id')
+        _create_index(cursor, 'idx_product_views_flushed', 'product_views', 'flushed_at')
+        # A store's newest jobs and announcements (?include= on the store route)
+        for table in ('jobs', 'announcements'):
+            _create_index(cursor, f'idx_{table}_store_created_at', table, 'store_id, created_at, id')
+        # sort=popular joins product_views: products created before it existed
+        # (or by the PHP dashboard) get their row here
+        track_untracked_products(cursor)
+        
+        if get_backend().name == 'postgresql':
+            _install_change_triggers(cursor)
+        _install_feed_trigger(cursor)
+        
+        # Track which schema version this database has been brought up to
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute(
+            "INSERT INTO schema_migrations (version) VALUES (%s) ON CONFLICT (version) DO NOTHING",
+            (SCHEMA_VERSION,)
+        )
+        
         connection.commit()
         cursor.close()
         connection.close()
@@ -120,4 +392,142 @@ def init_database():
         connection.rollback()
         cursor.close()
         connection.close()
-        return False
\ No newline at end of file
+        return False
+
+def track_untracked_products(cursor):
+    """Give every product without a product_views row a zero one (view_counter.track_product in bulk)"""
+    cursor.execute("""
+        INSERT INTO product_views (product_id, views)
+        SELECT p.id, 0 FROM products p
+        WHERE NOT EXISTS (SELECT 1 FROM product_views v WHERE v.product_id = p.id)
+        ON CONFLICT (product_id) DO NOTHING
+    """)
+
+def _create_index(cursor, name, table, columns):
+    """CREATE INDEX IF NOT EXISTS, which MySQL does not support"""
+    if get_backend().name == 'mysql':
+        cursor.execute(
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+            (table, name)
+        )
+        if cursor.fetchone():
+            return
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    else:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+def _add_column(cursor, table, column, definition):
+    """
+    ALTER TABLE ... ADD COLUMN unless the column exists (MySQL and SQLite lack IF NOT EXISTS)
+
+    Returns:
+        bool: True if the column was added
+    """
+    cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+    if column in [description[0] for description in cursor.description]:
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+# Followers of the new announcement's store, unless it is pulled on read
+_FEED_FANOUT_SELECT = """
+    SELECT f.user_id, NEW.id, NEW.store_id FROM store_follows f
+    JOIN store_follow_counts c ON c.store_id = f.store_id
+    WHERE f.store_id = NEW.store_id AND c.fan_out = TRUE
+"""
+
+def _install_feed_trigger(cursor):
+    """
+    Create the trigger that copies each new announcement into its store's followers' feeds
+
+    A trigger rather than application code, so announcements written by the
+    PHP dashboard or any other client are fanned out too.
+    """
+    backend = get_backend().name
+    if backend == 'postgresql':
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", ('announcements_feed_fanout',))
+        cursor.execute(f"""
+            CREATE OR REPLACE FUNCTION fan_out_announcement() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO user_feed (user_id, announcement_id, store_id)
+                {_FEED_FANOUT_SELECT}
+                ON CONFLICT (user_id, announcement_id) DO NOTHING;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        cursor.execute("SELECT 1 FROM pg_trigger WHERE tgname = %s", ('announcements_feed_fanout',))
+        if not cursor.fetchone():
+            cursor.execute("""
+                CREATE TRIGGER announcements_feed_fanout
+                AFTER INSERT ON announcements
+                FOR EACH ROW EXECUTE FUNCTION fan_out_announcement()
+            """)
+    elif backend == 'mysql':
+        cursor.execute(
+            "SELECT 1 FROM information_schema.triggers "
+            "WHERE trigger_schema = DATABASE() AND trigger_name = %s",
+            ('announcements_feed_fanout',)
+        )
+        if not cursor.fetchone():
+            cursor.execute(f"""
+                CREATE TRIGGER announcements_feed_fanout
+                AFTER INSERT ON announcements
+                FOR EACH ROW INSERT IGNORE INTO user_feed (user_id, announcement_id, store_id)
+                {_FEED_FANOUT_SELECT}
+            """)
+    else:
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS announcements_feed_fanout
+            AFTER INSERT ON announcements
+            BEGIN
+                INSERT OR IGNORE INTO user_feed (user_id, announcement_id, store_id)
+                {_FEED_FANOUT_SELECT};
+            END
+        """)
+
+def _install_change_triggers(cursor):
+    """Create the change log and the NOTIFY triggers on every change-tracked table (PostgreSQL only)"""
+    # Workers start together; serialize them and leave existing triggers
+    # alone, since trigger DDL locks the table against every reader
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (CHANGE_CHANNEL,))
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CHANGE_LOG_TABLE} (
+            id BIGSERIAL PRIMARY KEY,
+            table_name VARCHAR(50) NOT NULL,
+            row_id INTEGER NOT NULL,
+            txid BIGINT NOT NULL DEFAULT txid_current(),
+            changed_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+        )
+    """)
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{CHANGE_LOG_TABLE}_txid ON {CHANGE_LOG_TABLE} (txid)")
+    cursor.execute(f"""
+        CREATE OR REPLACE FUNCTION notify_catalog_change() RETURNS trigger AS $$
+        DECLARE
+            row_id INTEGER;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                row_id := OLD.id;
+            ELSE
+                row_id := NEW.id;
+            END IF;
+            INSERT INTO {CHANGE_LOG_TABLE} (table_name, row_id) VALUES (TG_TABLE_NAME, row_id);
+            PERFORM pg_notify('{CHANGE_CHANNEL}', TG_TABLE_NAME || ':' || row_id || ':' || TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cursor.execute("SELECT tgname, tgenabled FROM pg_trigger WHERE tgname LIKE %s", ('%_change_notify',))
+    existing = {row['tgname']: row['tgenabled'] for row in cursor.fetchall()}
+    for table in CHANGE_TABLES:
+        if existing.get(f"{table}_change_notify") == 'D':
+            # Left disabled by an interrupted generate_data.py run
+            cursor.execute(f"ALTER TABLE {table} ENABLE TRIGGER {table}_change_notify")
+        if f"{table}_change_notify" in existing:
+            continue
+        cursor.execute(f"""
+            CREATE TRIGGER {table}_change_notify
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION notify_catalog_change()
+        """)
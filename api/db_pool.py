@@ -0,0 +1,177 @@
+import collections
+import threading
+import time
+from metrics import DB_POOL_CONNECTIONS, DB_POOL_TIMEOUTS, DB_POOL_WAIT
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the timeout"""
+
+class PooledConnection:
+    """
+    Proxy around a pooled DB-API connection
+
+    Behaves like the underlying connection, except that close() hands the
+    connection back to the pool instead of closing the socket, so existing
+    `finally: connection.close()` blocks keep working unchanged.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def cursor(self, *args, **kwargs):
+        return self._pool.wrap_cursor(self._raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        self._raw.commit()
+        if self._pool.on_commit:
+            self._pool.on_commit()
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe pool of database connections
+
+    Connections are opened lazily up to `maxconn`; callers beyond that wait
+    up to `timeout` seconds for one to be returned. `on_commit` is called
+    after every successful commit on a connection from this pool.
+    """
+
+    def __init__(self, connect, maxconn=10, timeout=5.0, wrap_cursor=None, on_commit=None):
+        self._connect = connect
+        self.wrap_cursor = wrap_cursor or (lambda cursor: cursor)
+        self.on_commit = on_commit
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._idle = collections.deque()
+        self._opened = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        Check a connection out of the pool
+
+        Args:
+            timeout (float): Seconds to wait for a free connection
+
+        Returns:
+            PooledConnection: The checked-out connection
+
+        Raises:
+            PoolTimeout: If the pool stayed exhausted for the whole timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        raw = None
+
+        with self._cond:
+            while not self._idle and self._opened >= self.maxconn:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    DB_POOL_TIMEOUTS.inc()
+                    raise PoolTimeout(f"No database connection available after {timeout:.1f}s")
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            if self._idle:
+                raw = self._idle.pop()
+            else:
+                self._opened += 1
+            self._in_use += 1
+            self._update_gauges()
+
+        DB_POOL_WAIT.observe(time.perf_counter() - started)
+
+        if raw is None:
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opened -= 1
+                    self._in_use -= 1
+                    self._update_gauges()
+                    self._cond.notify()
+                raise
+
+        return PooledConnection(self, raw)
+
+    def release(self, raw):
+        """Return a connection to the pool, discarding it if it is broken"""
+        keep = not getattr(raw, 'closed', False)
+        if keep:
+            try:
+                # Never hand the next caller a half-finished transaction
+                raw.rollback()
+            except Exception:
+                keep = False
+
+        if not keep:
+            try:
+                raw.close()
+            except Exception:
+                pass
+
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append(raw)
+            else:
+                self._opened -= 1
+            self._update_gauges()
+            self._cond.notify()
+
+    def closeall(self):
+        """Close every idle connection"""
+        with self._cond:
+            while self._idle:
+                raw = self._idle.pop()
+                self._opened -= 1
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+            self._update_gauges()
+
+    def stats(self):
+        """
+        Current pool usage
+
+        Returns:
+            dict: Opened, in-use, idle and waiting counts plus saturation (0-1)
+        """
+        with self._cond:
+            return {
+                "max": self.maxconn,
+                "opened": self._opened,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "saturation": round(self._in_use / self.maxconn, 3) if self.maxconn else 1.0
+            }
+
+    def _update_gauges(self):
+        DB_POOL_CONNECTIONS.labels('in_use').set(self._in_use)
+        DB_POOL_CONNECTIONS.labels('idle').set(len(self._idle))
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from flask import request, jsonify
+from auth_utils import require_jwt_auth
+from db_config import CHANGE_LOG_TABLE, CHANGE_RESET, get_backend, get_db_connection
+
+# GET /api/sync?since=<token>: the catalog rows inserted, updated or
+# deactivated since the client's last sync. A token is
+# "<txid horizon>.<unix time issued>": every transaction below the horizon
+# had finished when it was issued, so the next sync only has to read the
+# change log from that txid on (one range scan of its txid index).
+SYNC_TABLES = ('stores', 'products', 'services', 'jobs', 'announcements')
+# Change log entries are kept this long; older tokens get a full sync
+SYNC_LOG_RETENTION_DAYS = int(os.environ.get('SYNC_LOG_RETENTION_DAYS', '30'))
+SYNC_LOG_PRUNE_SECONDS = 3600
+
+_pruner_pid = None
+_pruner_lock = threading.Lock()
+
+def parse_token(token):
+    """
+    Decode a sync token
+
+    Returns:
+        tuple: (txid horizon, unix time issued), or None if malformed
+    """
+    try:
+        horizon, issued = token.split('.')
+        return int(horizon), int(issued)
+    except ValueError:
+        return None
+
+def _full(cursor):
+    data = {}
+    for table in SYNC_TABLES:
+        cursor.execute(f"SELECT * FROM {table} WHERE is_active = TRUE ORDER BY id")
+        data[table] = cursor.fetchall()
+    return data, {}
+
+def _delta(cursor, horizon):
+    # Entries of transactions at or above the previous horizon may already
+    # have been sent; re-sending them is harmless, missing one is not
+    cursor.execute(
+        f"SELECT DISTINCT table_name, row_id FROM {CHANGE_LOG_TABLE} WHERE txid >= %s",
+        (horizon,)
+    )
+    changed = {}
+    for row in cursor.fetchall():
+        if row['table_name'] == CHANGE_RESET:
+            # A bulk load since the token: its rows were never logged
+            return None
+        if row['table_name'] in SYNC_TABLES:
+            changed.setdefault(row['table_name'], set()).add(row['row_id'])
+
+    data, deleted = {}, {}
+    for table, ids in changed.items():
+        cursor.execute(
+            f"SELECT * FROM {table} WHERE id = ANY(%s) AND is_active = TRUE ORDER BY id",
+            (sorted(ids),)
+        )
+        rows = cursor.fetchall()
+        if rows:
+            data[table] = rows
+        # Deleted or deactivated rows become tombstones: just their ids
+        gone = ids - {row['id'] for row in rows}
+        if gone:
+            deleted[table] = sorted(gone)
+    return data, deleted
+
+def prune_change_log():
+    """Delete change log entries older than SYNC_LOG_RETENTION_DAYS"""
+    connection = get_db_connection()
+    if not connection:
+        raise RuntimeError("Database connection failed")
+    try:
+        cursor = connection.cursor()
+        # Workers run this on the same schedule; one delete is enough
+        cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked", (CHANGE_LOG_TABLE,))
+        if cursor.fetchone()['locked']:
+            cursor.execute(
+                f"DELETE FROM {CHANGE_LOG_TABLE} WHERE changed_at < clock_timestamp() - make_interval(days => %s)",
+                (SYNC_LOG_RETENTION_DAYS,)
+            )
+        connection.commit()
+    finally:
+        connection.close()
+
+def _prune_forever():
+    while True:
+        try:
+            prune_change_log()
+        except Exception as e:
+            print(f"Change log prune error: {e}")
+        time.sleep(SYNC_LOG_PRUNE_SECONDS)
+
+def start_change_log_pruner():
+    """Start this worker's change log pruner (threads do not survive fork()); PostgreSQL only"""
+    global _pruner_pid
+    if get_backend().name != 'postgresql':
+        return
+    if _pruner_pid != os.getpid():
+        with _pruner_lock:
+            if _pruner_pid != os.getpid():
+                threading.Thread(target=_prune_forever, name='change-log-pruner', daemon=True).start()
+                _pruner_pid = os.getpid()
+
+def sync_changes(since):
+    """
+    Body and status of GET /api/sync (also served by asgi_app.py)
+
+    Args:
+        since (str): The client's last sync token, or None
+
+    Returns:
+        tuple: (response body, HTTP status)
+    """
+    previous = None
+    if since:
+        previous = parse_token(since)
+        if previous is None:
+            return {"status": "error", "message": "Invalid sync token"}, 400
+    tracked = get_backend().name == 'postgresql'
+    full = (
+        not tracked or previous is None
+        or previous[1] < time.time() - SYNC_LOG_RETENTION_DAYS * 86400
+    )
+
+    # The primary: a replica's view of transaction ids may lag behind
+    connection = get_db_connection()
+    if not connection:
+        return {"status": "error", "message": "Database connection failed"}, 500
+
+    try:
+        cursor = connection.cursor()
+        token = None
+        if tracked:
+            issued = int(time.time())
+            # Read the horizon before the data, so nothing committed after
+            # this point can fall below it unseen
+            cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot()) AS horizon")
+            token = f"{cursor.fetchone()['horizon']}.{issued}"
+
+        delta = None if full else _delta(cursor, previous[0])
+        if delta is None:
+            full = True
+            delta = _full(cursor)
+        data, deleted = delta
+
+        return {
+            "status": "success",
+            "message": "Changes retrieved successfully",
+            "full": full,
+            "token": token,
+            "data": data,
+            "deleted": deleted,
+            "count": sum(len(rows) for rows in data.values()) + sum(len(ids) for ids in deleted.values())
+        }, 200
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}, 500
+    finally:
+        connection.close()
+
+def sync_catalog():
+    """
+    Incremental catalog sync for offline-capable clients
+
+    Without `since`, with a token older than the change log retention, or
+    with one issued before a bulk load (generate_data.py), every active row
+    is returned ("full": true) and the client replaces its copy. Otherwise
+    only the rows changed since the token are returned in "data", and rows
+    deleted or deactivated since then as ids in "deleted".
+    Clients store the returned token and send it on their next sync. Other
+    backends have no change log and always answer with a full sync.
+    """
+    payload, error_response = require_jwt_auth(request)
+    if error_response:
+        return error_response
+    start_change_log_pruner()
+
+    body, status = sync_changes(request.args.get('since'))
+    return jsonify(body), status
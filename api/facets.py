@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from db_config import get_db_connection
+
+# Facet counts for the product and service list routes. Each worker holds
+# a FacetIndex built from one GROUP BY per table (category, store, store
+# category, price bucket), so the database does the counting and the worker
+# keeps only the groups. The index has precomputed facets for every
+# combination of the list filters (category, storeId), so a lookup is a
+# dict access whatever the catalog size. It is rebuilt every
+# FACET_REFRESH_SECONDS; counts may lag behind writes by that much.
+FACET_REFRESH_SECONDS = float(os.environ.get('FACET_REFRESH_SECONDS', '60'))
+# Longest a request waits for this worker's first build
+FACET_LOAD_TIMEOUT = float(os.environ.get('FACET_LOAD_TIMEOUT', '10'))
+# Upper edges of the price buckets; the last bucket is open-ended
+FACET_PRICE_EDGES = [
+    float(edge) for edge in os.environ.get('FACET_PRICE_EDGES', '100,500,1000,5000,10000,50000').split(',')
+]
+
+FACET_TABLES = {
+    'products': "products p LEFT JOIN stores s ON p.store_id = s.id",
+    'services': "services p LEFT JOIN stores s ON p.store_id = s.id",
+}
+
+# No filter on this dimension; cannot collide with a category (even None) or store id
+_ANY = object()
+
+_index = None
+_loaded = threading.Event()
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+def _edge_label(edge):
+    return str(int(edge)) if edge.is_integer() else str(edge)
+
+def price_buckets():
+    """Bucket labels in price order, e.g. '0-100', ..., '50000+'"""
+    lower = [0.0] + FACET_PRICE_EDGES
+    labels = [f"{_edge_label(low)}-{_edge_label(high)}" for low, high in zip(lower, FACET_PRICE_EDGES)]
+    return labels + [f"{_edge_label(FACET_PRICE_EDGES[-1])}+"]
+
+def _aggregate_query(table):
+    labels = price_buckets()
+    cases = " ".join(["WHEN p.price < %s THEN %s"] * len(FACET_PRICE_EDGES))
+    params = [value for pair in zip(FACET_PRICE_EDGES, labels) for value in pair] + [labels[-1]]
+    return f"""
+        SELECT p.category, p.store_id, s.category AS store_category,
+               CASE WHEN p.price IS NULL THEN NULL {cases} ELSE %s END AS price_bucket,
+               COUNT(*) AS count
+        FROM {FACET_TABLES[table]}
+        WHERE p.is_active = TRUE
+        GROUP BY 1, 2, 3, 4
+    """, params
+
+def _ranked(counts):
+    return [{"value": value, "count": count} for value, count in sorted(counts.items(), key=lambda item: -item[1])]
+
+class FacetIndex:
+    """
+    Facet counts for every filter combination of the list routes
+
+    Built from grouped rows (category, store_id, store_category,
+    price_bucket, count); each group is added under its four filter keys:
+    (_ANY, _ANY), (category, _ANY), (_ANY, store_id) and (category, store_id).
+    """
+
+    def __init__(self, groups, built_at):
+        self.built_at = built_at
+        self.facets = {}
+        buckets = price_buckets()
+        for table, rows in groups.items():
+            raw = {}
+            for row in rows:
+                category, store_id, count = row['category'], row['store_id'], row['count']
+                for key in ((_ANY, _ANY), (category, _ANY), (_ANY, store_id), (category, store_id)):
+                    facet = raw.setdefault(key, {'total': 0, 'category': {}, 'store_category': {}, 'price': {}})
+                    facet['total'] += count
+                    for name, value in (('category', category), ('store_category', row['store_category']),
+                                        ('price', row['price_bucket'])):
+                        if value is not None:
+                            facet[name][value] = facet[name].get(value, 0) + count
+            # Ranked once here rather than on every request
+            self.facets[table] = {
+                key: {
+                    'total': facet['total'],
+                    'category': _ranked(facet['category']),
+                    'store_category': _ranked(facet['store_category']),
+                    'price': [{"value": label, "count": facet['price'].get(label, 0)} for label in buckets],
+                }
+                for key, facet in raw.items()
+            }
+
+    def counts(self, table, category=None, store_id=None):
+        """
+        Facets of a list route's result under its filters
+
+        The category facet ignores the category filter, so a client can
+        show how many results every other category would give.
+
+        Returns:
+            dict: total, and category, store_category and price as
+            [{"value", "count"}] lists
+        """
+        facets = self.facets[table]
+        store_key = _ANY if store_id is None else store_id
+        filtered = facets.get((_ANY if category is None else category, store_key))
+        unfiltered = facets.get((_ANY, store_key))
+        empty = {'total': 0, 'category': [], 'store_category': [],
+                 'price': [{"value": label, "count": 0} for label in price_buckets()]}
+        result = dict(filtered or empty)
+        result['category'] = (unfiltered or empty)['category']
+        return result
+
+def _build(cursor):
+    groups = {}
+    for table in FACET_TABLES:
+        query, params = _aggregate_query(table)
+        cursor.execute(query, params)
+        groups[table] = cursor.fetchall()
+    return FacetIndex(groups, time.time())
+
+def _refresh_forever():
+    global _index
+    while True:
+        connection = get_db_connection(read_only=True)
+        try:
+            if connection is None:
+                raise RuntimeError("Database connection failed")
+            _index = _build(connection.cursor())
+            _loaded.set()
+        except Exception as e:
+            print(f"Facet index refresh error: {e}")
+        finally:
+            if connection is not None:
+                connection.close()
+        time.sleep(FACET_REFRESH_SECONDS)
+
+def start_facets():
+    """Start this worker's facet refresher (threads do not survive fork())"""
+    global _refresher_pid, _index
+    if _refresher_pid != os.getpid():
+        with _refresher_lock:
+            if _refresher_pid != os.getpid():
+                _index = None
+                _loaded.clear()
+                threading.Thread(target=_refresh_forever, name='facets', daemon=True).start()
+                _refresher_pid = os.getpid()
+
+def current_index():
+    """This worker's facet index, waiting for the first build if needed; None if unavailable"""
+    start_facets()
+    _loaded.wait(FACET_LOAD_TIMEOUT)
+    return _index
@@ -0,0 +1,148 @@
+import os
+
+# Personal announcement feeds. Announcements are fanned out on write: one
+# compact user_feed row per follower, so a feed read is a range scan of that
+# user's primary-key prefix. The copy is made by the announcements_feed_fanout
+# trigger (db_config.py), so announcements from every writer, the PHP
+# dashboard included, reach the feeds. Stores with more followers than
+# FEED_FANOUT_MAX_FOLLOWERS have store_follow_counts.fan_out turned off: they
+# are skipped on write (one announcement would mean that many inserts) and
+# merged into their followers' feeds on read.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.environ.get('FEED_FANOUT_MAX_FOLLOWERS', '10000'))
+# Announcements copied into a feed when its user follows a store
+FEED_BACKFILL = int(os.environ.get('FEED_BACKFILL', '50'))
+FEED_PAGE_SIZE = int(os.environ.get('FEED_PAGE_SIZE', '20'))
+FEED_MAX_PAGE_SIZE = 100
+
+# Newest first by id; `before` is the last id of the previous page
+FEED_QUERY = """
+    SELECT a.*, s.name AS store_name, s.category AS store_category
+    FROM (
+        SELECT * FROM (
+            SELECT f.announcement_id FROM user_feed f
+            JOIN announcements fa ON fa.id = f.announcement_id
+            WHERE f.user_id = %s AND f.announcement_id < %s AND fa.is_active = TRUE
+            ORDER BY f.announcement_id DESC LIMIT %s
+        ) pushed
+        UNION
+        SELECT * FROM (
+            SELECT pa.id AS announcement_id FROM store_follows sf
+            JOIN store_follow_counts c ON c.store_id = sf.store_id
+            JOIN announcements pa ON pa.store_id = sf.store_id
+            WHERE sf.user_id = %s AND c.fan_out = FALSE AND pa.id < %s AND pa.is_active = TRUE
+            ORDER BY pa.id DESC LIMIT %s
+        ) pulled
+    ) feed
+    JOIN announcements a ON a.id = feed.announcement_id
+    LEFT JOIN stores s ON a.store_id = s.id
+    ORDER BY a.id DESC LIMIT %s
+"""
+
+# Larger than any SERIAL id: the first page has no `before`
+_NO_CURSOR = 2 ** 31 - 1
+
+def read_feed(cursor, user_id, before=None, limit=FEED_PAGE_SIZE):
+    """
+    One page of a user's feed
+
+    Args:
+        cursor: Database cursor
+        user_id (int): Feed owner
+        before (int): Only announcements with a smaller id (pagination)
+        limit (int): Page size
+
+    Returns:
+        list: Announcement rows with store_name and store_category
+    """
+    before = before or _NO_CURSOR
+    cursor.execute(FEED_QUERY, (
+        user_id, before, limit,
+        user_id, before, limit,
+        limit
+    ))
+    return cursor.fetchall()
+
+def _update_fan_out(cursor, store_id):
+    """
+    Turn a store's fan-out on or off to match its follower count
+
+    Called after the count changed, in the same transaction (which holds the
+    count row's lock).
+
+    Returns:
+        tuple: (fan_out, resumed); resumed is True if fan-out was just
+        turned back on, so announcements posted meanwhile are missing
+    """
+    cursor.execute("SELECT followers, fan_out FROM store_follow_counts WHERE store_id = %s", (store_id,))
+    row = cursor.fetchone()
+    fan_out = row['followers'] <= FEED_FANOUT_MAX_FOLLOWERS
+    if fan_out == bool(row['fan_out']):
+        return fan_out, False
+    cursor.execute("UPDATE store_follow_counts SET fan_out = %s WHERE store_id = %s", (fan_out, store_id))
+    return fan_out, fan_out
+
+def _backfill(cursor, store_id, user_id=None):
+    """Copy a store's last FEED_BACKFILL announcements into one follower's feed, or every follower's"""
+    params = [store_id, FEED_BACKFILL, store_id]
+    follower = ""
+    if user_id is not None:
+        follower = " AND f.user_id = %s"
+        params.append(user_id)
+    cursor.execute(f"""
+        INSERT INTO user_feed (user_id, announcement_id, store_id)
+        SELECT f.user_id, a.id, a.store_id FROM store_follows f
+        JOIN (
+            SELECT id, store_id FROM announcements
+            WHERE store_id = %s AND is_active = TRUE
+            ORDER BY id DESC LIMIT %s
+        ) a ON a.store_id = f.store_id
+        WHERE f.store_id = %s{follower}
+        ON CONFLICT (user_id, announcement_id) DO NOTHING
+    """, params)
+
+def follow(cursor, user_id, store_id):
+    """
+    Follow a store and backfill its recent announcements into the feed
+
+    Returns:
+        bool: False if the user already followed the store
+    """
+    cursor.execute(
+        "INSERT INTO store_follows (user_id, store_id) VALUES (%s, %s) ON CONFLICT (user_id, store_id) DO NOTHING",
+        (user_id, store_id)
+    )
+    if cursor.rowcount == 0:
+        return False
+    cursor.execute(
+        "INSERT INTO store_follow_counts (store_id, followers) VALUES (%s, 0) ON CONFLICT (store_id) DO NOTHING",
+        (store_id,)
+    )
+    cursor.execute("UPDATE store_follow_counts SET followers = followers + 1 WHERE store_id = %s", (store_id,))
+    fan_out, resumed = _update_fan_out(cursor, store_id)
+    if resumed:
+        # FEED_FANOUT_MAX_FOLLOWERS was raised past this store
+        _backfill(cursor, store_id)
+    elif fan_out:
+        _backfill(cursor, store_id, user_id)
+    return True
+
+def unfollow(cursor, user_id, store_id):
+    """
+    Stop following a store and drop its announcements from the feed
+
+    A store dropping back to FEED_FANOUT_MAX_FOLLOWERS followers has its
+    recent announcements backfilled into every remaining follower's feed.
+
+    Returns:
+        bool: False if the user did not follow the store
+    """
+    cursor.execute("DELETE FROM store_follows WHERE user_id = %s AND store_id = %s", (user_id, store_id))
+    if cursor.rowcount == 0:
+        return False
+    cursor.execute("UPDATE store_follow_counts SET followers = followers - 1 WHERE store_id = %s", (store_id,))
+    if _update_fan_out(cursor, store_id)[1]:
+        # Back under FEED_FANOUT_MAX_FOLLOWERS: the announcements posted while
+        # it was pulled on read are in no follower's feed yet
+        _backfill(cursor, store_id)
+    cursor.execute("DELETE FROM user_feed WHERE user_id = %s AND store_id = %s", (user_id, store_id))
+    return True
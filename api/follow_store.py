@@ -0,0 +1,76 @@
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+from db_config import get_db_connection
+from auth_utils import require_jwt_auth
+from feeds import follow, unfollow
+
+app = Flask(__name__)
+CORS(app)
+
+def set_following(user_id, store_id, following):
+    """
+    Body and status of POST and DELETE /api/stores/<id>/follow (also served by asgi_app.py)
+
+    Args:
+        user_id (int): Follower, from the JWT
+        store_id (int): Store to follow or unfollow
+        following (bool): True to follow, False to unfollow
+
+    Returns:
+        tuple: (response body, HTTP status)
+    """
+    connection = get_db_connection()
+    if not connection:
+        return {"status": "error", "message": "Database connection failed"}, 500
+    
+    try:
+        cursor = connection.cursor()
+        
+        if following:
+            # Check if store exists
+            cursor.execute("SELECT id FROM stores WHERE id = %s", (store_id,))
+            if not cursor.fetchone():
+                return {"status": "error", "message": "Store not found"}, 404
+            
+            followed = follow(cursor, user_id, store_id)
+            message = "Store followed successfully" if followed else "Store already followed"
+        else:
+            if not unfollow(cursor, user_id, store_id):
+                return {"status": "error", "message": "Store not followed"}, 404
+            message = "Store unfollowed successfully"
+        connection.commit()
+        
+        return {
+            "status": "success",
+            "message": message,
+            "store_id": store_id
+        }, 200
+        
+    except Exception as e:
+        connection.rollback()
+        return {"status": "error", "message": str(e)}, 500
+    finally:
+        connection.close()
+
+@app.route('/api/stores/<int:store_id>/follow', methods=['POST'])
+def follow_store(store_id):
+    # JWT authentication check
+    payload, error_response = require_jwt_auth(request)
+    if error_response:
+        return error_response
+    
+    body, status = set_following(payload['user_id'], store_id, True)
+    return jsonify(body), status
+
+@app.route('/api/stores/<int:store_id>/follow', methods=['DELETE'])
+def unfollow_store(store_id):
+    # JWT authentication check
+    payload, error_response = require_jwt_auth(request)
+    if error_response:
+        return error_response
+    
+    body, status = set_following(payload['user_id'], store_id, False)
+    return jsonify(body), status
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5015)
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Synthetic marketplace data generator for scale testing
+
+Fills every table created by init_database() with realistic, reproducible
+data: Arabic names, Zipf-skewed store sizes (a few huge stores, a long tail
+of small ones), weighted category distributions and created_at timestamps
+spread over the last years with more recent activity. Rows are streamed to
+PostgreSQL in chunks with COPY, so a 10M-row dataset builds in minutes; on
+SQLite and MySQL (see db_backend.py) chunks are loaded with executemany.
+
+Usage:
+    python generate_data.py --total-rows 10000000 --seed 42
+    python generate_data.py --total-rows 100000 --truncate
+    DATABASE_URL=sqlite:///marketplace.db python generate_data.py --total-rows 100000
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from db_config import (
+    CHANGE_CHANNEL, CHANGE_LOG_TABLE, CHANGE_RESET, CHANGE_TABLES, get_backend, get_db_connection, init_database,
+    track_untracked_products
+)
+from auth_utils import hash_password
+
+# Share of the total row count each table receives
+TABLE_SHARES = {
+    'users': 0.02,
+    'stores': 0.002,
+    'products': 0.6,
+    'services': 0.1,
+    'jobs': 0.05,
+    'announcements': 0.228,
+}
+
+CHUNK_ROWS = 100000
+
+FIRST_NAMES = [
+    'محمد', 'أحمد', 'عمر', 'علي', 'عثمان', 'إبراهيم', 'يوسف', 'خالد', 'مصطفى', 'حسن',
+    'الطيب', 'عبدالله', 'عبدالرحمن', 'مجدي', 'مأمون', 'صلاح', 'فاطمة', 'آمنة', 'مريم', 'خديجة',
+    'سارة', 'هبة', 'نون', 'رحاب', 'إيمان', 'سلمى', 'وداد', 'منى', 'عائشة', 'زينب',
+]
+FAMILY_NAMES = [
+    'الأمين', 'الخليفة', 'عبدالرحيم', 'البشير', 'النور', 'المهدي', 'الفاضل', 'إدريس', 'بابكر', 'حمد',
+    'الصديق', 'عوض', 'الحسن', 'موسى', 'آدم', 'ميرغني', 'الطاهر', 'سليمان', 'جبريل', 'شرف الدين',
+]
+CITIES = ['الخرطوم', 'أم درمان', 'بحري', 'بورتسودان', 'مدني', 'كسلا', 'الأبيض', 'عطبرة', 'نيالا', 'القضارف']
+
+# category -> (weight, store name prefix, product names, service names)
+CATEGORIES = {
+    'مطاعم': (22, 'مطعم', ['فول مصري', 'طعمية', 'كسرة بالملاح', 'شية', 'عصيدة', 'قراصة', 'سلطة أسود'],
+              ['توصيل طلبات', 'تجهيز ولائم', 'حجز مناسبات']),
+    'بقالة': (18, 'بقالة', ['ذرة', 'دخن', 'سكر', 'شاي', 'بن', 'زيت سمسم', 'فول سوداني', 'كركدي'],
+              ['توصيل للمنازل', 'طلبات شهرية']),
+    'ملابس': (15, 'أزياء', ['جلابية', 'توب سوداني', 'عمامة', 'مركوب', 'طاقية', 'ثوب نسائي', 'شال'],
+              ['خياطة', 'تطريز', 'تفصيل حسب المقاس']),
+    'عطور': (10, 'عطور', ['دلكة', 'خمرة', 'بخور', 'صندل', 'ريحة', 'دهن عود', 'مسك'],
+             ['تجهيز عطور العروس', 'خلطات خاصة']),
+    'إلكترونيات': (12, 'إلكترونيات', ['هاتف ذكي', 'شاحن', 'سماعات', 'مروحة', 'ثلاجة', 'تلفزيون', 'راوتر'],
+                   ['صيانة هواتف', 'تركيب أجهزة', 'برمجة']),
+    'حرف يدوية': (8, 'حرف', ['سعف منسوج', 'فخار', 'جلديات', 'سبحة', 'بنبر', 'طبق', 'مبخر'],
+                  ['ورش تعليمية', 'طلبات خاصة']),
+    'تجميل': (9, 'صالون', ['حناء', 'كريم', 'زيت شعر', 'مشاط', 'صابون طبيعي'],
+              ['حناء عروس', 'مشاط', 'تجميل مناسبات']),
+    'خدمات': (6, 'مكتب', ['باقة استشارة', 'اشتراك شهري', 'كتيب'],
+              ['ترجمة', 'تخليص معاملات', 'نقل عفش', 'دروس خصوصية']),
+}
+ADJECTIVES = ['ممتاز', 'طازج', 'أصلي', 'فاخر', 'اقتصادي', 'مميز', 'بلدي', 'جديد']
+JOB_TITLES = ['كاشير', 'عامل توصيل', 'طباخ', 'مندوب مبيعات', 'محاسب', 'فني صيانة', 'خياط', 'مدير متجر', 'مسوق']
+ANNOUNCEMENT_TITLES = ['تخفيضات كبرى', 'وصل حديثاً', 'عرض نهاية الأسبوع', 'افتتاح فرع جديد', 'عرض رمضان',
+                       'خصم خاص للعملاء', 'منتجات العيد', 'توصيل مجاني']
+
+class Generator:
+    """Seeded row generator; ids are assigned here so foreign keys line up"""
+
+    def __init__(self, seed, days, now=None):
+        self.random = random.Random(seed)
+        self.days = days
+        self.now = now or datetime.now().replace(microsecond=0)
+        self.category_names = list(CATEGORIES)
+        self.category_cum = list(itertools.accumulate(CATEGORIES[c][0] for c in self.category_names))
+        self.password_hash = hash_password('password123')
+
+    def timestamp(self, not_before=None):
+        # u ** 0.5 leans toward 1, i.e. toward recent dates: the marketplace is growing
+        start = not_before or self.now - timedelta(days=self.days)
+        span = (self.now - start).total_seconds()
+        return start + timedelta(seconds=int(span * self.random.random() ** 0.5))
+
+    def person(self):
+        return f"{self.random.choice(FIRST_NAMES)} {self.random.choice(FAMILY_NAMES)}"
+
+    def phone(self):
+        return f"+2499{self.random.randint(10000000, 99999999)}"
+
+    def category(self):
+        return self.random.choices(self.category_names, cum_weights=self.category_cum)[0]
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', ' ').replace('\n', ' ')
+
+def copy_rows(connection, table, columns, rows):
+    """
+    Stream rows into a table, one chunk per transaction
+
+    Uses COPY on PostgreSQL and a multi-row executemany elsewhere.
+
+    Returns:
+        int: Number of rows written
+    """
+    cursor = connection.cursor()
+    total = 0
+    use_copy = get_backend().name == 'postgresql'
+    copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    insert_sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_ROWS))
+        if not chunk:
+            break
+        if use_copy:
+            buffer = io.StringIO()
+            for row in chunk:
+                buffer.write('\t'.join(_copy_value(v) for v in row))
+                buffer.write('\n')
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+        else:
+            cursor.executemany(insert_sql, chunk)
+        connection.commit()
+        total += len(chunk)
+        print(f"  {table}: {total:,} rows", end='\r', flush=True)
+    print()
+    cursor.close()
+    return total
+
+def next_id(connection, table):
+    cursor = connection.cursor()
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 AS next_id FROM {table}")
+    value = cursor.fetchone()['next_id']
+    cursor.close()
+    return value
+
+def generate(connection, counts, seed, days):
+    gen = Generator(seed, days)
+    rng = gen.random
+
+    # Users; roughly one in ten is a merchant
+    first_user = next_id(connection, 'users')
+    user_ids = range(first_user, first_user + counts['users'])
+    user_created = {}
+    merchant_ids = []
+
+    def users():
+        for user_id in user_ids:
+            created = gen.timestamp()
+            user_created[user_id] = created
+            role = 'merchant' if rng.random() < 0.1 else 'customer'
+            if role == 'merchant':
+                merchant_ids.append(user_id)
+            yield (user_id, f"user{user_id}", f"user{user_id}@example.sd", gen.password_hash,
+                   gen.person(), gen.phone(), role, rng.random() < 0.98, created)
+
+    copy_rows(connection, 'users',
+              ['id', 'username', 'email', 'password_hash', 'full_name', 'phone', 'role', 'is_active', 'created_at'],
+              users())
+    if not merchant_ids:
+        merchant_ids.append(first_user)
+
+    # Stores belong to merchants and are never older than their owner
+    first_store = next_id(connection, 'stores')
+    store_ids = list(range(first_store, first_store + counts['stores']))
+    store_meta = {}
+
+    def stores():
+        for store_id in store_ids:
+            owner_id = rng.choice(merchant_ids)
+            category = gen.category()
+            created = gen.timestamp(user_created[owner_id])
+            store_meta[store_id] = (category, created)
+            prefix = CATEGORIES[category][1]
+            yield (store_id, f"{prefix} {rng.choice(FAMILY_NAMES)} {store_id}",
+                   f"{prefix} في {rng.choice(CITIES)}", owner_id, category,
+                   f"{rng.choice(CITIES)}، شارع {rng.randint(1, 60)}", gen.phone(),
+                   rng.random() < 0.95, created)
+
+    copy_rows(connection, 'stores',
+              ['id', 'name', 'description', 'owner_id', 'category', 'address', 'phone', 'is_active', 'created_at'],
+              stores())
+
+    # Zipf-like store popularity: a handful of big stores own most listings
+    shuffled = store_ids[:]
+    rng.shuffle(shuffled)
+    store_cum = list(itertools.accumulate(1.0 / (rank ** 1.1) for rank in range(1, len(shuffled) + 1)))
+
+    def pick_stores(count):
+        while count > 0:
+            batch = min(count, CHUNK_ROWS)
+            yield from rng.choices(shuffled, cum_weights=store_cum, k=batch)
+            count -= batch
+
+    def listings(table, count, names_index):
+        first = next_id(connection, table)
+        for offset, store_id in enumerate(pick_stores(count)):
+            store_category, store_created = store_meta[store_id]
+            # Most listings follow the store's category
+            category = store_category if rng.random() < 0.8 else gen.category()
+            base = rng.choice(CATEGORIES[category][names_index])
+            name = f"{base} {rng.choice(ADJECTIVES)}"
+            price = min(round(rng.lognormvariate(7, 1.2), 2), 99999999.99)
+            yield (first + offset, name, f"{name} من {rng.choice(CITIES)}", price,
+                   store_id, category, rng.random() < 0.93, gen.timestamp(store_created))
+
+    listing_columns = ['id', 'name', 'description', 'price', 'store_id', 'category', 'is_active', 'created_at']
+    copy_rows(connection, 'products', listing_columns, listings('products', counts['products'], 2))
+    copy_rows(connection, 'services', listing_columns, listings('services', counts['services'], 3))
+
+    def jobs():
+        first = next_id(connection, 'jobs')
+        for offset, store_id in enumerate(pick_stores(counts['jobs'])):
+            title = rng.choice(JOB_TITLES)
+            yield (first + offset, title, f"مطلوب {title} بخبرة", round(rng.uniform(50000, 600000), -3),
+                   rng.choice(CITIES), store_id, rng.random() < 0.85, gen.timestamp(store_meta[store_id][1]))
+
+    copy_rows(connection, 'jobs',
+              ['id', 'title', 'description', 'salary', 'location', 'store_id', 'is_active', 'created_at'],
+              jobs())
+
+    def announcements():
+        first = next_id(connection, 'announcements')
+        for offset, store_id in enumerate(pick_stores(counts['announcements'])):
+            title = rng.choice(ANNOUNCEMENT_TITLES)
+            yield (first + offset, title, f"{title} لدى {store_meta[store_id][0]}", store_id,
+                   rng.random() < 0.7, gen.timestamp(store_meta[store_id][1]))
+
+    copy_rows(connection, 'announcements',
+              ['id', 'title', 'content', 'store_id', 'is_active', 'created_at'],
+              announcements())
+
+@contextlib.contextmanager
+def change_triggers_paused(connection):
+    """
+    Load without the change triggers (PostgreSQL only)
+
+    Each COPY'd row would otherwise add a change log row and a notification
+    to every worker. Instead the log is replaced by one CHANGE_RESET entry
+    afterwards and CHANGE_RESET is announced once, so caches and snapshots
+    start over and sync clients get a full sync. Writes by the app while the
+    triggers are off are covered by the same reset.
+    """
+    if get_backend().name != 'postgresql':
+        yield
+        return
+    cursor = connection.cursor()
+    for table in CHANGE_TABLES:
+        cursor.execute(f"ALTER TABLE {table} DISABLE TRIGGER {table}_change_notify")
+    connection.commit()
+    try:
+        yield
+    finally:
+        connection.rollback()
+        for table in CHANGE_TABLES:
+            cursor.execute(f"ALTER TABLE {table} ENABLE TRIGGER {table}_change_notify")
+        cursor.execute(f"TRUNCATE {CHANGE_LOG_TABLE}")
+        cursor.execute(f"INSERT INTO {CHANGE_LOG_TABLE} (table_name, row_id) VALUES (%s, 0)", (CHANGE_RESET,))
+        cursor.execute("SELECT pg_notify(%s, %s)", (CHANGE_CHANNEL, CHANGE_RESET))
+        connection.commit()
+        cursor.close()
+
+def reset_sequences(connection, tables):
+    # SQLite and MySQL advance their auto-increment counters on explicit ids
+    if get_backend().name != 'postgresql':
+        return
+    cursor = connection.cursor()
+    for table in tables:
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+        )
+    connection.commit()
+    cursor.close()
+
+def track_products(connection):
+    """product_views rows for the generated products, which sort=popular joins"""
+    cursor = connection.cursor()
+    track_untracked_products(cursor)
+    connection.commit()
+    cursor.close()
+
+def ensure_admin(connection):
+    """Create the documented admin/admin account so benchmark.py can log in"""
+    cursor = connection.cursor()
+    cursor.execute("SELECT id FROM users WHERE username = %s", ('admin',))
+    if not cursor.fetchone():
+        cursor.execute(
+            "INSERT INTO users (username, email, password_hash, full_name, role) VALUES (%s, %s, %s, %s, %s)",
+            ('admin', 'admin@example.sd', hash_password('admin'), 'مدير النظام', 'admin')
+        )
+        connection.commit()
+    cursor.close()
+
+def analyze(connection):
+    cursor = connection.cursor()
+    if get_backend().name == 'mysql':
+        cursor.execute(f"ANALYZE TABLE {', '.join(TABLE_SHARES)}")
+        cursor.fetchall()
+    else:
+        cursor.execute("ANALYZE")
+    # PostgreSQL keeps the new statistics only if the transaction commits
+    connection.commit()
+    cursor.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic marketplace data")
+    parser.add_argument('--total-rows', type=int, default=10000000,
+                        help="Approximate number of rows across all tables")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=730, help="Spread created_at over this many days")
+    parser.add_argument('--truncate', action='store_true', help="Empty the tables first")
+    for table in TABLE_SHARES:
+        parser.add_argument(f'--{table}', type=int, help=f"Exact number of {table} rows")
+    args = parser.parse_args()
+
+    counts = {
+        table: getattr(args, table) if getattr(args, table) is not None else max(1, int(args.total_rows * share))
+        for table, share in TABLE_SHARES.items()
+    }
+
+    init_database()
+    connection = get_db_connection(timeout=30)
+    if not connection:
+        sys.exit("Database connection failed")
+
+    try:
+        with change_triggers_paused(connection):
+            if args.truncate:
+                cursor = connection.cursor()
+                # product_views has no foreign key, and its rows would land on
+                # the new products that reuse the ids
+                if get_backend().name == 'postgresql':
+                    cursor.execute(f"TRUNCATE {', '.join(TABLE_SHARES)}, product_views RESTART IDENTITY CASCADE")
+                else:
+                    cursor.execute("DELETE FROM product_views")
+                    # Children first so foreign keys never dangle
+                    for table in reversed(list(TABLE_SHARES)):
+                        cursor.execute(f"DELETE FROM {table}")
+                connection.commit()
+                cursor.close()
+
+            started = time.perf_counter()
+            print("Generating " + ", ".join(f"{count:,} {table}" for table, count in counts.items()))
+            generate(connection, counts, args.seed, args.days)
+            reset_sequences(connection, TABLE_SHARES)
+            track_products(connection)
+
+        ensure_admin(connection)
+        analyze(connection)
+        print(f"Done: {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    main()
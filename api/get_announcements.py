@@ -1,66 +1,66 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, verify_jwt_token
+from catalog_snapshot import list_catalog
+from prepared_statements import execute_prepared
+from query_builder import Filter, ListQuery
+from response_cache import cached
+from single_flight import coalesce
 
 app = Flask(__name__)
 CORS(app)
 
+ANNOUNCEMENTS_QUERY = ListQuery(
+    """
+    SELECT a.*, s.name AS store_name, s.category AS store_category
+    FROM announcements a
+    LEFT JOIN stores s ON a.store_id = s.id
+    """,
+    filters=[
+        Filter('store_id', "a.store_id = %s"),
+        Filter('active_only', "a.is_active = TRUE", param=False),
+    ],
+    order_by="a.created_at DESC"
+)
+
 @app.route('/api/announcements', methods=['GET'])
+@cached(['announcements', 'stores'], authorize=verify_jwt_token)
+@coalesce(authorize=verify_jwt_token)
 def get_announcements():
     # JWT authentication check
     payload, error_response = require_jwt_auth(request)
     if error_response:
         return error_response
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"status": "error", "message": "Database connection failed"}), 500
+    # Get query parameters
+    store_id = request.args.get('storeId')
+    active_only = request.args.get('active', 'true').lower() == 'true'
+    limit = request.args.get('limit', type=int)
     
-    try:
-        cursor = connection.cursor()
-        
-        # Get query parameters
-        store_id = request.args.get('storeId')
-        active_only = request.args.get('active', 'true').lower() == 'true'
-        limit = request.args.get('limit', type=int)
-        
-        # Build query
-        query = """
-            SELECT a.*, s.name as storeName, s.category as storeCategory
-            FROM announcements a
-            LEFT JOIN stores s ON a.storeId = s.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if store_id:
-            query += " AND a.storeId = %s"
-            params.append(store_id)
-        
-        if active_only:
-            query += " AND a.isActive = 1"
+    # Served from worker memory when the catalog snapshot is enabled
+    announcements = list_catalog('announcements', active_only, store_id=store_id, limit=limit)
+    if announcements is None:
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"status": "error", "message": "Database connection failed"}), 500
         
-        query += " ORDER BY a.createdAt DESC"
-        
-        if limit:
-            query += " LIMIT %s"
-            params.append(limit)
-        
-        cursor.execute(query, params)
-        announcements = cursor.fetchall()
-        
-        return jsonify({
-            "status": "success",
-            "message": "Announcements retrieved successfully",
-            "data": announcements,
-            "count": len(announcements)
-        })
-        
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            query, params = ANNOUNCEMENTS_QUERY.build(store_id=store_id, active_only=active_only, limit=limit)
+            execute_prepared(cursor, query, params)
+            announcements = cursor.fetchall()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        finally:
+            connection.close()
+    
+    return jsonify({
+        "status": "success",
+        "message": "Announcements retrieved successfully",
+        "data": announcements,
+        "count": len(announcements)
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5014)
\ No newline at end of file
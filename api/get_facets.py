@@ -0,0 +1,49 @@
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+from auth_utils import require_jwt_auth
+from facets import FACET_TABLES, current_index
+
+app = Flask(__name__)
+CORS(app)
+
+def facet_counts(args):
+    """
+    Body and status of GET /api/facets (also served by asgi_app.py)
+
+    Args:
+        args: The request's query arguments
+
+    Returns:
+        tuple: (response body, HTTP status)
+    """
+    # Same filters as /api/products and /api/services (active rows only)
+    kind = args.get('type')
+    category = args.get('category') or None
+    store_id = args.get('storeId', type=int)
+    
+    if kind is not None and kind not in FACET_TABLES:
+        return {"status": "error", "message": "type must be 'products' or 'services'"}, 400
+    
+    index = current_index()
+    if index is None:
+        return {"status": "error", "message": "Facet counts are not available yet"}, 503
+    
+    return {
+        "status": "success",
+        "message": "Facets retrieved successfully",
+        "data": {table: index.counts(table, category, store_id) for table in ([kind] if kind else FACET_TABLES)},
+        "refreshed_at": int(index.built_at)
+    }, 200
+
+@app.route('/api/facets', methods=['GET'])
+def get_facets():
+    # JWT authentication check
+    payload, error_response = require_jwt_auth(request)
+    if error_response:
+        return error_response
+    
+    body, status = facet_counts(request.args)
+    return jsonify(body), status
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5018)
@@ -0,0 +1,57 @@
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+from db_config import get_db_connection
+from auth_utils import require_jwt_auth
+from feeds import FEED_MAX_PAGE_SIZE, FEED_PAGE_SIZE, read_feed
+
+app = Flask(__name__)
+CORS(app)
+
+def feed_page(user_id, args):
+    """
+    Body and status of GET /api/feed (also served by asgi_app.py)
+
+    Args:
+        user_id (int): Feed owner, from the JWT
+        args: The request's query arguments
+
+    Returns:
+        tuple: (response body, HTTP status)
+    """
+    before = args.get('before', type=int)
+    limit = min(max(args.get('limit', FEED_PAGE_SIZE, type=int), 1), FEED_MAX_PAGE_SIZE)
+    
+    connection = get_db_connection(read_only=True)
+    if not connection:
+        return {"status": "error", "message": "Database connection failed"}, 500
+    
+    try:
+        cursor = connection.cursor()
+        announcements = read_feed(cursor, user_id, before, limit)
+        
+        return {
+            "status": "success",
+            "message": "Feed retrieved successfully",
+            "data": announcements,
+            "count": len(announcements),
+            # Pass back as ?before= for the next page
+            "next": announcements[-1]['id'] if len(announcements) == limit else None
+        }, 200
+        
+    except Exception as e:
+        return {"status": "error", "message": str(e)}, 500
+    finally:
+        connection.close()
+
+@app.route('/api/feed', methods=['GET'])
+def get_feed():
+    # JWT authentication check
+    payload, error_response = require_jwt_auth(request)
+    if error_response:
+        return error_response
+    
+    body, status = feed_page(payload['user_id'], request.args)
+    return jsonify(body), status
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5016)
@@ -1,71 +1,68 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, verify_jwt_token
+from catalog_snapshot import list_catalog
+from prepared_statements import execute_prepared
+from query_builder import Filter, ListQuery
+from response_cache import cached
+from single_flight import coalesce
 
 app = Flask(__name__)
 CORS(app)
 
+JOBS_QUERY = ListQuery(
+    """
+    SELECT j.*, s.name AS store_name, s.category AS store_category
+    FROM jobs j
+    LEFT JOIN stores s ON j.store_id = s.id
+    """,
+    filters=[
+        Filter('store_id', "j.store_id = %s"),
+        Filter('location', "j.location LIKE %s", transform=lambda value: f"%{value}%"),
+        Filter('active_only', "j.is_active = TRUE", param=False),
+    ],
+    order_by="j.created_at DESC"
+)
+
 @app.route('/api/jobs', methods=['GET'])
+@cached(['jobs', 'stores'], authorize=verify_jwt_token)
+@coalesce(authorize=verify_jwt_token)
 def get_jobs():
     # JWT authentication check
     payload, error_response = require_jwt_auth(request)
     if error_response:
         return error_response
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"status": "error", "message": "Database connection failed"}), 500
+    # Get query parameters
+    store_id = request.args.get('storeId')
+    location = request.args.get('location')
+    active_only = request.args.get('active', 'true').lower() == 'true'
+    limit = request.args.get('limit', type=int)
     
-    try:
-        cursor = connection.cursor()
-        
-        # Get query parameters
-        store_id = request.args.get('storeId')
-        location = request.args.get('location')
-        active_only = request.args.get('active', 'true').lower() == 'true'
-        limit = request.args.get('limit', type=int)
-        
-        # Build query
-        query = """
-            SELECT j.*, s.name as storeName, s.category as storeCategory
-            FROM jobs j
-            LEFT JOIN stores s ON j.storeId = s.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if store_id:
-            query += " AND j.storeId = %s"
-            params.append(store_id)
-        
-        if location:
-            query += " AND j.location LIKE %s"
-            params.append(f"%{location}%")
-        
-        if active_only:
-            query += " AND j.isActive = 1"
+    # Served from worker memory when the catalog snapshot is enabled
+    jobs = list_catalog('jobs', active_only, store_id=store_id, location=location, limit=limit)
+    if jobs is None:
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"status": "error", "message": "Database connection failed"}), 500
         
-        query += " ORDER BY j.createdAt DESC"
-        
-        if limit:
-            query += " LIMIT %s"
-            params.append(limit)
-        
-        cursor.execute(query, params)
-        jobs = cursor.fetchall()
-        
-        return jsonify({
-            "status": "success",
-            "message": "Jobs retrieved successfully",
-            "data": jobs,
-            "count": len(jobs)
-        })
-        
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            query, params = JOBS_QUERY.build(store_id=store_id, location=location, active_only=active_only, limit=limit)
+            execute_prepared(cursor, query, params)
+            jobs = cursor.fetchall()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        finally:
+            connection.close()
+    
+    return jsonify({
+        "status": "success",
+        "message": "Jobs retrieved successfully",
+        "data": jobs,
+        "count": len(jobs)
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5012)
\ No newline at end of file
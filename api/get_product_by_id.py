@@ -1,51 +1,53 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, verify_jwt_token
+from catalog_snapshot import product_detail
+from response_cache import cached
+from single_flight import coalesce
+from view_counter import counts_views
+from prepared_statements import PRODUCT_DETAIL
 
 app = Flask(__name__)
 CORS(app)
 
 @app.route('/api/products/<int:product_id>', methods=['GET'])
+@counts_views('product_id')
+@cached(['products', 'stores', 'users'], id_arg='product_id', authorize=verify_jwt_token)
+@coalesce(authorize=verify_jwt_token)
 def get_product_by_id(product_id):
     # JWT authentication check
     payload, error_response = require_jwt_auth(request)
     if error_response:
         return error_response
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"status": "error", "message": "Database connection failed"}), 500
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Get product details with store information
-        cursor.execute("""
-            SELECT p.*, s.name as storeName, s.category as storeCategory, 
-                   s.address as storeAddress, s.phone as storePhone,
-                   u.username as storeOwnerName, u.fullName as storeOwnerFullName
-            FROM products p
-            LEFT JOIN stores s ON p.storeId = s.id
-            LEFT JOIN users u ON s.ownerId = u.id
-            WHERE p.id = %s
-        """, (product_id,))
-        
-        product = cursor.fetchone()
-        
-        if not product:
-            return jsonify({"status": "error", "message": "Product not found"}), 404
+    # Served from worker memory when the catalog snapshot is enabled
+    product = product_detail(product_id)
+    if product is None:
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"status": "error", "message": "Database connection failed"}), 500
         
-        return jsonify({
-            "status": "success",
-            "message": "Product retrieved successfully",
-            "data": product
-        })
-        
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            
+            # Get product details with store information
+            PRODUCT_DETAIL.execute(cursor, (product_id,))
+            
+            product = cursor.fetchone()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        finally:
+            connection.close()
+    
+    if not product:
+        return jsonify({"status": "error", "message": "Product not found"}), 404
+    
+    return jsonify({
+        "status": "success",
+        "message": "Product retrieved successfully",
+        "data": product
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5008)
\ No newline at end of file
@@ -1,71 +1,125 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, verify_jwt_token
+from batch_lookup import BATCH_MAX_IDS, fetch_by_ids, parse_ids
+from catalog_snapshot import list_catalog, product_details
+from prepared_statements import PRODUCT_DETAILS, execute_prepared
+from query_builder import Filter, ListQuery, Sort
+from response_cache import cached
+from single_flight import coalesce
 
 app = Flask(__name__)
 CORS(app)
 
+PRODUCTS_QUERY = ListQuery(
+    """
+    SELECT p.*, s.name AS store_name, s.category AS store_category
+    FROM products p
+    LEFT JOIN stores s ON p.store_id = s.id
+    """,
+    filters=[
+        # One category is an equality, which the (category, ...) indexes
+        # return in sort order; several are a single array parameter
+        Filter('category', "p.category = %s"),
+        Filter('categories', "p.category = ANY(%s)", many=True),
+        Filter('store_id', "p.store_id = %s"),
+        Filter('min_price', "p.price >= %s"),
+        Filter('max_price', "p.price <= %s"),
+        Filter('active_only', "p.is_active = TRUE", param=False),
+    ],
+    # Each ordering has an index per filter prefix (db_config.init_database)
+    sorts={
+        'newest': Sort(('p.created_at', 'p.id'), ('created_at', 'id'), descending=True),
+        'price_asc': Sort(('p.price', 'p.id'), ('price', 'id'), descending=False, condition="p.price IS NOT NULL"),
+        'price_desc': Sort(('p.price', 'p.id'), ('price', 'id'), descending=True, condition="p.price IS NOT NULL"),
+        # Walks product_views by views; every product has a row there
+        'popular': Sort(('v.views', 'v.product_id'), ('views', 'id'), descending=True,
+                        join="JOIN product_views v ON v.product_id = p.id", select="v.views"),
+    }
+)
+
 @app.route('/api/products', methods=['GET'])
+@cached(['products', 'stores'], authorize=verify_jwt_token)
+@coalesce(authorize=verify_jwt_token)
 def get_products():
     # JWT authentication check
     payload, error_response = require_jwt_auth(request)
     if error_response:
         return error_response
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"status": "error", "message": "Database connection failed"}), 500
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Get query parameters
-        category = request.args.get('category')
-        store_id = request.args.get('storeId')
-        active_only = request.args.get('active', 'true').lower() == 'true'
-        limit = request.args.get('limit', type=int)
-        
-        # Build query
-        query = """
-            SELECT p.*, s.name as storeName, s.category as storeCategory
-            FROM products p
-            LEFT JOIN stores s ON p.storeId = s.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if category:
-            query += " AND p.category = %s"
-            params.append(category)
-        
-        if store_id:
-            query += " AND p.storeId = %s"
-            params.append(store_id)
-        
-        if active_only:
-            query += " AND p.isActive = 1"
-        
-        query += " ORDER BY p.createdAt DESC"
-        
-        if limit:
-            query += " LIMIT %s"
-            params.append(limit)
-        
-        cursor.execute(query, params)
-        products = cursor.fetchall()
-        
+    # Batch lookup: ?ids=1,2,3 returns those products in request order
+    raw_ids = request.args.get('ids')
+    if raw_ids is not None:
+        ids = parse_ids(raw_ids)
+        if ids is None:
+            return jsonify({"status": "error", "message": "ids must be comma-separated integers"}), 400
+        if len(ids) > BATCH_MAX_IDS:
+            return jsonify({"status": "error", "message": f"At most {BATCH_MAX_IDS} ids per request"}), 400
+        try:
+            products, missing = fetch_by_ids(ids, product_details(ids), PRODUCT_DETAILS)
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
         return jsonify({
             "status": "success",
             "message": "Products retrieved successfully",
             "data": products,
-            "count": len(products)
+            "count": len(products),
+            "missing": missing
         })
+    
+    # Get query parameters
+    categories = [category for category in request.args.getlist('category') if category]
+    store_id = request.args.get('storeId')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    sort = request.args.get('sort', PRODUCTS_QUERY.default_sort)
+    cursor_token = request.args.get('cursor')
+    active_only = request.args.get('active', 'true').lower() == 'true'
+    limit = request.args.get('limit', type=int)
+    
+    if sort not in PRODUCTS_QUERY.sorts:
+        return jsonify({"status": "error", "message": f"sort must be one of: {', '.join(PRODUCTS_QUERY.sorts)}"}), 400
+    after = None
+    if cursor_token:
+        after = PRODUCTS_QUERY.parse_cursor(cursor_token, sort)
+        if after is None:
+            return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+    
+    # Served from worker memory when the catalog snapshot is enabled; it
+    # keeps the default order only and has no price or multi-category index
+    products = None
+    category = categories[0] if len(categories) == 1 else None
+    prices = min_price is not None or max_price is not None
+    if sort == PRODUCTS_QUERY.default_sort and not (after or prices or len(categories) > 1):
+        products = list_catalog('products', active_only, category=category, store_id=store_id, limit=limit)
+    if products is None:
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"status": "error", "message": "Database connection failed"}), 500
         
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            query, params = PRODUCTS_QUERY.build(
+                category=category, categories=categories if len(categories) > 1 else None,
+                store_id=store_id, min_price=min_price, max_price=max_price,
+                active_only=active_only, limit=limit, sort=sort, after=after
+            )
+            execute_prepared(cursor, query, params)
+            products = cursor.fetchall()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        finally:
+            connection.close()
+    
+    return jsonify({
+        "status": "success",
+        "message": "Products retrieved successfully",
+        "data": products,
+        "count": len(products),
+        # Pass back as ?cursor= (with the same filters and sort) for the next page
+        "next": PRODUCTS_QUERY.cursor_for(products[-1], sort) if limit and len(products) == limit else None
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5007)
\ No newline at end of file
@@ -1,71 +1,102 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, verify_jwt_token
+from catalog_snapshot import list_catalog
+from prepared_statements import execute_prepared
+from query_builder import Filter, ListQuery, Sort
+from response_cache import cached
+from single_flight import coalesce
 
 app = Flask(__name__)
 CORS(app)
 
+SERVICES_QUERY = ListQuery(
+    """
+    SELECT s.*, st.name AS store_name, st.category AS store_category
+    FROM services s
+    LEFT JOIN stores st ON s.store_id = st.id
+    """,
+    filters=[
+        # One category is an equality, which the (category, ...) indexes
+        # return in sort order; several are a single array parameter
+        Filter('category', "s.category = %s"),
+        Filter('categories', "s.category = ANY(%s)", many=True),
+        Filter('store_id', "s.store_id = %s"),
+        Filter('min_price', "s.price >= %s"),
+        Filter('max_price', "s.price <= %s"),
+        Filter('active_only', "s.is_active = TRUE", param=False),
+    ],
+    # Each ordering has an index per filter prefix (db_config.init_database).
+    # No 'popular': only product views are counted.
+    sorts={
+        'newest': Sort(('s.created_at', 's.id'), ('created_at', 'id'), descending=True),
+        'price_asc': Sort(('s.price', 's.id'), ('price', 'id'), descending=False, condition="s.price IS NOT NULL"),
+        'price_desc': Sort(('s.price', 's.id'), ('price', 'id'), descending=True, condition="s.price IS NOT NULL"),
+    }
+)
+
 @app.route('/api/services', methods=['GET'])
+@cached(['services', 'stores'], authorize=verify_jwt_token)
+@coalesce(authorize=verify_jwt_token)
 def get_services():
     # JWT authentication check
     payload, error_response = require_jwt_auth(request)
     if error_response:
         return error_response
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"status": "error", "message": "Database connection failed"}), 500
+    # Get query parameters
+    categories = [category for category in request.args.getlist('category') if category]
+    store_id = request.args.get('storeId')
+    min_price = request.args.get('min_price', type=float)
+    max_price = request.args.get('max_price', type=float)
+    sort = request.args.get('sort', SERVICES_QUERY.default_sort)
+    cursor_token = request.args.get('cursor')
+    active_only = request.args.get('active', 'true').lower() == 'true'
+    limit = request.args.get('limit', type=int)
     
-    try:
-        cursor = connection.cursor()
-        
-        # Get query parameters
-        category = request.args.get('category')
-        store_id = request.args.get('storeId')
-        active_only = request.args.get('active', 'true').lower() == 'true'
-        limit = request.args.get('limit', type=int)
-        
-        # Build query
-        query = """
-            SELECT s.*, st.name as storeName, st.category as storeCategory
-            FROM services s
-            LEFT JOIN stores st ON s.storeId = st.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if category:
-            query += " AND s.category = %s"
-            params.append(category)
-        
-        if store_id:
-            query += " AND s.storeId = %s"
-            params.append(store_id)
-        
-        if active_only:
-            query += " AND s.isActive = 1"
-        
-        query += " ORDER BY s.createdAt DESC"
-        
-        if limit:
-            query += " LIMIT %s"
-            params.append(limit)
-        
-        cursor.execute(query, params)
-        services = cursor.fetchall()
-        
-        return jsonify({
-            "status": "success",
-            "message": "Services retrieved successfully",
-            "data": services,
-            "count": len(services)
-        })
+    if sort not in SERVICES_QUERY.sorts:
+        return jsonify({"status": "error", "message": f"sort must be one of: {', '.join(SERVICES_QUERY.sorts)}"}), 400
+    after = None
+    if cursor_token:
+        after = SERVICES_QUERY.parse_cursor(cursor_token, sort)
+        if after is None:
+            return jsonify({"status": "error", "message": "Invalid cursor"}), 400
+    
+    # Served from worker memory when the catalog snapshot is enabled; it
+    # keeps the default order only and has no price or multi-category index
+    services = None
+    category = categories[0] if len(categories) == 1 else None
+    prices = min_price is not None or max_price is not None
+    if sort == SERVICES_QUERY.default_sort and not (after or prices or len(categories) > 1):
+        services = list_catalog('services', active_only, category=category, store_id=store_id, limit=limit)
+    if services is None:
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"status": "error", "message": "Database connection failed"}), 500
         
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            query, params = SERVICES_QUERY.build(
+                category=category, categories=categories if len(categories) > 1 else None,
+                store_id=store_id, min_price=min_price, max_price=max_price,
+                active_only=active_only, limit=limit, sort=sort, after=after
+            )
+            execute_prepared(cursor, query, params)
+            services = cursor.fetchall()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        finally:
+            connection.close()
+    
+    return jsonify({
+        "status": "success",
+        "message": "Services retrieved successfully",
+        "data": services,
+        "count": len(services),
+        # Pass back as ?cursor= (with the same filters and sort) for the next page
+        "next": SERVICES_QUERY.cursor_for(services[-1], sort) if limit and len(services) == limit else None
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5010)
\ No newline at end of file
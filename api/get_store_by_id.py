@@ -1,69 +1,96 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, verify_jwt_token
+from catalog_snapshot import store_detail
+from response_cache import cached
+from single_flight import coalesce
+from store_includes import load_includes, parse_includes
+from store_visitors import cached_unique_visitors, counts_visitors
 
 app = Flask(__name__)
 CORS(app)
 
 @app.route('/api/stores/<int:store_id>', methods=['GET'])
+@counts_visitors('store_id')
+@cached(['stores', 'users', 'products', 'services', 'jobs', 'announcements'],
+        id_arg='store_id', authorize=verify_jwt_token)
+@coalesce(authorize=verify_jwt_token)
 def get_store_by_id(store_id):
     # JWT authentication check
     payload, error_response = require_jwt_auth(request)
     if error_response:
         return error_response
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"status": "error", "message": "Database connection failed"}), 500
+    # ?include=products,services,jobs,announcements embeds the store's listings
+    includes = parse_includes(request.args)
+    if includes is None:
+        return jsonify({"status": "error", "message": "include must list products, services, jobs or announcements"}), 400
     
-    try:
-        cursor = connection.cursor()
+    # Served from worker memory when the catalog snapshot is enabled
+    store = store_detail(store_id)
+    if store is None:
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"status": "error", "message": "Database connection failed"}), 500
         
-        # Get store details with owner information
-        cursor.execute("""
-            SELECT s.*, u.username as ownerName, u.fullName as ownerFullName, u.email as ownerEmail
-            FROM stores s
-            LEFT JOIN users u ON s.ownerId = u.id
-            WHERE s.id = %s
-        """, (store_id,))
-        
-        store = cursor.fetchone()
-        
-        if not store:
-            return jsonify({"status": "error", "message": "Store not found"}), 404
-        
-        # Get store statistics
-        cursor.execute("SELECT COUNT(*) as count FROM products WHERE storeId = %s AND isActive = 1", (store_id,))
-        products_count = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM services WHERE storeId = %s AND isActive = 1", (store_id,))
-        services_count = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM jobs WHERE storeId = %s AND isActive = 1", (store_id,))
-        jobs_count = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM announcements WHERE storeId = %s AND isActive = 1", (store_id,))
-        announcements_count = cursor.fetchone()['count']
-        
-        # Add statistics to store data
-        store['statistics'] = {
-            'products': products_count,
-            'services': services_count,
-            'jobs': jobs_count,
-            'announcements': announcements_count
-        }
-        
-        return jsonify({
-            "status": "success",
-            "message": "Store retrieved successfully",
-            "data": store
-        })
-        
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            
+            # Get store details with owner information
+            cursor.execute("""
+                SELECT s.*, u.username AS owner_name, u.full_name AS owner_full_name, u.email AS owner_email
+                FROM stores s
+                LEFT JOIN users u ON s.owner_id = u.id
+                WHERE s.id = %s
+            """, (store_id,))
+            
+            store = cursor.fetchone()
+            
+            if not store:
+                return jsonify({"status": "error", "message": "Store not found"}), 404
+            
+            # Get store statistics
+            cursor.execute("SELECT COUNT(*) as count FROM products WHERE store_id = %s AND is_active = TRUE", (store_id,))
+            products_count = cursor.fetchone()['count']
+            
+            cursor.execute("SELECT COUNT(*) as count FROM services WHERE store_id = %s AND is_active = TRUE", (store_id,))
+            services_count = cursor.fetchone()['count']
+            
+            cursor.execute("SELECT COUNT(*) as count FROM jobs WHERE store_id = %s AND is_active = TRUE", (store_id,))
+            jobs_count = cursor.fetchone()['count']
+            
+            cursor.execute("SELECT COUNT(*) as count FROM announcements WHERE store_id = %s AND is_active = TRUE", (store_id,))
+            announcements_count = cursor.fetchone()['count']
+            
+            # Add statistics to store data
+            store['statistics'] = {
+                'products': products_count,
+                'services': services_count,
+                'jobs': jobs_count,
+                'announcements': announcements_count
+            }
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        finally:
+            connection.close()
+    
+    # Approximate distinct signed-in visitors, from the daily sketches
+    visitors = cached_unique_visitors(store_id)
+    if visitors is not None:
+        store['statistics']['unique_visitors'] = visitors
+    
+    if includes:
+        try:
+            store.update(load_includes(store_id, includes))
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+    
+    return jsonify({
+        "status": "success",
+        "message": "Store retrieved successfully",
+        "data": store
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5005)
\ No newline at end of file
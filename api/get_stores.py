@@ -1,66 +1,88 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, verify_jwt_token
+from batch_lookup import BATCH_MAX_IDS, fetch_by_ids, parse_ids
+from catalog_snapshot import list_catalog, store_details
+from prepared_statements import STORE_DETAILS, execute_prepared
+from query_builder import Filter, ListQuery
+from response_cache import cached
+from single_flight import coalesce
 
 app = Flask(__name__)
 CORS(app)
 
+STORES_QUERY = ListQuery(
+    """
+    SELECT s.*, u.username AS owner_name, u.full_name AS owner_full_name
+    FROM stores s
+    LEFT JOIN users u ON s.owner_id = u.id
+    """,
+    filters=[
+        Filter('category', "s.category = %s"),
+        Filter('owner_id', "s.owner_id = %s"),
+        Filter('active_only', "s.is_active = TRUE", param=False),
+    ],
+    order_by="s.created_at DESC"
+)
+
 @app.route('/api/stores', methods=['GET'])
+@cached(['stores', 'users'], authorize=verify_jwt_token)
+@coalesce(authorize=verify_jwt_token)
 def get_stores():
     # JWT authentication check
     payload, error_response = require_jwt_auth(request)
     if error_response:
         return error_response
     
-    connection = get_db_connection()
-    if not connection:
-        return jsonify({"status": "error", "message": "Database connection failed"}), 500
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Get query parameters
-        category = request.args.get('category')
-        owner_id = request.args.get('ownerId')
-        active_only = request.args.get('active', 'true').lower() == 'true'
-        
-        # Build query
-        query = """
-            SELECT s.*, u.username as ownerName, u.fullName as ownerFullName
-            FROM stores s
-            LEFT JOIN users u ON s.ownerId = u.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if category:
-            query += " AND s.category = %s"
-            params.append(category)
-        
-        if owner_id:
-            query += " AND s.ownerId = %s"
-            params.append(owner_id)
-        
-        if active_only:
-            query += " AND s.isActive = 1"
-        
-        query += " ORDER BY s.createdAt DESC"
-        
-        cursor.execute(query, params)
-        stores = cursor.fetchall()
-        
+    # Batch lookup: ?ids=1,2,3 returns those stores in request order
+    raw_ids = request.args.get('ids')
+    if raw_ids is not None:
+        ids = parse_ids(raw_ids)
+        if ids is None:
+            return jsonify({"status": "error", "message": "ids must be comma-separated integers"}), 400
+        if len(ids) > BATCH_MAX_IDS:
+            return jsonify({"status": "error", "message": f"At most {BATCH_MAX_IDS} ids per request"}), 400
+        try:
+            stores, missing = fetch_by_ids(ids, store_details(ids), STORE_DETAILS)
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
         return jsonify({
             "status": "success",
             "message": "Stores retrieved successfully",
             "data": stores,
-            "count": len(stores)
+            "count": len(stores),
+            "missing": missing
         })
+    
+    # Get query parameters
+    category = request.args.get('category')
+    owner_id = request.args.get('ownerId')
+    active_only = request.args.get('active', 'true').lower() == 'true'
+    
+    # Served from worker memory when the catalog snapshot is enabled
+    stores = list_catalog('stores', active_only, category=category, owner_id=owner_id)
+    if stores is None:
+        connection = get_db_connection(read_only=True)
+        if not connection:
+            return jsonify({"status": "error", "message": "Database connection failed"}), 500
         
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
-    finally:
-        connection.close()
+        try:
+            cursor = connection.cursor()
+            query, params = STORES_QUERY.build(category=category, owner_id=owner_id, active_only=active_only)
+            execute_prepared(cursor, query, params)
+            stores = cursor.fetchall()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        finally:
+            connection.close()
+    
+    return jsonify({
+        "status": "success",
+        "message": "Stores retrieved successfully",
+        "data": stores,
+        "count": len(stores)
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5004)
\ No newline at end of file
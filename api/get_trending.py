@@ -0,0 +1,60 @@
+from flask import Flask, request, jsonify
+from flask_cors import CORS
+from db_config import get_db_connection
+from auth_utils import require_jwt_auth
+from trending import TRENDING_MAX_PAGE_SIZE, TRENDING_PAGE_SIZE, read_trending, start_trending
+
+app = Flask(__name__)
+CORS(app)
+
+def trending_page(args):
+    """
+    Body and status of GET /api/trending (also served by asgi_app.py)
+
+    Args:
+        args: The request's query arguments
+
+    Returns:
+        tuple: (response body, HTTP status)
+    """
+    kind = args.get('type')
+    category = args.get('category')
+    limit = min(max(args.get('limit', TRENDING_PAGE_SIZE, type=int), 1), TRENDING_MAX_PAGE_SIZE)
+
+    if kind not in (None, 'products', 'stores'):
+        return {"status": "error", "message": "type must be 'products' or 'stores'"}, 400
+    kinds = [kind] if kind else ['products', 'stores']
+
+    start_trending()
+    connection = get_db_connection(read_only=True)
+    if not connection:
+        return {"status": "error", "message": "Database connection failed"}, 500
+
+    try:
+        cursor = connection.cursor()
+        data = {name: read_trending(cursor, name, category, limit) for name in kinds}
+
+        return {
+            "status": "success",
+            "message": "Trending items retrieved successfully",
+            "data": data,
+            "count": sum(len(rows) for rows in data.values())
+        }, 200
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}, 500
+    finally:
+        connection.close()
+
+@app.route('/api/trending', methods=['GET'])
+def get_trending():
+    # JWT authentication check
+    payload, error_response = require_jwt_auth(request)
+    if error_response:
+        return error_response
+
+    body, status = trending_page(request.args)
+    return jsonify(body), status
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5017)
@@ -0,0 +1,57 @@
+import sys
+
+# Cooperative mode for `gunicorn -k gevent` (see gunicorn.conf.py). gevent's
+# monkey-patching already makes sockets, sleeps and the threading primitives
+# used by db_pool.ConnectionPool greenlet-aware; this module covers the two
+# things it cannot patch: libpq's blocking waits and CPU-bound C calls.
+
+_psycopg2_green = False
+
+def gevent_active():
+    """True when gevent has monkey-patched this process"""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('socket')
+
+def make_psycopg2_green():
+    """Make psycopg2 yield to other greenlets while it waits on the server"""
+    global _psycopg2_green
+    if _psycopg2_green:
+        return
+    import psycopg2.extensions
+    psycopg2.extensions.set_wait_callback(_gevent_wait_callback)
+    _psycopg2_green = True
+
+def _gevent_wait_callback(connection, timeout=None):
+    import psycopg2
+    import psycopg2.extensions
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = connection.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            break
+        elif state == psycopg2.extensions.POLL_READ:
+            wait_read(connection.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(connection.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+def run_blocking(func, *args):
+    """
+    Run CPU-bound work without stalling the gevent hub
+
+    Args:
+        func: Callable that holds the CPU (e.g. bcrypt)
+        *args: Arguments for func
+
+    Returns:
+        The result of func; under gevent it runs on the hub's pool of real
+        OS threads, otherwise it is simply called inline
+    """
+    if gevent_active():
+        from gevent import get_hub
+        return get_hub().threadpool.apply(func, args)
+    return func(*args)
@@ -1,8 +1,8 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import bcrypt
 from db_config import get_db_connection
-from auth_utils import encode_jwt
+from auth_utils import encode_jwt, check_password
+from prepared_statements import USER_BY_USERNAME
 
 app = Flask(__name__)
 CORS(app)
@@ -19,16 +19,16 @@ def login():
     
     try:
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = %s", (data['username'],))
+        USER_BY_USERNAME.execute(cursor, (data['username'],))
         user = cursor.fetchone()
         
-        if user and bcrypt.checkpw(data['password'].encode('utf-8'), user['password'].encode('utf-8')):
+        if user and check_password(data['password'], user['password_hash']):
             # Generate JWT token
             payload = {
                 'user_id': user['id'],
                 'username': user['username'],
                 'role': user['role'],
-                'fullName': user['fullName']
+                'fullName': user['full_name']
             }
             token = encode_jwt(payload)
             
@@ -40,7 +40,7 @@ def login():
                     "id": user['id'],
                     "username": user['username'],
                     "role": user['role'],
-                    "fullName": user['fullName']
+                    "fullName": user['full_name']
                 }
             })
         else:
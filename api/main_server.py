@@ -7,7 +7,13 @@ from dotenv import load_dotenv
 # Add current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from catalog_snapshot import start_catalog_snapshot
 from db_config import init_database
+from delta_sync import start_change_log_pruner, sync_catalog
+from facets import start_facets
+from metrics import init_metrics
+from readiness import readiness_check
+from trending import start_trending
 
 # Import all API endpoint functions
 from login import login
@@ -24,6 +30,11 @@ from create_job import create_job
 from get_jobs import get_jobs
 from create_announcement import create_announcement
 from get_announcements import get_announcements
+from follow_store import follow_store, unfollow_store
+from get_feed import get_feed
+from get_trending import get_trending
+from get_facets import get_facets
+from batch_reads import batch_read
 
 load_dotenv()
 
@@ -31,10 +42,15 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "fallback-secret-key")
+init_metrics(app)
 
 # Initialize database
 with app.app_context():
     init_database()
+start_catalog_snapshot()
+start_trending()
+start_facets()
+start_change_log_pruner()
 
 # Root endpoint
 @app.route('/', methods=['GET'])
@@ -56,6 +72,12 @@ def health_check():
         "version": "1.0.0"
     })
 
+# Readiness probe: unlike /api/health, fails when the database is unusable
+app.add_url_rule('/api/ready', 'readiness_check', readiness_check, methods=['GET'])
+
+# Incremental sync for the mobile app and PWA
+app.add_url_rule('/api/sync', 'sync_catalog', sync_catalog, methods=['GET'])
+
 # API Documentation endpoint
 @app.route('/api/docs', methods=['GET'])
 def api_docs():
@@ -63,22 +85,30 @@ def api_docs():
         "status": "success",
         "message": "Bayt AlSudani API Documentation",
         "endpoints": {
+            "operations": {
+                "GET /api/health": "Liveness probe",
+                "GET /api/ready": "Readiness probe (database, pool, schema version)",
+                "GET /metrics": "Prometheus metrics"
+            },
             "authentication": {
                 "POST /api/login": "User login",
                 "POST /api/register": "User registration"
             },
             "stores": {
-                "GET /api/stores": "Get all stores",
-                "GET /api/stores/<id>": "Get store by ID",
-                "POST /api/stores": "Create new store"
+                "GET /api/stores": "Get all stores (?ids=1,2,3 for a batch by id)",
+                "GET /api/stores/<id>": "Get store by ID (?include=products,services,jobs,announcements embeds its newest listings; ?limit=, ?<name>_limit=)",
+                "POST /api/stores": "Create new store",
+                "POST /api/stores/<id>/follow": "Follow a store",
+                "DELETE /api/stores/<id>/follow": "Unfollow a store"
             },
             "products": {
-                "GET /api/products": "Get all products",
+                "GET /api/products": "Get all products (?category= repeatable, ?storeId=, ?min_price=, ?max_price=, ?sort=newest|price_asc|price_desc|popular, ?limit=, ?cursor=; ?ids=1,2,3 for a batch by id)",
+                "GET /api/facets": "Category, store category and price bucket counts for products and services (?type=, ?category=, ?storeId=)",
                 "GET /api/products/<id>": "Get product by ID",
                 "POST /api/products": "Create new product"
             },
             "services": {
-                "GET /api/services": "Get all services",
+                "GET /api/services": "Get all services (?category= repeatable, ?storeId=, ?min_price=, ?max_price=, ?sort=newest|price_asc|price_desc, ?limit=, ?cursor=)",
                 "POST /api/services": "Create new service"
             },
             "jobs": {
@@ -87,7 +117,17 @@ def api_docs():
             },
             "announcements": {
                 "GET /api/announcements": "Get all announcements",
-                "POST /api/announcements": "Create new announcement"
+                "POST /api/announcements": "Create new announcement",
+                "GET /api/feed": "Announcements from followed stores, newest first (?limit=, ?before=)"
+            },
+            "sync": {
+                "GET /api/sync?since=<token>": "Catalog rows changed since the last sync, with tombstones for removed rows"
+            },
+            "trending": {
+                "GET /api/trending": "Products and stores ranked by recent views and listings (?type=, ?category=, ?limit=)"
+            },
+            "batch": {
+                "POST /api/batch": "Several reads in one request: {queries: [{resource, ids} or {resource, filters, sort, cursor, limit}]}; id lookups load once per table"
             }
         }
     })
@@ -107,6 +147,12 @@ app.add_url_rule('/api/jobs', 'create_job', create_job, methods=['POST'])
 app.add_url_rule('/api/jobs', 'get_jobs', get_jobs, methods=['GET'])
 app.add_url_rule('/api/announcements', 'create_announcement', create_announcement, methods=['POST'])
 app.add_url_rule('/api/announcements', 'get_announcements', get_announcements, methods=['GET'])
+app.add_url_rule('/api/stores/<int:store_id>/follow', 'follow_store', follow_store, methods=['POST'])
+app.add_url_rule('/api/stores/<int:store_id>/follow', 'unfollow_store', unfollow_store, methods=['DELETE'])
+app.add_url_rule('/api/feed', 'get_feed', get_feed, methods=['GET'])
+app.add_url_rule('/api/trending', 'get_trending', get_trending, methods=['GET'])
+app.add_url_rule('/api/facets', 'get_facets', get_facets, methods=['GET'])
+app.add_url_rule('/api/batch', 'batch_read', batch_read, methods=['POST'])
 
 if __name__ == '__main__':
     port = int(os.getenv('API_PORT', 5000))
@@ -0,0 +1,181 @@
+import os
+import jwt
+from datetime import datetime, timedelta
+from query_builder import UpdateQuery
+
+# Auth, validation and SQL shared by the WSGI app (app.py) and the ASGI app
+# (asgi_app.py), so both serve identical routes and response shapes.
+
+JWT_SECRET = os.environ.get('JWT_SECRET', 'default-secret-key')
+
+LOGIN_FIELDS = ['username', 'password']
+REGISTER_FIELDS = ['username', 'email', 'password', 'fullName']
+STORE_FIELDS = ['name', 'category']
+ADMIN_STORE_FIELDS = ['name', 'ownerId', 'category']
+PRODUCT_FIELDS = ['name', 'price', 'storeId', 'category']
+
+# Editable columns for the owner edit endpoints
+STORE_UPDATE = UpdateQuery('stores', ['name', 'description', 'category', 'address', 'phone'])
+PRODUCT_UPDATE = UpdateQuery('products', ['name', 'description', 'price', 'category'],
+                             transforms={'price': float})
+
+# Routes as app.py and asgi_app.py serve them. Their list routes take no query
+# parameters; the filters, sorts and ?ids= of api/get_*.py are documented by
+# api/main_server.py, which serves those.
+API_DOCS = {
+    "status": "success",
+    "message": "Bayt AlSudani API Documentation",
+    "endpoints": {
+        "operations": {
+            "GET /api/health": "Liveness probe",
+            "GET /api/ready": "Readiness probe (database, pool, schema version)",
+            "GET /metrics": "Prometheus metrics"
+        },
+        "authentication": {
+            "POST /api/login": "User login",
+            "POST /api/register": "User registration"
+        },
+        "stores": {
+            "GET /api/stores": "Get all stores",
+            "GET /api/stores/<id>": "Get store by ID",
+            "POST /api/stores": "Create new store",
+            "POST /api/stores/<id>/follow": "Follow a store",
+            "DELETE /api/stores/<id>/follow": "Unfollow a store"
+        },
+        "products": {
+            "GET /api/products": "Get all products",
+            "GET /api/facets": "Category, store category and price bucket counts for products and services (?type=, ?category=, ?storeId=)",
+            "GET /api/products/<id>": "Get product by ID",
+            "POST /api/products": "Create new product"
+        },
+        "services": {
+            "GET /api/services": "Get all services",
+            "POST /api/services": "Create new service"
+        },
+        "jobs": {
+            "GET /api/jobs": "Get all jobs",
+            "POST /api/jobs": "Create new job"
+        },
+        "announcements": {
+            "GET /api/announcements": "Get all announcements",
+            "POST /api/announcements": "Create new announcement",
+            "GET /api/announcements/stream": "Server-sent events for new and expired announcements (?storeId=, ?category=; gevent workers or asgi_app.py, 503 on sync workers)",
+            "GET /api/feed": "Announcements from followed stores, newest first (?limit=, ?before=)"
+        },
+        "sync": {
+            "GET /api/sync?since=<token>": "Catalog rows changed since the last sync, with tombstones for removed rows"
+        },
+        "trending": {
+            "GET /api/trending": "Products and stores ranked by recent views and listings (?type=, ?category=, ?limit=)"
+        },
+        "batch": {
+            "POST /api/batch": "Several reads in one request: {queries: [{resource, ids} or {resource, filters, sort, cursor, limit}]}; id lookups load once per table"
+        }
+    }
+}
+
+# Public listings: resource name -> SQL
+LIST_ACTIVE = {
+    resource: f"SELECT * FROM {resource} WHERE is_active = TRUE ORDER BY created_at DESC"
+    for resource in ('stores', 'products', 'services', 'jobs', 'announcements')
+}
+
+USER_EXISTS = "SELECT id FROM users WHERE username = %s OR email = %s"
+INSERT_USER = """
+    INSERT INTO users (username, email, password_hash, full_name, phone, role)
+    VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
+"""
+INSERT_STORE = """
+    INSERT INTO stores (name, description, owner_id, category, address, phone)
+    VALUES (%s, %s, %s, %s, %s, %s) RETURNING *
+"""
+INSERT_PRODUCT = """
+    INSERT INTO products (name, description, price, store_id, category)
+    VALUES (%s, %s, %s, %s, %s) RETURNING *
+"""
+PRODUCT_WITH_OWNER = """
+    SELECT p.*, s.owner_id
+    FROM products p
+    JOIN stores s ON p.store_id = s.id
+    WHERE p.id = %s
+"""
+
+def encode_jwt(payload):
+    """Encode a JWT token with the given payload"""
+    payload['exp'] = datetime.utcnow() + timedelta(hours=24)
+    return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
+
+def decode_jwt(token):
+    """Decode a JWT token and return the payload"""
+    try:
+        return jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        raise Exception("Token has expired")
+    except jwt.InvalidTokenError:
+        raise Exception("Invalid token")
+
+def verify_jwt_token(request):
+    """
+    Verify the bearer token of a Flask or Quart request
+
+    Returns:
+        dict: Decoded token payload if valid, None otherwise
+    """
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+
+    token = auth_header.split(' ')[1]
+    try:
+        return decode_jwt(token)
+    except Exception:
+        return None
+
+def has_required_fields(data, fields):
+    """True when the request body carries a non-empty value for every field"""
+    return bool(data) and all(data.get(field) for field in fields)
+
+def can_manage(owner_id, user_payload):
+    """Owners manage their own stores and products; admins manage everything"""
+    return owner_id == user_payload['user_id'] or user_payload['role'] == 'admin'
+
+def login_response(user):
+    """
+    Success body for a verified login
+
+    Args:
+        user (dict): The users row
+
+    Returns:
+        dict: Response body including a fresh token
+    """
+    token = encode_jwt({
+        'user_id': user['id'],
+        'username': user['username'],
+        'role': user['role'],
+        'full_name': user['full_name']
+    })
+    return {
+        "status": "success",
+        "message": "Login successful",
+        "token": token,
+        "user": {
+            "id": user['id'],
+            "username": user['username'],
+            "email": user['email'],
+            "fullName": user['full_name'],
+            "role": user['role']
+        }
+    }
+
+def user_values(data, password_hash):
+    return (data['username'], data['email'], password_hash,
+            data['fullName'], data.get('phone', ''), data.get('role', 'customer'))
+
+def store_values(data, owner_id):
+    return (data['name'], data.get('description', ''), int(owner_id),
+            data['category'], data.get('address', ''), data.get('phone', ''))
+
+def product_values(data):
+    return (data['name'], data.get('description', ''), float(data['price']),
+            int(data['storeId']), data['category'])
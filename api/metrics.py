@@ -0,0 +1,202 @@
+import os
+import time
+from contextlib import contextmanager
+from flask import Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+# (see gunicorn.conf.py) and /metrics merges the files of all workers.
+MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+# HTTP metrics
+HTTP_REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests handled',
+    ['method', 'route', 'status']
+)
+HTTP_ERRORS = Counter(
+    'http_request_errors_total', 'HTTP requests that ended with a 5xx response',
+    ['method', 'route']
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route'], buckets=LATENCY_BUCKETS
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'HTTP response body size',
+    ['method', 'route'], buckets=SIZE_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    'http_requests_in_progress', 'HTTP requests currently being handled',
+    multiprocess_mode='livesum'
+)
+SSE_CONNECTIONS = Gauge(
+    'sse_connections', 'Open server-sent event streams',
+    multiprocess_mode='livesum'
+)
+COALESCED_REQUESTS = Counter(
+    'http_coalesced_requests_total', 'GET requests answered with a response shared by an identical in-flight request',
+    ['scope']
+)
+
+# Database metrics
+DB_CONNECTIONS = Counter(
+    'db_connections_opened_total', 'Database connections opened'
+)
+DB_CONNECTION_ERRORS = Counter(
+    'db_connection_errors_total', 'Failed database connection attempts'
+)
+DB_CONNECT_LATENCY = Histogram(
+    'db_connect_duration_seconds', 'Time spent opening a database connection',
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled connection',
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total', 'Requests that gave up waiting for a pooled connection'
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Pooled database connections by state',
+    ['state'], multiprocess_mode='livesum'
+)
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'Database statement latency',
+    ['statement'], buckets=LATENCY_BUCKETS
+)
+RESPONSE_CACHE_LOOKUPS = Counter(
+    'response_cache_lookups_total', 'In-process GET response cache lookups',
+    ['result']
+)
+RESPONSE_CACHE_EVICTIONS = Counter(
+    'response_cache_evictions_total', 'Cached responses evicted by change notifications'
+)
+CATALOG_SNAPSHOT_READS = Counter(
+    'catalog_snapshot_reads_total', 'Catalog reads answered from worker memory (hit) or the database (miss)',
+    ['result']
+)
+CATALOG_SNAPSHOT_REFRESHES = Counter(
+    'catalog_snapshot_refreshes_total', 'Catalog snapshot rebuilds',
+    ['kind']
+)
+VIEW_COUNTER_FLUSHES = Counter(
+    'view_counter_flushes_total', 'Batched product view counter flushes',
+    ['result']
+)
+VIEW_COUNTER_DROPPED = Counter(
+    'view_counter_dropped_total', 'Product views lost because flushes kept failing'
+)
+VISITOR_SKETCH_FLUSHES = Counter(
+    'visitor_sketch_flushes_total', 'Batched store visitor sketch flushes',
+    ['result']
+)
+DB_STATEMENT_PREPARES = Counter(
+    'db_statement_prepares_total', 'Server-side PREPAREs issued, by statement name',
+    ['statement']
+)
+
+# Counted around the whole hash_password/check_password call. Under gevent
+# bcrypt runs on the hub's threadpool (gevent_support.run_blocking) and the
+# gauge includes calls waiting for one of its threads, so a value above the
+# pool size is the hashing queue; sync workers and asgi_app.py (which calls
+# them via asyncio.to_thread) count only the threads hashing right now.
+BCRYPT_IN_PROGRESS = Gauge(
+    'bcrypt_operations_in_progress', 'bcrypt hash/check calls in flight, including those waiting for a threadpool thread',
+    multiprocess_mode='livesum'
+)
+BCRYPT_LATENCY = Histogram(
+    'bcrypt_duration_seconds', 'bcrypt hash/check latency, threadpool wait included',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+
+@contextmanager
+def track_db_connect():
+    """Time a database connection attempt and count its outcome"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        DB_CONNECTION_ERRORS.inc()
+        raise
+    DB_CONNECT_LATENCY.observe(time.perf_counter() - started)
+    DB_CONNECTIONS.inc()
+
+@contextmanager
+def track_bcrypt(operation):
+    """Track a bcrypt operation ('hash' or 'check')"""
+    BCRYPT_IN_PROGRESS.inc()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        BCRYPT_LATENCY.labels(operation).observe(time.perf_counter() - started)
+        BCRYPT_IN_PROGRESS.dec()
+
+def _route_label():
+    # Use the URL rule rather than the raw path so ids don't explode cardinality
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    HTTP_IN_PROGRESS.inc()
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+
+    route = _route_label()
+    method = request.method
+    HTTP_IN_PROGRESS.dec()
+    HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+    HTTP_REQUESTS.labels(method, route, str(response.status_code)).inc()
+    if response.status_code >= 500:
+        HTTP_ERRORS.labels(method, route).inc()
+
+    # Streamed responses have no known length up front, and asking for it
+    # would buffer the whole stream
+    if not response.is_streamed:
+        size = response.calculate_content_length()
+        if size is not None:
+            HTTP_RESPONSE_SIZE.labels(method, route).observe(size)
+    return response
+
+def _teardown_request(exc):
+    # after_request is skipped when the request dies before a response exists
+    if g.pop('metrics_started', None) is not None:
+        HTTP_IN_PROGRESS.dec()
+
+def metrics_endpoint():
+    """Prometheus exposition endpoint"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        output = generate_latest(registry)
+    else:
+        output = generate_latest()
+    return Response(output, content_type=CONTENT_TYPE_LATEST)
+
+def init_metrics(app):
+    """
+    Register request instrumentation and the /metrics route on a Flask app
+
+    Args:
+        app: Flask application
+    """
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
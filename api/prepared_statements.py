@@ -0,0 +1,177 @@
+import hashlib
+import os
+import re
+import threading
+import weakref
+from db_backend import returning_error
+from db_config import get_backend
+from metrics import DB_STATEMENT_PREPARES
+from query_log import register_prepared
+
+# Server-side prepared statements (PostgreSQL only; other backends run the SQL as-is)
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+# raw connection -> _SessionStatements. Weak keys, so when the pool discards a
+# connection its entry goes with it and the replacement starts empty.
+_sessions = weakref.WeakKeyDictionary()
+_sessions_lock = threading.Lock()
+
+def to_positional(query):
+    """
+    Rewrite %s placeholders as $1, $2, ... for PREPARE
+
+    Returns:
+        tuple: (SQL text, number of parameters)
+    """
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(0) == '%%':
+            return '%'
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER.sub(replace, query), count
+
+class _SessionStatements:
+    """Names PREPAREd on one server session"""
+
+    def __init__(self, backend_pid):
+        self.backend_pid = backend_pid
+        self.names = set()
+
+def _session(raw_connection):
+    # A changed backend PID means the driver reconnected underneath us, so the
+    # server no longer knows anything prepared on the old session
+    backend_pid = raw_connection.get_backend_pid()
+    with _sessions_lock:
+        session = _sessions.get(raw_connection)
+        if session is None or session.backend_pid != backend_pid:
+            session = _sessions[raw_connection] = _SessionStatements(backend_pid)
+        return session
+
+class PreparedStatement:
+    """
+    A statement PREPAREd lazily on each pooled connection and run by name
+
+    The first execute() on a connection sends PREPARE; later ones send only
+    EXECUTE, so PostgreSQL skips parsing and planning. If the server has lost
+    the statement (e.g. the session was reset by a connection pooler) it is
+    prepared again, transparently when no transaction is open yet.
+    """
+
+    def __init__(self, sql, name=None):
+        # Application SQL runs on every backend: reject at import what MySQL
+        # could only reject at run time
+        error = returning_error(sql)
+        if error:
+            raise ValueError(error)
+        self.sql = sql
+        self.name = name or 'ps_' + hashlib.md5(sql.encode('utf-8')).hexdigest()[:16]
+        self.positional, self.param_count = to_positional(sql)
+        placeholders = ', '.join(['%s'] * self.param_count)
+        self.execute_sql = f"EXECUTE {self.name} ({placeholders})" if self.param_count else f"EXECUTE {self.name}"
+        register_prepared(self.name, sql)
+
+    def execute(self, cursor, params=()):
+        """
+        Run the statement on a cursor from a pooled connection
+
+        Args:
+            cursor: Cursor from get_db_connection()
+            params (sequence): Statement parameters
+        """
+        params = tuple(params)
+        if not DB_PREPARED_STATEMENTS or get_backend().name != 'postgresql':
+            return cursor.execute(self.sql, params)
+
+        import psycopg2.errors
+        import psycopg2.extensions
+        raw_connection = cursor.connection
+        session = _session(raw_connection)
+        idle = raw_connection.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+        try:
+            self._prepare(cursor, session)
+            return cursor.execute(self.execute_sql, params or None)
+        except psycopg2.errors.InvalidSqlStatementName:
+            session.names.discard(self.name)
+            if not idle:
+                raise
+            # Nothing of the caller's transaction is lost, so retry once
+            raw_connection.rollback()
+            self._prepare(cursor, session)
+            return cursor.execute(self.execute_sql, params or None)
+
+    def _prepare(self, cursor, session):
+        if self.name not in session.names:
+            cursor.execute(f"PREPARE {self.name} AS {self.positional}")
+            session.names.add(self.name)
+            DB_STATEMENT_PREPARES.labels(self.name).inc()
+
+_statements = {}
+_statements_lock = threading.Lock()
+
+def statement(sql, name=None):
+    """
+    The shared PreparedStatement for a piece of SQL
+
+    Args:
+        sql (str): PostgreSQL-style SQL with %s placeholders
+        name (str): Optional readable server-side name
+
+    Returns:
+        PreparedStatement: One instance per distinct SQL text
+    """
+    prepared = _statements.get(sql)
+    if prepared is None:
+        with _statements_lock:
+            prepared = _statements.setdefault(sql, PreparedStatement(sql, name))
+    return prepared
+
+def execute_prepared(cursor, query, params=()):
+    """Execute SQL through its per-connection prepared statement"""
+    return statement(query).execute(cursor, params)
+
+# Hot statements, named so they are recognisable in pg_prepared_statements
+# and the slow-query log
+USER_BY_USERNAME = statement("SELECT * FROM users WHERE username = %s", 'user_by_username')
+STORE_OWNER = statement("SELECT owner_id FROM stores WHERE id = %s", 'store_owner')
+PRODUCT_DETAIL = statement("""
+    SELECT p.*, s.name AS store_name, s.category AS store_category,
+           s.address AS store_address, s.phone AS store_phone,
+           u.username AS store_owner_name, u.full_name AS store_owner_full_name
+    FROM products p
+    LEFT JOIN stores s ON p.store_id = s.id
+    LEFT JOIN users u ON s.owner_id = u.id
+    WHERE p.id = %s
+""", 'product_detail')
+PRODUCT_DETAILS = statement("""
+    SELECT p.*, s.name AS store_name, s.category AS store_category,
+           s.address AS store_address, s.phone AS store_phone,
+           u.username AS store_owner_name, u.full_name AS store_owner_full_name
+    FROM products p
+    LEFT JOIN stores s ON p.store_id = s.id
+    LEFT JOIN users u ON s.owner_id = u.id
+    WHERE p.id = ANY(%s)
+""", 'product_details')
+STORE_DETAILS = statement("""
+    SELECT s.*, u.username AS owner_name, u.full_name AS owner_full_name, u.email AS owner_email
+    FROM stores s
+    LEFT JOIN users u ON s.owner_id = u.id
+    WHERE s.id = ANY(%s)
+""", 'store_details')
+
+# Services, jobs and announcements by id, as their list routes return them
+LISTING_DETAILS = {
+    table: statement(f"""
+        SELECT t.*, s.name AS store_name, s.category AS store_category
+        FROM {table} t
+        LEFT JOIN stores s ON t.store_id = s.id
+        WHERE t.id = ANY(%s)
+    """, f'{table}_details')
+    for table in ('services', 'jobs', 'announcements')
+}
@@ -0,0 +1,183 @@
+import base64
+import json
+import threading
+from collections import namedtuple
+
+# One optional WHERE condition of a list query. `name` is the keyword passed to
+# build(); when `param` is False the condition takes no value and is applied
+# whenever the keyword is truthy (e.g. active_only -> is_active = TRUE). A
+# `many` filter takes a list, bound as one array parameter (e.g.
+# "p.category = ANY(%s)"), so the SQL text does not depend on its length.
+Filter = namedtuple('Filter', ['name', 'condition', 'param', 'transform', 'many'], defaults=[True, None, False])
+
+# One ordering of a list query, also its keyset for pagination: `columns` all
+# sort in one direction and end with a unique one, `keys` name the result
+# columns holding their values. `join` and `select` add what the ordering
+# needs; `condition` leaves out rows it cannot place (e.g. NULL prices).
+Sort = namedtuple('Sort', ['columns', 'keys', 'descending', 'join', 'select', 'condition'],
+                  defaults=[None, None, None])
+
+class ListQuery:
+    """
+    Filtered SELECT whose SQL is compiled once per filter shape
+
+    A shape is the set of filters present on a request, the sort, whether a
+    keyset cursor was given and whether a LIMIT was. Its SQL text is assembled on first use and cached,
+    so repeat requests only collect parameters; the stable text also lets
+    the database reuse one prepared statement per shape.
+
+    With `sorts` (name -> Sort, the first being the default) each ordering
+    can be paged by keyset: the next page starts after the last row's sort
+    values instead of at an OFFSET, so every page is an index range scan.
+    """
+
+    def __init__(self, select_sql, filters, order_by=None, sorts=None):
+        self.select_sql = " ".join(select_sql.split())
+        self.filters = tuple(filters)
+        self.order_by = order_by
+        self.sorts = dict(sorts or {})
+        self.default_sort = next(iter(self.sorts), None)
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self, shape):
+        """
+        SQL text for a filter shape
+
+        Args:
+            shape (tuple): Per filter whether it is present, then the sort
+                name, whether a cursor is given, and whether a LIMIT is
+
+        Returns:
+            str: The statement with %s placeholders
+        """
+        query = self._compiled.get(shape)
+        if query is None:
+            conditions = [f.condition for f, present in zip(self.filters, shape) if present]
+            query = self.select_sql
+            order_by = self.order_by
+            sort = self.sorts.get(shape[-3])
+            if sort:
+                if sort.select:
+                    query = query.replace(" FROM ", f", {sort.select} FROM ", 1)
+                if sort.join:
+                    query += " " + sort.join
+                if sort.condition:
+                    conditions.append(sort.condition)
+                if shape[-2]:
+                    placeholders = ", ".join(["%s"] * len(sort.columns))
+                    comparison = "<" if sort.descending else ">"
+                    conditions.append(f"({', '.join(sort.columns)}) {comparison} ({placeholders})")
+                direction = " DESC" if sort.descending else " ASC"
+                order_by = ", ".join(column + direction for column in sort.columns)
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            if order_by:
+                query += " ORDER BY " + order_by
+            if shape[-1]:
+                query += " LIMIT %s"
+            with self._lock:
+                query = self._compiled.setdefault(shape, query)
+        return query
+
+    def build(self, limit=None, sort=None, after=None, **values):
+        """
+        Statement and parameters for one request
+
+        Args:
+            limit (int): Optional row limit
+            sort (str): Name of one of `sorts`; None for the default
+            after (list): Sort values of the previous page's last row, as
+                parse_cursor() returns them
+            **values: Filter values by name; None or an empty string or list
+                leaves the filter out (0 does not)
+
+        Returns:
+            tuple: (SQL text, parameter list)
+        """
+        shape = []
+        params = []
+        for f in self.filters:
+            value = values.get(f.name)
+            if f.param and not isinstance(value, (str, list, tuple)):
+                present = value is not None
+            else:
+                present = bool(value)
+            shape.append(present)
+            if present and f.param:
+                if f.many:
+                    params.append([f.transform(item) if f.transform else item for item in value])
+                else:
+                    params.append(f.transform(value) if f.transform else value)
+        shape.append(sort or self.default_sort)
+        shape.append(bool(after))
+        if after:
+            params.extend(after)
+        shape.append(bool(limit))
+        if limit:
+            params.append(limit)
+        return self.compile(tuple(shape)), params
+
+    def cursor_for(self, row, sort=None):
+        """Opaque cursor for the page after `row`"""
+        keys = self.sorts[sort or self.default_sort].keys
+        values = json.dumps([row[key] for key in keys], default=str)
+        return base64.urlsafe_b64encode(values.encode()).decode('ascii')
+
+    def parse_cursor(self, cursor, sort=None):
+        """
+        Sort values from a cursor made by cursor_for()
+
+        Returns:
+            list: The values, or None if the cursor is malformed
+        """
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (ValueError, UnicodeEncodeError):
+            return None
+        keys = self.sorts[sort or self.default_sort].keys
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        return values
+
+class UpdateQuery:
+    """
+    UPDATE ... WHERE id = %s RETURNING * over a fixed set of editable columns
+
+    The SET list is compiled once per combination of columns present in the
+    request body instead of being formatted on every call.
+    """
+
+    def __init__(self, table, columns, transforms=None):
+        self.table = table
+        self.columns = tuple(columns)
+        self.transforms = transforms or {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self, columns):
+        query = self._compiled.get(columns)
+        if query is None:
+            assignments = ", ".join(f"{column} = %s" for column in columns)
+            query = f"UPDATE {self.table} SET {assignments} WHERE id = %s RETURNING *"
+            with self._lock:
+                query = self._compiled.setdefault(columns, query)
+        return query
+
+    def build(self, data, row_id):
+        """
+        Statement and parameters for updating one row
+
+        Args:
+            data (dict): Request body; keys outside the editable columns are ignored
+            row_id (int): Primary key of the row to update
+
+        Returns:
+            tuple: (SQL text, parameter list), or (None, []) when no editable field is present
+        """
+        columns = tuple(column for column in self.columns if column in data)
+        if not columns:
+            return None, []
+        params = [self.transforms[c](data[c]) if c in self.transforms else data[c] for c in columns]
+        params.append(row_id)
+        return self.compile(columns), params
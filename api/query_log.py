@@ -0,0 +1,175 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from metrics import DB_QUERY_LATENCY
+
+# Statements slower than this are logged (reads with their parameters)
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+# Fraction of slow SELECTs that also get an EXPLAIN (ANALYZE, BUFFERS) plan
+SLOW_QUERY_EXPLAIN_SAMPLE = float(os.environ.get('SLOW_QUERY_EXPLAIN_SAMPLE', '0.1'))
+# Never explain the same normalized statement more often than this
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', '60'))
+
+logger = logging.getLogger('baytalsudani.slow_query')
+
+_last_explained = {}
+_last_explained_lock = threading.Lock()
+# Server-side prepared statement name -> its SQL (prepared_statements.py), so
+# a slow `EXECUTE name (...)` is logged as the statement it runs
+_prepared_sql = {}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_WHITESPACE = re.compile(r"\s+")
+_EXECUTE = re.compile(r"\s*EXECUTE\s+(\w+)", re.IGNORECASE)
+
+def normalize_sql(query):
+    """
+    Reduce a statement to its shape so similar queries group together
+
+    Args:
+        query (str): The SQL text
+
+    Returns:
+        str: SQL with literals and placeholders replaced by '?'
+    """
+    query = _STRING_LITERAL.sub('?', query)
+    query = _PLACEHOLDER.sub('?', query)
+    query = _NUMBER_LITERAL.sub('?', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+def register_prepared(name, sql):
+    """Record the SQL behind a prepared statement name for the slow-query log"""
+    _prepared_sql[name] = sql
+
+def _prepared(query):
+    # SQL run by an EXECUTE, or None for any other statement
+    match = _EXECUTE.match(query)
+    return _prepared_sql.get(match.group(1)) if match else None
+
+def _statement_type(query):
+    words = query.lstrip(' (\n\t').split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+def _should_explain(fingerprint):
+    if random.random() >= SLOW_QUERY_EXPLAIN_SAMPLE:
+        return False
+    now = time.monotonic()
+    with _last_explained_lock:
+        last = _last_explained.get(fingerprint)
+        if last is not None and now - last < SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        _last_explained[fingerprint] = now
+    return True
+
+def _format_params(params, statement):
+    # Writes carry password hashes and personal data: only their count is logged
+    if statement != 'SELECT':
+        count = len(params) if isinstance(params, (list, tuple, dict)) else 0
+        return f"<{count} withheld>"
+    text = repr(params)
+    return text if len(text) <= 500 else text[:500] + '...'
+
+def _format_plan(rows):
+    lines = []
+    for row in rows:
+        values = list(row.values()) if isinstance(row, dict) else list(row)
+        lines.append(values[0] if len(values) == 1 else " | ".join(str(v) for v in values))
+    return "\n".join(str(line) for line in lines)
+
+class TimedCursor:
+    """
+    Cursor proxy that translates, times and slow-logs every statement
+
+    Wraps a raw driver cursor; SQL is written PostgreSQL-style and rewritten
+    for the active dialect by the backend before it runs.
+    """
+
+    def __init__(self, cursor, backend):
+        self._cursor = cursor
+        self._backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+
+    def execute(self, query, vars=None):
+        if not isinstance(query, str):
+            query = query.as_string(self._cursor.connection) if hasattr(query, 'as_string') else query.decode()
+        translated = self._backend.translate(query)
+
+        started = time.perf_counter()
+        succeeded = False
+        try:
+            result = self._backend.execute(self._cursor, translated, vars)
+            succeeded = True
+            return result
+        finally:
+            self._observe(translated, vars, time.perf_counter() - started, succeeded)
+
+    def executemany(self, query, vars_list):
+        translated = self._backend.translate(query)
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(translated, vars_list)
+        finally:
+            DB_QUERY_LATENCY.labels(_statement_type(translated)).observe(time.perf_counter() - started)
+
+    def _observe(self, query, vars, elapsed, succeeded):
+        prepared = _prepared(query)
+        statement = _statement_type(prepared or query)
+        DB_QUERY_LATENCY.labels(statement).observe(elapsed)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            self._log_slow_query(query, vars, elapsed, statement, succeeded, prepared)
+
+    def _log_slow_query(self, query, vars, elapsed, statement, succeeded, prepared=None):
+        # Log the readable SQL of an EXECUTE; EXPLAIN works on the EXECUTE itself
+        fingerprint = normalize_sql(prepared or query)
+        plan = None
+        # EXPLAIN ANALYZE runs the statement again, so only re-run reads
+        if succeeded and statement == 'SELECT' and self._backend.explain_prefix and _should_explain(fingerprint):
+            plan = self._explain(query, vars)
+
+        logger.warning(
+            "Slow query (%.1f ms): %s | params=%s%s",
+            elapsed * 1000,
+            fingerprint,
+            _format_params(vars, statement),
+            f"\n{plan}" if plan else ""
+        )
+
+    def _explain(self, query, vars):
+        connection = self._cursor.connection
+        # Raw cursor so the EXPLAIN itself is not timed and logged
+        cursor = connection.cursor()
+        # A savepoint keeps a failing EXPLAIN from aborting the caller's transaction
+        use_savepoint = not getattr(connection, 'autocommit', False)
+        try:
+            if use_savepoint:
+                cursor.execute("SAVEPOINT slow_query_explain")
+            self._backend.execute(cursor, self._backend.explain_prefix + query, vars)
+            plan = _format_plan(cursor.fetchall())
+            if use_savepoint:
+                cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+            return plan
+        except Exception as e:
+            if use_savepoint:
+                try:
+                    cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                except Exception:
+                    pass
+            return f"(EXPLAIN failed: {e})"
+        finally:
+            cursor.close()
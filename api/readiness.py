@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+from flask import jsonify
+from db_config import SCHEMA_VERSION, get_backend, get_pool, get_replica_pools
+
+# Probes can arrive many times a second; the database is checked at most this often
+READINESS_CACHE_SECONDS = float(os.environ.get('READINESS_CACHE_SECONDS', '1'))
+READINESS_TIMEOUT_MS = int(os.environ.get('READINESS_TIMEOUT_MS', '500'))
+
+_cached = None
+_cached_until = 0.0
+_refresh_lock = threading.Lock()
+
+def _check_database():
+    pool = get_pool()
+    started = time.perf_counter()
+    result = {"status": "error"}
+    connection = None
+
+    try:
+        connection = pool.acquire(timeout=READINESS_TIMEOUT_MS / 1000)
+        cursor = connection.cursor()
+        timeout_sql = get_backend().statement_timeout_sql(READINESS_TIMEOUT_MS)
+        if timeout_sql:
+            cursor.execute(timeout_sql)
+        cursor.execute("SELECT MAX(version) AS version FROM schema_migrations")
+        version = cursor.fetchone()['version']
+        cursor.close()
+
+        result["schema_version"] = version
+        result["expected_schema_version"] = SCHEMA_VERSION
+        if version is not None and version >= SCHEMA_VERSION:
+            result["status"] = "success"
+        else:
+            result["message"] = "Database schema is behind the application"
+    except Exception as e:
+        result["message"] = str(e)
+    finally:
+        if connection is not None:
+            connection.close()
+
+    result["backend"] = get_backend().name
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    result["pool"] = pool.stats()
+    replica_pools = get_replica_pools()
+    if replica_pools:
+        result["replica_pools"] = [replica.stats() for replica in replica_pools]
+    return result
+
+def _build_report():
+    database = _check_database()
+    ready = database["status"] == "success"
+    body = {
+        "status": "success" if ready else "error",
+        "message": "Bayt AlSudani API is ready" if ready else "Bayt AlSudani API is not ready",
+        "checks": {
+            "database": database
+        }
+    }
+    return body, 200 if ready else 503
+
+def readiness_check():
+    """Readiness probe: verifies a pooled database connection and the schema version"""
+    global _cached, _cached_until
+
+    if _cached is None or time.monotonic() >= _cached_until:
+        # Only one thread re-checks; the rest keep serving the previous result
+        if _refresh_lock.acquire(blocking=_cached is None):
+            try:
+                if _cached is None or time.monotonic() >= _cached_until:
+                    _cached = _build_report()
+                    _cached_until = time.monotonic() + READINESS_CACHE_SECONDS
+            finally:
+                _refresh_lock.release()
+
+    body, status = _cached
+    return jsonify(body), status
@@ -1,9 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import bcrypt
-import pymysql
 from db_config import get_db_connection
-from auth_utils import require_jwt_auth
+from auth_utils import require_jwt_auth, hash_password
 
 app = Flask(__name__)
 CORS(app)
@@ -35,28 +33,28 @@ def register():
             return jsonify({"status": "error", "message": "Username or email already exists"}), 409
         
         # Hash password
-        hashed_password = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt())
+        hashed_password = hash_password(data['password'])
         
         # Insert new user
         cursor.execute("""
-            INSERT INTO users (username, password, email, fullName, phone, role, isActive, createdAt)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+            INSERT INTO users (username, password_hash, email, full_name, phone, role)
+            VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
         """, (
             data['username'],
-            hashed_password.decode('utf-8'),
+            hashed_password,
             data['email'],
             data['fullName'],
             data.get('phone', ''),
-            data.get('role', 'customer'),
-            True
+            data.get('role', 'customer')
         ))
         
+        user_id = cursor.fetchone()['id']
         connection.commit()
         
         return jsonify({
             "status": "success",
             "message": "User registered successfully",
-            "user_id": cursor.lastrowid
+            "user_id": user_id
         })
         
     except Exception as e:
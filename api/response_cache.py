@@ -0,0 +1,160 @@
+import collections
+import functools
+import os
+import threading
+import time
+from flask import Response, request
+from change_events import ensure_listener, subscribe
+from db_config import DATABASE_REPLICA_URLS, READ_YOUR_WRITES_SECONDS, reads_from_primary
+from metrics import RESPONSE_CACHE_EVICTIONS, RESPONSE_CACHE_LOOKUPS
+from single_flight import capture, request_key
+
+# Per-worker cache of serialized GET responses. Entries are evicted as soon
+# as the change listener reports a write to a table they were built from, so
+# the cache is only consulted while that listener is connected (PostgreSQL).
+RESPONSE_CACHE_SECONDS = float(os.environ.get('RESPONSE_CACHE_SECONDS', '30'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '1000'))
+# With read replicas, a miss just after a change may be answered by a replica
+# that has not replayed it yet. Responses built from a table (or, for detail
+# routes, a row) changed this recently are served but not cached
+RESPONSE_CACHE_REPLICA_LAG_SECONDS = float(
+    os.environ.get('RESPONSE_CACHE_REPLICA_LAG_SECONDS', str(READ_YOUR_WRITES_SECONDS))
+)
+
+_Entry = collections.namedtuple('_Entry', ['expires', 'tables', 'row', 'captured'])
+
+class ResponseCache:
+    """
+    LRU of captured responses tagged with the tables they depend on
+
+    `row` is (table, id) for detail responses, so a change to another row of
+    that table leaves them alone; list responses are evicted by any change
+    to one of their tables.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every eviction, so a response computed while a change
+        # arrived is not stored after the eviction that should have removed it
+        self.generation = 0
+        # Monotonic time of the last change per table, per (table, id) and
+        # of the last clear(), for put()'s `settle`
+        self._table_changed = {}
+        self._row_changed = {}
+        self._cleared = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry.captured
+
+    def put(self, key, tables, row, captured, ttl, generation, settle=0):
+        """
+        Store a response unless a change arrived since `generation` was read,
+        or (with `settle` seconds) its data changed less than `settle` ago
+        """
+        with self._lock:
+            if generation != self.generation or (settle and self._unsettled(tables, row, settle)):
+                return
+            self._entries[key] = _Entry(time.monotonic() + ttl, tables, row, captured)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _unsettled(self, tables, row, settle):
+        since = time.monotonic() - settle
+        if self._cleared > since:
+            return True
+        if row:
+            changed = [self._row_changed.get(row, 0)]
+            changed.extend(self._table_changed.get(table, 0) for table in tables if table != row[0])
+        else:
+            changed = [self._table_changed.get(table, 0) for table in tables]
+        return max(changed) > since
+
+    def evict(self, table, row_id):
+        """Drop every entry built from the changed row; returns how many were dropped"""
+        with self._lock:
+            now = time.monotonic()
+            self._table_changed[table] = now
+            self._row_changed[(table, row_id)] = now
+            if len(self._row_changed) > 10000:
+                since = now - RESPONSE_CACHE_REPLICA_LAG_SECONDS
+                self._row_changed = {key: at for key, at in self._row_changed.items() if at > since}
+            stale = [
+                key for key, entry in self._entries.items()
+                if table in entry.tables and not (entry.row and entry.row[0] == table and entry.row[1] != row_id)
+            ]
+            for key in stale:
+                del self._entries[key]
+            self.generation += 1
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._cleared = time.monotonic()
+            self._entries.clear()
+            self.generation += 1
+
+_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES)
+
+def _on_change(table, row_id, operation):
+    if table is None:
+        # (Re)connected: anything could have changed while we were not listening
+        _cache.clear()
+        return
+    evicted = _cache.evict(table, row_id)
+    if evicted:
+        RESPONSE_CACHE_EVICTIONS.inc(evicted)
+
+subscribe(_on_change)
+
+def cached(tables, id_arg=None, authorize=None):
+    """
+    Decorator caching a read-only view's response until its data changes
+
+    Args:
+        tables (list): Tables the response is built from; the first one is
+            the resource itself
+        id_arg (str): View argument holding the row id, for detail routes
+        authorize: Optional callable(request); authorized and unauthorized
+            requests are cached separately
+
+    Returns:
+        function: The decorator
+    """
+    primary_table = tables[0]
+    tables = frozenset(tables)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if (RESPONSE_CACHE_SECONDS <= 0 or request.method != 'GET'
+                    or reads_from_primary() or not ensure_listener()):
+                return view(*args, **kwargs)
+
+            key = request_key(authorize)
+            captured = _cache.get(key)
+            if captured is not None:
+                RESPONSE_CACHE_LOOKUPS.labels('hit').inc()
+            else:
+                RESPONSE_CACHE_LOOKUPS.labels('miss').inc()
+                generation = _cache.generation
+                captured = capture(view, args, kwargs)
+                if captured[1] == 200:
+                    row = (primary_table, kwargs[id_arg]) if id_arg else None
+                    settle = RESPONSE_CACHE_REPLICA_LAG_SECONDS if DATABASE_REPLICA_URLS else 0
+                    _cache.put(key, tables, row, captured, RESPONSE_CACHE_SECONDS, generation, settle)
+            body, status, headers = captured
+            return Response(body, status=status, headers=headers)
+
+        return wrapper
+    return decorator
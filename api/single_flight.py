@@ -0,0 +1,204 @@
+import fcntl
+import functools
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from flask import Response, make_response, request
+from db_config import reads_from_primary
+from metrics import COALESCED_REQUESTS
+
+# Identical concurrent GETs share one execution of the view: one query, one
+# serialized body. Optionally workers on the same host also coordinate
+# through a lock file, so a thundering herd across workers runs one query.
+SINGLE_FLIGHT = os.environ.get('SINGLE_FLIGHT', 'true').lower() == 'true'
+SINGLE_FLIGHT_CROSS_WORKER = os.environ.get('SINGLE_FLIGHT_CROSS_WORKER', 'false').lower() == 'true'
+SINGLE_FLIGHT_DIR = os.environ.get('SINGLE_FLIGHT_DIR', os.path.join(tempfile.gettempdir(), 'baytalsudani-flights'))
+# Longest a worker waits for another worker's query before running its own
+SINGLE_FLIGHT_LOCK_TIMEOUT = float(os.environ.get('SINGLE_FLIGHT_LOCK_TIMEOUT', '2'))
+# Lock and body files unused this long are deleted, checked at most this
+# often per worker; a body is only ever read by requests that were already
+# waiting when it was written, so old ones are dead weight
+SINGLE_FLIGHT_SWEEP_SECONDS = float(os.environ.get('SINGLE_FLIGHT_SWEEP_SECONDS', '60'))
+
+_next_sweep = 0
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """
+        Run func once for all concurrent callers with this key
+
+        Returns:
+            tuple: (result, shared) where shared is True for callers that
+            reused another caller's result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+_flights = SingleFlight()
+
+def capture(view, args, kwargs):
+    """Run a view and return its response as (body, status, headers)"""
+    response = make_response(view(*args, **kwargs))
+    return response.get_data(), response.status_code, list(response.headers.items())
+
+def request_key(authorize=None):
+    """
+    Key identifying GET requests that must receive the same response
+
+    Args:
+        authorize: Optional callable(request); authorized and unauthorized
+            callers get different keys
+    """
+    allowed = bool(authorize(request)) if authorize else True
+    return f"{request.endpoint}|{allowed}|{request.full_path}"
+
+def _path(key, suffix):
+    return os.path.join(SINGLE_FLIGHT_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest() + suffix)
+
+def _read_shared(key, not_before):
+    try:
+        with open(_path(key, '.body'), 'rb') as f:
+            if os.fstat(f.fileno()).st_mtime < not_before:
+                return None
+            status, header_count = (int(value) for value in f.readline().split())
+            headers = [tuple(f.readline().decode('utf-8').rstrip('\n').split(': ', 1)) for _ in range(header_count)]
+            return f.read(), status, headers
+    except (OSError, ValueError):
+        return None
+
+def _write_shared(key, captured):
+    body, status, headers = captured
+    path = _path(key, '.body')
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}"
+    with open(temp, 'wb') as f:
+        f.write(f"{status} {len(headers)}\n".encode('utf-8'))
+        for name, value in headers:
+            f.write(f"{name}: {value}\n".encode('utf-8'))
+        f.write(body)
+    os.replace(temp, path)
+
+def _sweep(now):
+    """Delete files in SINGLE_FLIGHT_DIR unused for SINGLE_FLIGHT_SWEEP_SECONDS, at most once per that interval"""
+    global _next_sweep
+    if now < _next_sweep:
+        return
+    _next_sweep = now + SINGLE_FLIGHT_SWEEP_SECONDS
+    cutoff = now - SINGLE_FLIGHT_SWEEP_SECONDS
+    try:
+        names = os.listdir(SINGLE_FLIGHT_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(SINGLE_FLIGHT_DIR, name)
+        try:
+            # Another worker may be sweeping too
+            if os.stat(path).st_mtime < cutoff:
+                os.unlink(path)
+        except OSError:
+            pass
+
+def _capture_across_workers(key, view, args, kwargs):
+    """Run the view under a per-key file lock, reusing a body another worker just produced"""
+    started = time.time()
+    os.makedirs(SINGLE_FLIGHT_DIR, exist_ok=True)
+    _sweep(started)
+    with open(_path(key, '.lock'), 'a') as lock_file:
+        # Opening does not update the mtime the sweep goes by. Unlinking a
+        # lock another worker has open at worst lets the key run twice
+        os.utime(lock_file.fileno())
+        deadline = time.monotonic() + SINGLE_FLIGHT_LOCK_TIMEOUT
+        locked = False
+        while True:
+            try:
+                # Non-blocking so a gevent worker never stalls its hub on flock
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(0.005)
+        try:
+            shared = _read_shared(key, started)
+            if shared is not None:
+                COALESCED_REQUESTS.labels('worker').inc()
+                return shared
+            captured = capture(view, args, kwargs)
+            if locked:
+                _write_shared(key, captured)
+            return captured
+        finally:
+            if locked:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def coalesce(authorize=None):
+    """
+    Decorator for read-only views whose response depends only on the URL
+
+    Args:
+        authorize: Optional callable(request) returning a truthy value for
+            authorized callers; authorized and unauthorized requests never
+            share a response
+
+    Returns:
+        function: The decorator
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Users inside their read-your-writes window must not get a
+            # response built from a replica or from before their write
+            if not SINGLE_FLIGHT or request.method != 'GET' or reads_from_primary():
+                return view(*args, **kwargs)
+
+            key = request_key(authorize)
+            if SINGLE_FLIGHT_CROSS_WORKER:
+                run = lambda: _capture_across_workers(key, view, args, kwargs)
+            else:
+                run = lambda: capture(view, args, kwargs)
+
+            (body, status, headers), shared = _flights.do(key, run)
+            if shared:
+                COALESCED_REQUESTS.labels('thread').inc()
+            return Response(body, status=status, headers=headers)
+        return wrapper
+    return decorator
@@ -0,0 +1,71 @@
+import os
+from catalog_snapshot import LISTINGS, list_catalog
+from db_config import get_db_connection
+
+# ?include=products,services,jobs,announcements on GET /api/stores/<id>: the
+# store page in one request instead of a list call per collection. Each
+# collection is the store's newest active rows, as its list route returns
+# them for ?storeId=, capped by ?limit= (all collections) or ?<name>_limit=.
+STORE_INCLUDE_LIMIT = int(os.environ.get('STORE_INCLUDE_LIMIT', '10'))
+STORE_INCLUDE_MAX_LIMIT = 50
+
+# One indexed range scan per collection (idx_<table>_store_created_at)
+INCLUDE_QUERY = """
+    SELECT t.*, s.name AS store_name, s.category AS store_category
+    FROM {table} t
+    LEFT JOIN stores s ON t.store_id = s.id
+    WHERE t.store_id = %s AND t.is_active = TRUE
+    ORDER BY t.created_at DESC, t.id DESC
+    LIMIT %s
+"""
+
+def parse_includes(args):
+    """
+    Collections and their limits from the request's query arguments
+
+    Args:
+        args: request.args
+
+    Returns:
+        dict: Limit by collection name (empty without ?include=), or None if
+        an unknown collection was asked for
+    """
+    names = [name.strip() for name in args.get('include', '').split(',') if name.strip()]
+    if any(name not in LISTINGS for name in names):
+        return None
+    default = args.get('limit', STORE_INCLUDE_LIMIT, type=int)
+    return {
+        name: min(max(args.get(f'{name}_limit', default, type=int), 1), STORE_INCLUDE_MAX_LIMIT)
+        for name in names
+    }
+
+def load_includes(store_id, includes):
+    """
+    A store's child collections, from the catalog snapshot when it holds them
+
+    A database connection is only taken for collections the snapshot cannot
+    answer.
+
+    Args:
+        store_id (int): Store
+        includes (dict): Limit by collection name, as parse_includes() returns it
+
+    Returns:
+        dict: Rows by collection name, newest first
+    """
+    collections = {table: list_catalog(table, store_id=store_id, limit=limit) for table, limit in includes.items()}
+    missing = [table for table, rows in collections.items() if rows is None]
+    if not missing:
+        return collections
+
+    connection = get_db_connection(read_only=True)
+    if not connection:
+        raise RuntimeError("Database connection failed")
+    try:
+        cursor = connection.cursor()
+        for table in missing:
+            cursor.execute(INCLUDE_QUERY.format(table=table), (store_id, includes[table]))
+            collections[table] = cursor.fetchall()
+    finally:
+        connection.close()
+    return collections
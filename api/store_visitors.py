@@ -0,0 +1,236 @@
+import atexit
+import datetime
+import functools
+import os
+import threading
+import time
+from flask import make_response, request
+from auth_utils import verify_jwt_token
+from db_config import get_db_connection
+from hyperloglog import HyperLogLog
+from metrics import VISITOR_SKETCH_FLUSHES
+
+# Distinct visitors per store and UTC day, as HyperLogLog sketches in
+# store_visitor_sketches. Store reads add the visitor to a sketch in worker
+# memory; every VISITOR_FLUSH_SECONDS the worker merges its sketches into
+# the stored ones. A crash loses at most one interval of this worker's
+# visits; a graceful exit flushes (atexit, and gunicorn's worker_exit hook).
+VISITOR_FLUSH_SECONDS = float(os.environ.get('VISITOR_FLUSH_SECONDS', '30'))
+# Flush early once this many (store, day) sketches are pending, about 4 KB each
+VISITOR_FLUSH_MAX_PENDING = int(os.environ.get('VISITOR_FLUSH_MAX_PENDING', '1000'))
+# Sketches older than this are deleted
+VISITOR_RETENTION_DAYS = int(os.environ.get('VISITOR_RETENTION_DAYS', '90'))
+# Store pages reuse a store's counts for this long instead of reading its
+# sketches on every request; stored sketches only change every flush anyway
+VISITOR_COUNT_CACHE_SECONDS = float(os.environ.get('VISITOR_COUNT_CACHE_SECONDS', '60'))
+VISITOR_COUNT_CACHE_MAX = 10000
+VISITOR_WINDOWS = {'today': 1, 'last_7_days': 7, 'last_30_days': 30}
+VISITOR_MERGE_ATTEMPTS = 5
+VISITOR_PRUNE_SECONDS = 3600
+
+_pending = {}
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_flusher_pid = None
+_last_prune = 0.0
+_counts = {}
+
+def _today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+def record_visit(store_id, visitor):
+    """Count a visitor (user id) of a store today"""
+    _ensure_flusher()
+    key = (store_id, _today().isoformat())
+    with _pending_lock:
+        sketch = _pending.get(key)
+        if sketch is None:
+            sketch = _pending[key] = HyperLogLog()
+        sketch.add(visitor)
+        full = len(_pending) >= VISITOR_FLUSH_MAX_PENDING
+    if full:
+        _wake.set()
+
+def _merge(cursor, store_id, day, sketch):
+    """Merge one sketch into its stored row; False if it kept losing races"""
+    cursor.execute("""
+        INSERT INTO store_visitor_sketches (store_id, day, registers, version) VALUES (%s, %s, %s, 0)
+        ON CONFLICT (store_id, day) DO NOTHING
+    """, (store_id, day, sketch.to_text()))
+    if cursor.rowcount == 1:
+        return True
+    for _ in range(VISITOR_MERGE_ATTEMPTS):
+        cursor.execute(
+            "SELECT registers, version FROM store_visitor_sketches WHERE store_id = %s AND day = %s",
+            (store_id, day)
+        )
+        row = cursor.fetchone()
+        merged = HyperLogLog.from_text(row['registers']).merge(sketch)
+        # Compare-and-set on version: another worker's merge in between is
+        # not overwritten, we re-read and merge again
+        cursor.execute("""
+            UPDATE store_visitor_sketches SET registers = %s, version = version + 1
+            WHERE store_id = %s AND day = %s AND version = %s
+        """, (merged.to_text(), store_id, day, row['version']))
+        if cursor.rowcount == 1:
+            return True
+    return False
+
+def _prune(cursor):
+    global _last_prune
+    now = time.monotonic()
+    if now - _last_prune < VISITOR_PRUNE_SECONDS:
+        return
+    _last_prune = now
+    cutoff = _today() - datetime.timedelta(days=VISITOR_RETENTION_DAYS)
+    cursor.execute("DELETE FROM store_visitor_sketches WHERE day < %s", (cutoff.isoformat(),))
+
+def flush_visits():
+    """
+    Merge this worker's pending sketches into the database
+
+    Sketches that could not be written are kept for the next flush.
+
+    Returns:
+        int: Sketches written
+    """
+    global _pending
+    with _flush_lock:
+        with _pending_lock:
+            sketches, _pending = _pending, {}
+        if not sketches:
+            return 0
+
+        unmerged = {}
+        connection = get_db_connection()
+        try:
+            if connection is None:
+                raise RuntimeError("Database connection failed")
+            cursor = connection.cursor()
+            # Same order in every worker, so concurrent flushes cannot deadlock
+            for key in sorted(sketches):
+                if not _merge(cursor, key[0], key[1], sketches[key]):
+                    unmerged[key] = sketches[key]
+            _prune(cursor)
+            connection.commit()
+        except Exception as e:
+            print(f"Visitor sketch flush error: {e}")
+            if connection is not None:
+                connection.rollback()
+            VISITOR_SKETCH_FLUSHES.labels('error').inc()
+            _restore(sketches)
+            return 0
+        finally:
+            if connection is not None:
+                connection.close()
+        _restore(unmerged)
+        VISITOR_SKETCH_FLUSHES.labels('success').inc()
+        return len(sketches) - len(unmerged)
+
+def _restore(sketches):
+    with _pending_lock:
+        for key, sketch in sketches.items():
+            if key in _pending:
+                _pending[key].merge(sketch)
+            else:
+                _pending[key] = sketch
+
+def _flush_forever():
+    while True:
+        _wake.wait(VISITOR_FLUSH_SECONDS)
+        _wake.clear()
+        flush_visits()
+
+def _ensure_flusher():
+    global _flusher_pid
+    # Threads do not survive fork(), so each worker starts its own
+    if _flusher_pid != os.getpid():
+        with _flush_lock:
+            if _flusher_pid != os.getpid():
+                threading.Thread(target=_flush_forever, name='store-visitors', daemon=True).start()
+                _flusher_pid = os.getpid()
+
+def unique_visitors(cursor, store_id):
+    """
+    Approximate distinct visitors of a store, merged across days
+
+    Args:
+        cursor: Database cursor
+        store_id (int): Store
+
+    Returns:
+        dict: Counts for each of VISITOR_WINDOWS (today, last 7 and 30 days)
+    """
+    today = _today()
+    since = today - datetime.timedelta(days=max(VISITOR_WINDOWS.values()) - 1)
+    cursor.execute(
+        "SELECT day, registers FROM store_visitor_sketches WHERE store_id = %s AND day >= %s",
+        (store_id, since.isoformat())
+    )
+    sketches = {}
+    for row in cursor.fetchall():
+        day = row['day'] if isinstance(row['day'], datetime.date) else datetime.date.fromisoformat(row['day'])
+        sketches[day] = HyperLogLog.from_text(row['registers'])
+
+    counts = {}
+    for window, days in VISITOR_WINDOWS.items():
+        merged = HyperLogLog()
+        for day, sketch in sketches.items():
+            if (today - day).days < days:
+                merged.merge(sketch)
+        counts[window] = merged.count()
+    return counts
+
+def cached_unique_visitors(store_id):
+    """
+    unique_visitors() for a store page, from worker memory when recent
+
+    On a miss the sketches are read on a connection of their own, so a
+    failure here never touches the caller's transaction.
+
+    Returns:
+        dict: The counts, or None if they could not be read
+    """
+    now = time.monotonic()
+    cached = _counts.get(store_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    connection = get_db_connection(read_only=True)
+    if not connection:
+        return None
+    try:
+        counts = unique_visitors(connection.cursor(), store_id)
+    except Exception as e:
+        print(f"Unique visitor count error: {e}")
+        return None
+    finally:
+        connection.close()
+    if len(_counts) >= VISITOR_COUNT_CACHE_MAX:
+        _counts.clear()
+    _counts[store_id] = (now + VISITOR_COUNT_CACHE_SECONDS, counts)
+    return counts
+
+def counts_visitors(id_arg):
+    """
+    Decorator counting the signed-in visitors of a store view
+
+    Put it above any caching decorator so cache hits are counted too.
+
+    Args:
+        id_arg (str): View argument holding the store id
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if request.method == 'GET' and response.status_code == 200:
+                payload = verify_jwt_token(request)
+                if payload:
+                    record_visit(kwargs[id_arg], payload['user_id'])
+            return response
+        return wrapper
+    return decorator
+
+atexit.register(flush_visits)
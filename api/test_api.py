@@ -2,6 +2,7 @@
 """
 Test script for Bayt AlSudani API endpoints
 Usage: python test_api.py
+For load testing and latency percentiles see benchmark.py
 """
 
 import requests
@@ -12,7 +13,7 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Configuration
-BASE_URL = "http://localhost:5000"
+BASE_URL = os.environ.get('API_BASE_URL', 'http://localhost:5000')
 JWT_TOKEN = None  # Will be set after login
 HEADERS = {
     'Content-Type': 'application/json'
@@ -132,6 +133,152 @@ def test_get_stores():
     except Exception as e:
         print(f"Error: {e}")
 
+def auth_headers(token=None):
+    """Bearer headers for the JWT from test_login (or another token)"""
+    return {
+        'Authorization': f'Bearer {token or JWT_TOKEN}',
+        'Content-Type': 'application/json'
+    }
+
+def test_product_cursor():
+    """Test keyset pagination: the next page starts after the last row of the first"""
+    print("\n=== Testing Product Cursor Pagination ===")
+    if not JWT_TOKEN:
+        print("No JWT token available. Skipping cursor test.")
+        return
+    
+    try:
+        params = {'sort': 'price_asc', 'limit': 3}
+        first = requests.get(f"{BASE_URL}/api/products", headers=auth_headers(), params=params).json()
+        print(f"Page 1 ids: {[p['id'] for p in first.get('data', [])]}, next: {first.get('next')}")
+        if not first.get('next'):
+            print("Fewer products than one page. Skipping page 2.")
+            return
+        
+        second = requests.get(f"{BASE_URL}/api/products", headers=auth_headers(),
+                              params={**params, 'cursor': first['next']}).json()
+        print(f"Page 2 ids: {[p['id'] for p in second.get('data', [])]}")
+        overlap = {p['id'] for p in first['data']} & {p['id'] for p in second.get('data', [])}
+        print(f"Pages overlap: {bool(overlap)} (expected False)")
+        
+        response = requests.get(f"{BASE_URL}/api/products", headers=auth_headers(),
+                                params={**params, 'cursor': 'not-a-cursor'})
+        print(f"Invalid cursor status: {response.status_code} (expected 400)")
+    except Exception as e:
+        print(f"Error: {e}")
+
+def test_sync():
+    """Test sync tokens: a delta sync returns only changes and tombstones"""
+    print("\n=== Testing Catalog Sync ===")
+    if not JWT_TOKEN:
+        print("No JWT token available. Skipping sync test.")
+        return
+    
+    try:
+        full = requests.get(f"{BASE_URL}/api/sync", headers=auth_headers()).json()
+        print(f"Full sync: full={full.get('full')}, count={full.get('count')}, token={full.get('token')}")
+        if not full.get('token'):
+            print("No change log on this backend (full syncs only). Skipping delta sync.")
+            return
+        
+        # One change after the token
+        requests.post(f"{BASE_URL}/api/stores", headers=auth_headers(), json={
+            "name": "Sync Test Store",
+            "description": "Created between two syncs",
+            "ownerId": 1,
+            "category": "Electronics"
+        })
+        
+        delta = requests.get(f"{BASE_URL}/api/sync", headers=auth_headers(),
+                             params={'since': full['token']}).json()
+        print(f"Delta sync: full={delta.get('full')} (expected False), "
+              f"changed={ {table: len(rows) for table, rows in delta.get('data', {}).items()} }, "
+              f"tombstones={delta.get('deleted')}")
+        
+        response = requests.get(f"{BASE_URL}/api/sync", headers=auth_headers(), params={'since': 'garbage'})
+        print(f"Invalid token status: {response.status_code} (expected 400)")
+    except Exception as e:
+        print(f"Error: {e}")
+
+def test_batch():
+    """Test POST /api/batch: id lookups in request order and a filtered list"""
+    print("\n=== Testing Batch Reads ===")
+    if not JWT_TOKEN:
+        print("No JWT token available. Skipping batch test.")
+        return
+    
+    data = {
+        "queries": [
+            {"resource": "stores", "ids": [2, 1, 999999]},
+            {"resource": "products", "filters": {"min_price": 0}, "sort": "price_asc", "limit": 2}
+        ]
+    }
+    
+    try:
+        response = requests.post(f"{BASE_URL}/api/batch", headers=auth_headers(), json=data)
+        print(f"Status: {response.status_code}")
+        for result in response.json().get('data', []):
+            print(f"{result['resource']}: ids={[row['id'] for row in result['data']]}, "
+                  f"missing={result.get('missing')}, next={result.get('next')}")
+        
+        response = requests.post(f"{BASE_URL}/api/batch", headers=auth_headers(), json={
+            "queries": [{"resource": "products", "filters": {"min_price": "abc"}}]
+        })
+        print(f"Invalid filter status: {response.status_code} (expected 400): {response.json().get('message')}")
+    except Exception as e:
+        print(f"Error: {e}")
+
+def test_follow_and_feed():
+    """Test following a store, reading the feed and unfollowing"""
+    print("\n=== Testing Store Follows and Feed ===")
+    if not JWT_TOKEN:
+        print("No JWT token available. Skipping follow/feed test.")
+        return
+    
+    store_id = 1
+    try:
+        response = requests.post(f"{BASE_URL}/api/stores/{store_id}/follow", headers=auth_headers())
+        print(f"Follow status: {response.status_code}: {response.json().get('message')}")
+        
+        feed = requests.get(f"{BASE_URL}/api/feed", headers=auth_headers(), params={'limit': 5}).json()
+        print(f"Feed: count={feed.get('count')}, store ids={ {row['store_id'] for row in feed.get('data', [])} }, "
+              f"next={feed.get('next')}")
+        
+        response = requests.delete(f"{BASE_URL}/api/stores/{store_id}/follow", headers=auth_headers())
+        print(f"Unfollow status: {response.status_code}: {response.json().get('message')}")
+        response = requests.delete(f"{BASE_URL}/api/stores/{store_id}/follow", headers=auth_headers())
+        print(f"Second unfollow status: {response.status_code} (expected 404)")
+    except Exception as e:
+        print(f"Error: {e}")
+
+def test_primary_pin():
+    """Test that a read-your-writes pin is not accepted as a bearer token"""
+    print("\n=== Testing Read-Your-Writes Pin ===")
+    if not JWT_TOKEN:
+        print("No JWT token available. Skipping pin test.")
+        return
+    
+    try:
+        response = requests.post(f"{BASE_URL}/api/stores", headers=auth_headers(), json={
+            "name": "Pin Test Store",
+            "description": "A write that pins reads to the primary",
+            "ownerId": 1,
+            "category": "Electronics"
+        })
+        pin = response.headers.get('X-Primary-Pin')
+        if not pin:
+            print("No pin returned (no DATABASE_REPLICA_URLS configured). Skipping.")
+            return
+        
+        response = requests.get(f"{BASE_URL}/api/stores", headers=auth_headers(pin))
+        print(f"Pin as bearer token status: {response.status_code} (expected 401)")
+        
+        response = requests.get(f"{BASE_URL}/api/stores",
+                                headers={**auth_headers(), 'X-Primary-Pin': pin})
+        print(f"Pin with own JWT status: {response.status_code} (expected 200)")
+    except Exception as e:
+        print(f"Error: {e}")
+
 def run_all_tests():
     """Run all API tests"""
     print("Starting Bayt AlSudani API Tests...")
@@ -147,6 +294,11 @@ def run_all_tests():
     test_register()
     test_create_store()
     test_get_stores()
+    test_product_cursor()
+    test_sync()
+    test_batch()
+    test_follow_and_feed()
+    test_primary_pin()
     
     print("\n" + "=" * 50)
     print("API Tests Completed!")
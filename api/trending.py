@@ -0,0 +1,319 @@
+import os
+import threading
+import time
+from db_config import get_db_connection
+
+# Trending products and stores. trending_scores holds one exponentially
+# decayed score per item, stored relative to a fixed epoch: activity at time
+# t adds weight * 2^((t - epoch) / half_life), so existing scores never need
+# to be decayed; an item's current score is its stored one times
+# 2^(-(now - epoch) / half_life). Every TRENDING_REFRESH_SECONDS one worker
+# adds the activity since the previous refresh (view deltas of the products
+# flushed since then, new listings past per-table id watermarks). Ranking
+# within one half-life is an index scan on the stored score.
+TRENDING_REFRESH_SECONDS = float(os.environ.get('TRENDING_REFRESH_SECONDS', '60'))
+# A score halves after this long without new activity
+TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', '24'))
+# Points per view, and per new listing (to the listing and its store)
+TRENDING_VIEW_WEIGHT = float(os.environ.get('TRENDING_VIEW_WEIGHT', '1'))
+TRENDING_LISTING_WEIGHT = float(os.environ.get('TRENDING_LISTING_WEIGHT', '5'))
+TRENDING_PAGE_SIZE = 20
+TRENDING_MAX_PAGE_SIZE = 100
+# Stored scores grow by 2 per half-life since the epoch; once they have grown
+# this much the epoch moves to now, the one pass that rewrites every score
+TRENDING_REBASE_DOUBLINGS = 256
+# Products flushed this long before the previous refresh are looked at
+# again, for flushes whose transaction was still open when it ran; a full
+# pass over product_views every TRENDING_VIEW_SWEEP_SECONDS catches the rest
+TRENDING_VIEW_LAG_SECONDS = 300
+TRENDING_VIEW_SWEEP_SECONDS = 3600
+
+LISTING_TABLES = ('products', 'services', 'jobs', 'announcements')
+
+def _per_category(name):
+    # "category:value,category:value"
+    values = {}
+    for item in os.environ.get(name, '').split(','):
+        if ':' in item:
+            category, value = item.rsplit(':', 1)
+            values[category.strip()] = float(value)
+    return values
+
+# Per-category tuning: TRENDING_CATEGORY_HALF_LIFE_HOURS="electronics:6,food:12"
+# makes fast-moving categories cool down sooner, TRENDING_CATEGORY_WEIGHTS
+# scales all activity in a category
+TRENDING_CATEGORY_HALF_LIFE_HOURS = _per_category('TRENDING_CATEGORY_HALF_LIFE_HOURS')
+TRENDING_CATEGORY_WEIGHTS = _per_category('TRENDING_CATEGORY_WEIGHTS')
+
+TRENDING_PRODUCTS = """
+    SELECT p.*, s.name AS store_name, t.score AS trending_score
+    FROM trending_scores t
+    JOIN products p ON p.id = t.item_id
+    LEFT JOIN stores s ON p.store_id = s.id
+    WHERE t.kind = 'product' AND t.score > 0 AND p.is_active = TRUE{category}
+    ORDER BY t.score DESC LIMIT %s
+"""
+
+TRENDING_STORES = """
+    SELECT s.*, t.score AS trending_score
+    FROM trending_scores t
+    JOIN stores s ON s.id = t.item_id
+    WHERE t.kind = 'store' AND t.score > 0 AND s.is_active = TRUE{category}
+    ORDER BY t.score DESC LIMIT %s
+"""
+
+_UPSERT = """
+    ON CONFLICT (kind, item_id) DO UPDATE SET
+        score = trending_scores.score + EXCLUDED.score,
+        category = EXCLUDED.category
+"""
+
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+def _by_category(column, values, default):
+    """SQL expression (and its params) picking a value by category"""
+    if not values:
+        return "%s", [default]
+    cases = " ".join(["WHEN %s THEN %s"] * len(values))
+    params = [value for item in values.items() for value in item]
+    return f"CASE {column} {cases} ELSE %s END", params + [default]
+
+def _half_life(category):
+    return TRENDING_CATEGORY_HALF_LIFE_HOURS.get(category, TRENDING_HALF_LIFE_HOURS)
+
+def _growth(epoch, now):
+    # 2^((now - epoch) / half_life) per category, and for all other categories
+    hours = (now - epoch) / 3600
+    return (
+        {category: 2.0 ** (hours / half_life) for category, half_life in TRENDING_CATEGORY_HALF_LIFE_HOURS.items()},
+        2.0 ** (hours / TRENDING_HALF_LIFE_HOURS)
+    )
+
+def _points(column, epoch, now):
+    """SQL factor (and its params) turning activity now into stored score"""
+    weight, weight_params = _by_category(column, TRENDING_CATEGORY_WEIGHTS, 1.0)
+    growth, growth_params = _by_category(column, *_growth(epoch, now))
+    return f"{weight} * {growth}", weight_params + growth_params
+
+def _top_ids(cursor):
+    top = {}
+    for table in ('stores',) + LISTING_TABLES:
+        cursor.execute(f"SELECT MAX(id) AS top FROM {table}")
+        top[table] = cursor.fetchone()['top'] or 0
+    return top
+
+def _add_views(cursor, epoch, now, flushed_since):
+    # Views counted since the last refresh: product_views minus the total
+    # already scored (views_seen), for the products flushed since
+    # `flushed_since` (all of them when None). Stores first, while the
+    # deltas still show.
+    recent, recent_params = ("", []) if flushed_since is None else ("AND v.flushed_at >= %s", [flushed_since])
+    points, points_params = _points('s.category', epoch, now)
+    cursor.execute(f"""
+        INSERT INTO trending_scores (kind, item_id, category, score)
+        SELECT 'store', s.id, s.category, SUM(v.views - COALESCE(t.views_seen, 0)) * %s * {points}
+        FROM product_views v
+        JOIN products p ON p.id = v.product_id
+        JOIN stores s ON s.id = p.store_id
+        LEFT JOIN trending_scores t ON t.kind = 'product' AND t.item_id = v.product_id
+        WHERE v.views > COALESCE(t.views_seen, 0) {recent}
+        GROUP BY s.id, s.category
+        {_UPSERT}
+    """, [TRENDING_VIEW_WEIGHT] + points_params + recent_params)
+
+    points, points_params = _points('p.category', epoch, now)
+    cursor.execute(f"""
+        INSERT INTO trending_scores (kind, item_id, category, score, views_seen)
+        SELECT 'product', p.id, p.category, (v.views - COALESCE(t.views_seen, 0)) * %s * {points}, v.views
+        FROM product_views v
+        JOIN products p ON p.id = v.product_id
+        LEFT JOIN trending_scores t ON t.kind = 'product' AND t.item_id = v.product_id
+        WHERE v.views > COALESCE(t.views_seen, 0) {recent}
+        {_UPSERT}, views_seen = EXCLUDED.views_seen
+    """, [TRENDING_VIEW_WEIGHT] + points_params + recent_params)
+
+def _add_listings(cursor, seen, top, epoch, now):
+    # Listings created since the last refresh, by id: (seen, top]
+    points, points_params = _points('p.category', epoch, now)
+    cursor.execute(f"""
+        INSERT INTO trending_scores (kind, item_id, category, score)
+        SELECT 'product', p.id, p.category, %s * {points}
+        FROM products p
+        WHERE p.id > %s AND p.id <= %s
+        {_UPSERT}
+    """, [TRENDING_LISTING_WEIGHT] + points_params + [seen['products'], top['products']])
+
+    # A new store counts as its own first listing
+    listings = " UNION ALL ".join(
+        [f"SELECT store_id FROM {table} WHERE id > %s AND id <= %s" for table in LISTING_TABLES]
+        + ["SELECT id AS store_id FROM stores WHERE id > %s AND id <= %s"]
+    )
+    ranges = [value for table in LISTING_TABLES + ('stores',) for value in (seen[table], top[table])]
+    points, points_params = _points('s.category', epoch, now)
+    cursor.execute(f"""
+        INSERT INTO trending_scores (kind, item_id, category, score)
+        SELECT 'store', s.id, s.category, COUNT(*) * %s * {points}
+        FROM ({listings}) l
+        JOIN stores s ON s.id = l.store_id
+        WHERE s.is_active = TRUE
+        GROUP BY s.id, s.category
+        {_UPSERT}
+    """, [TRENDING_LISTING_WEIGHT] + points_params + ranges)
+
+def _rebase(cursor, epoch, now):
+    # Scores become their values as of now, relative to a new epoch `now`
+    hours = (now - epoch) / 3600
+    decay = {category: 2.0 ** (-hours / half_life) for category, half_life in TRENDING_CATEGORY_HALF_LIFE_HOURS.items()}
+    factor, factor_params = _by_category('category', decay, 2.0 ** (-hours / TRENDING_HALF_LIFE_HOURS))
+    cursor.execute(f"UPDATE trending_scores SET score = score * {factor}", factor_params)
+    cursor.execute("UPDATE trending_state SET value = %s WHERE name = 'epoch'", (now,))
+
+def _set_state(cursor, state, name, value):
+    if name in state:
+        cursor.execute("UPDATE trending_state SET value = %s WHERE name = %s", (value, name))
+    else:
+        cursor.execute("INSERT INTO trending_state (name, value) VALUES (%s, %s)", (name, value))
+
+def refresh_trending(now=None):
+    """
+    Add the activity since the last refresh to the scores
+
+    Workers race for each refresh; a compare-and-set on the stored refresh
+    time lets exactly one of them apply it, so activity is never counted
+    twice.
+
+    Returns:
+        float: Unix time the next refresh is due
+    """
+    now = now or time.time()
+    connection = get_db_connection()
+    if not connection:
+        raise RuntimeError("Database connection failed")
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "INSERT INTO trending_state (name, value) VALUES ('refreshed_at', %s) ON CONFLICT (name) DO NOTHING",
+            (now,)
+        )
+        if cursor.rowcount == 1:
+            # First refresh ever: activity counts from here on
+            for name, value in list(_top_ids(cursor).items()) + [('epoch', now), ('swept_at', now)]:
+                cursor.execute("INSERT INTO trending_state (name, value) VALUES (%s, %s)", (name, value))
+            cursor.execute("""
+                INSERT INTO trending_scores (kind, item_id, category, score, views_seen)
+                SELECT 'product', p.id, p.category, 0, v.views
+                FROM product_views v JOIN products p ON p.id = v.product_id
+                WHERE v.views > 0
+                ON CONFLICT (kind, item_id) DO NOTHING
+            """)
+            connection.commit()
+            return now + TRENDING_REFRESH_SECONDS
+
+        cursor.execute("SELECT name, value FROM trending_state")
+        state = {row['name']: row['value'] for row in cursor.fetchall()}
+        previous = state['refreshed_at']
+        if now < previous + TRENDING_REFRESH_SECONDS:
+            connection.rollback()
+            return previous + TRENDING_REFRESH_SECONDS
+
+        cursor.execute(
+            "UPDATE trending_state SET value = %s WHERE name = 'refreshed_at' AND value = %s",
+            (now, previous)
+        )
+        if cursor.rowcount != 1:
+            # Another worker got there first
+            connection.rollback()
+            return now + TRENDING_REFRESH_SECONDS
+
+        # Scores written before epochs existed were decayed to the last refresh
+        epoch = state.get('epoch', previous)
+        if 'epoch' not in state:
+            _set_state(cursor, state, 'epoch', epoch)
+        half_lives = [TRENDING_HALF_LIFE_HOURS] + list(TRENDING_CATEGORY_HALF_LIFE_HOURS.values())
+        if (now - epoch) / 3600 / min(half_lives) > TRENDING_REBASE_DOUBLINGS:
+            _rebase(cursor, epoch, now)
+            epoch = now
+
+        flushed_since = previous - TRENDING_VIEW_LAG_SECONDS
+        if now - state.get('swept_at', 0) >= TRENDING_VIEW_SWEEP_SECONDS:
+            flushed_since = None
+            _set_state(cursor, state, 'swept_at', now)
+
+        top = _top_ids(cursor)
+        seen = {table: int(state.get(table, 0)) for table in top}
+        _add_views(cursor, epoch, now, flushed_since)
+        _add_listings(cursor, seen, top, epoch, now)
+        for table, value in top.items():
+            cursor.execute("UPDATE trending_state SET value = %s WHERE name = %s", (value, table))
+        connection.commit()
+        return now + TRENDING_REFRESH_SECONDS
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def _refresh_forever():
+    while True:
+        try:
+            due = refresh_trending()
+        except Exception as e:
+            print(f"Trending refresh error: {e}")
+            due = time.time() + TRENDING_REFRESH_SECONDS
+        time.sleep(max(1.0, due - time.time()))
+
+def start_trending():
+    """Start this worker's trending refresher (threads do not survive fork())"""
+    global _refresher_pid
+    if _refresher_pid != os.getpid():
+        with _refresher_lock:
+            if _refresher_pid != os.getpid():
+                threading.Thread(target=_refresh_forever, name='trending', daemon=True).start()
+                _refresher_pid = os.getpid()
+
+def read_trending(cursor, kind, category=None, limit=TRENDING_PAGE_SIZE, now=None):
+    """
+    Top items by trending score, as of now
+
+    Stored scores only rank items of the same half-life, so without a
+    category each half-life group (every category with its own, and all
+    others) is read by score and the groups merged.
+
+    Args:
+        cursor: Database cursor
+        kind (str): 'products' or 'stores'
+        category (str): Only items of this category
+        limit (int): Number of items
+        now (float): Unix time to score as of; defaults to the current time
+
+    Returns:
+        list: Rows with their trending_score, highest first
+    """
+    now = now or time.time()
+    cursor.execute("SELECT name, value FROM trending_state WHERE name IN ('epoch', 'refreshed_at')")
+    state = {row['name']: row['value'] for row in cursor.fetchall()}
+    epoch = state.get('epoch', state.get('refreshed_at', now))
+
+    query, alias = (TRENDING_PRODUCTS, 'p') if kind == 'products' else (TRENDING_STORES, 's')
+    if category:
+        groups = [(f" AND t.category = %s AND {alias}.category = %s", [category, category])]
+    else:
+        special = list(TRENDING_CATEGORY_HALF_LIFE_HOURS)
+        groups = [(" AND t.category = %s", [name]) for name in special]
+        if special:
+            placeholders = ", ".join(["%s"] * len(special))
+            groups.append((f" AND (t.category IS NULL OR t.category NOT IN ({placeholders}))", special))
+        else:
+            groups.append(("", []))
+
+    rows = []
+    for condition, params in groups:
+        cursor.execute(query.format(category=condition), params + [limit])
+        for row in cursor.fetchall():
+            row = dict(row)
+            row['trending_score'] *= 2.0 ** (-(now - epoch) / 3600 / _half_life(row['category']))
+            rows.append(row)
+    rows.sort(key=lambda row: -row['trending_score'])
+    return rows[:limit]
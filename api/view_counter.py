@@ -0,0 +1,142 @@
+import atexit
+import functools
+import os
+import threading
+import time
+from flask import make_response, request
+from db_config import get_db_connection
+from metrics import VIEW_COUNTER_DROPPED, VIEW_COUNTER_FLUSHES
+
+# Product views are counted in worker memory and added to product_views in
+# one batched upsert every VIEW_FLUSH_SECONDS, so a product read never
+# writes. A crash loses at most one interval of this worker's views; a
+# graceful exit flushes (atexit, and gunicorn's worker_exit hook).
+VIEW_FLUSH_SECONDS = float(os.environ.get('VIEW_FLUSH_SECONDS', '10'))
+# Flush early once this many distinct products are pending
+VIEW_FLUSH_MAX_PENDING = int(os.environ.get('VIEW_FLUSH_MAX_PENDING', '5000'))
+# While the database is unreachable, keep at most this many products' counts
+VIEW_MAX_RETAINED = int(os.environ.get('VIEW_MAX_RETAINED', '50000'))
+VIEW_FLUSH_BATCH = 500
+
+_pending = {}
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wake = threading.Event()
+_flusher_pid = None
+
+def _upsert_sql(rows):
+    values = ", ".join(["(%s, %s, %s)"] * rows)
+    return f"""
+        INSERT INTO product_views (product_id, views, flushed_at) VALUES {values}
+        ON CONFLICT (product_id) DO UPDATE SET
+            views = product_views.views + EXCLUDED.views,
+            flushed_at = EXCLUDED.flushed_at
+    """
+
+TRACK_PRODUCT = "INSERT INTO product_views (product_id, views) VALUES (%s, 0) ON CONFLICT (product_id) DO NOTHING"
+
+def track_product(cursor, product_id):
+    """
+    Give a new product its product_views row, in the caller's transaction
+
+    sort=popular joins product_views, so a product without a row would be
+    missing from it until its first view is flushed.
+    """
+    cursor.execute(TRACK_PRODUCT, (product_id,))
+
+def record_view(product_id):
+    """Count one view of a product"""
+    _ensure_flusher()
+    with _pending_lock:
+        _pending[product_id] = _pending.get(product_id, 0) + 1
+        full = len(_pending) >= VIEW_FLUSH_MAX_PENDING
+    if full:
+        _wake.set()
+
+def flush_views():
+    """
+    Write this worker's pending counts to the database
+
+    Counts that could not be written are kept for the next flush.
+
+    Returns:
+        int: Products whose counts were written
+    """
+    global _pending
+    with _flush_lock:
+        with _pending_lock:
+            counts, _pending = _pending, {}
+        if not counts:
+            return 0
+
+        # Same order in every worker, so concurrent flushes cannot deadlock
+        items = sorted(counts.items())
+        flushed_at = time.time()
+        connection = get_db_connection()
+        try:
+            if connection is None:
+                raise RuntimeError("Database connection failed")
+            cursor = connection.cursor()
+            for start in range(0, len(items), VIEW_FLUSH_BATCH):
+                batch = items[start:start + VIEW_FLUSH_BATCH]
+                cursor.execute(
+                    _upsert_sql(len(batch)),
+                    [value for product_id, views in batch for value in (product_id, views, flushed_at)]
+                )
+            connection.commit()
+        except Exception as e:
+            print(f"View counter flush error: {e}")
+            if connection is not None:
+                connection.rollback()
+            VIEW_COUNTER_FLUSHES.labels('error').inc()
+            _restore(counts)
+            return 0
+        finally:
+            if connection is not None:
+                connection.close()
+        VIEW_COUNTER_FLUSHES.labels('success').inc()
+        return len(items)
+
+def _restore(counts):
+    with _pending_lock:
+        for product_id, views in counts.items():
+            if product_id in _pending or len(_pending) < VIEW_MAX_RETAINED:
+                _pending[product_id] = _pending.get(product_id, 0) + views
+            else:
+                VIEW_COUNTER_DROPPED.inc(views)
+
+def _flush_forever():
+    while True:
+        _wake.wait(VIEW_FLUSH_SECONDS)
+        _wake.clear()
+        flush_views()
+
+def _ensure_flusher():
+    global _flusher_pid
+    # Threads do not survive fork(), so each worker starts its own
+    if _flusher_pid != os.getpid():
+        with _flush_lock:
+            if _flusher_pid != os.getpid():
+                threading.Thread(target=_flush_forever, name='view-counter', daemon=True).start()
+                _flusher_pid = os.getpid()
+
+def counts_views(id_arg):
+    """
+    Decorator counting successful GETs of a product view
+
+    Put it above any caching decorator so cache hits are counted too.
+
+    Args:
+        id_arg (str): View argument holding the product id
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            response = make_response(view(*args, **kwargs))
+            if request.method == 'GET' and response.status_code == 200:
+                record_view(kwargs[id_arg])
+            return response
+        return wrapper
+    return decorator
+
+atexit.register(flush_views)
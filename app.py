@@ -1,159 +1,52 @@
 import os
 import sys
-import psycopg2
-import psycopg2.extras
-import bcrypt
-import jwt
-from datetime import datetime, timedelta
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Shared modules live in api/ and are imported flat, as in api/main_server.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from announcement_stream import stream_announcements
+from auth_utils import hash_password, check_password
+from batch_reads import batch_read
+from catalog_snapshot import active_rows, start_catalog_snapshot
+from db_config import get_db_connection, init_database
+from delta_sync import start_change_log_pruner, sync_catalog
+from facets import start_facets
+from follow_store import follow_store, unfollow_store
+from get_facets import get_facets
+from get_feed import get_feed
+from get_trending import get_trending
+from marketplace import (
+    ADMIN_STORE_FIELDS, API_DOCS, INSERT_PRODUCT, INSERT_STORE, INSERT_USER, LIST_ACTIVE, LOGIN_FIELDS,
+    PRODUCT_FIELDS, PRODUCT_UPDATE, PRODUCT_WITH_OWNER, REGISTER_FIELDS, STORE_FIELDS,
+    STORE_UPDATE, USER_EXISTS, can_manage, has_required_fields, login_response, product_values,
+    store_values, user_values, verify_jwt_token
+)
+from metrics import init_metrics
+from prepared_statements import STORE_OWNER, USER_BY_USERNAME, execute_prepared
+from readiness import readiness_check
+from response_cache import cached
+from single_flight import coalesce
+from trending import start_trending
+from view_counter import track_product
+
 # Create Flask app
 app = Flask(__name__)
 CORS(app)
 app.secret_key = os.environ.get("SESSION_SECRET", "fallback-secret-key")
-
-# Database connection
-def get_db_connection():
-    """Get PostgreSQL database connection"""
-    try:
-        connection = psycopg2.connect(
-            os.environ.get('DATABASE_URL'),
-            cursor_factory=psycopg2.extras.DictCursor
-        )
-        return connection
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        return None
-
-def init_database():
-    """Initialize database tables"""
-    connection = get_db_connection()
-    if not connection:
-        return False
-    
-    try:
-        cursor = connection.cursor()
-        
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                full_name VARCHAR(100),
-                phone VARCHAR(20),
-                role VARCHAR(20) DEFAULT 'customer',
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create stores table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS stores (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                description TEXT,
-                owner_id INTEGER REFERENCES users(id),
-                category VARCHAR(50),
-                address TEXT,
-                phone VARCHAR(20),
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create products table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS products (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                description TEXT,
-                price DECIMAL(10,2),
-                store_id INTEGER REFERENCES stores(id),
-                category VARCHAR(50),
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create services table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS services (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                description TEXT,
-                price DECIMAL(10,2),
-                store_id INTEGER REFERENCES stores(id),
-                category VARCHAR(50),
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create jobs table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS jobs (
-                id SERIAL PRIMARY KEY,
-                title VARCHAR(100) NOT NULL,
-                description TEXT,
-                salary DECIMAL(10,2),
-                location VARCHAR(100),
-                store_id INTEGER REFERENCES stores(id),
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Create announcements table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS announcements (
-                id SERIAL PRIMARY KEY,
-                title VARCHAR(100) NOT NULL,
-                content TEXT NOT NULL,
-                store_id INTEGER REFERENCES stores(id),
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        return True
-        
-    except Exception as e:
-        print(f"Database initialization error: {e}")
-        connection.rollback()
-        cursor.close()
-        connection.close()
-        return False
-
-# JWT utilities
-def encode_jwt(payload):
-    """Encode a JWT token with the given payload"""
-    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-    payload['exp'] = datetime.utcnow() + timedelta(hours=24)
-    return jwt.encode(payload, secret, algorithm='HS256')
-
-def decode_jwt(token):
-    """Decode a JWT token and return the payload"""
-    secret = os.environ.get('JWT_SECRET', 'default-secret-key')
-    try:
-        return jwt.decode(token, secret, algorithms=['HS256'])
-    except jwt.ExpiredSignatureError:
-        raise Exception("Token has expired")
-    except jwt.InvalidTokenError:
-        raise Exception("Invalid token")
+init_metrics(app)
 
 # Initialize database
 with app.app_context():
     init_database()
+start_catalog_snapshot()
+start_trending()
+start_facets()
+start_change_log_pruner()
 
 # Routes
 @app.route('/', methods=['GET'])
@@ -174,45 +67,37 @@ def health_check():
         "version": "1.0.0"
     })
 
+# Readiness probe: unlike /api/health, fails when the database is unusable
+app.add_url_rule('/api/ready', 'readiness_check', readiness_check, methods=['GET'])
+
+# Incremental sync for the mobile app and PWA
+app.add_url_rule('/api/sync', 'sync_catalog', sync_catalog, methods=['GET'])
+
+# Push new and expired announcements instead of polling /api/announcements
+app.add_url_rule('/api/announcements/stream', 'stream_announcements', stream_announcements, methods=['GET'])
+
+# Store follows and personal announcement feeds
+app.add_url_rule('/api/stores/<int:store_id>/follow', 'follow_store', follow_store, methods=['POST'])
+app.add_url_rule('/api/stores/<int:store_id>/follow', 'unfollow_store', unfollow_store, methods=['DELETE'])
+app.add_url_rule('/api/feed', 'get_feed', get_feed, methods=['GET'])
+
+# Trending products and stores, from scores refreshed in the background
+app.add_url_rule('/api/trending', 'get_trending', get_trending, methods=['GET'])
+
+# Facet counts for the product and service filters, from a per-worker index
+app.add_url_rule('/api/facets', 'get_facets', get_facets, methods=['GET'])
+
+# Many small reads in one request, id lookups coalesced per table (admin dashboard)
+app.add_url_rule('/api/batch', 'batch_read', batch_read, methods=['POST'])
+
 @app.route('/api/docs', methods=['GET'])
 def api_docs():
-    return jsonify({
-        "status": "success",
-        "message": "Bayt AlSudani API Documentation",
-        "endpoints": {
-            "authentication": {
-                "POST /api/login": "User login",
-                "POST /api/register": "User registration"
-            },
-            "stores": {
-                "GET /api/stores": "Get all stores",
-                "GET /api/stores/<id>": "Get store by ID",
-                "POST /api/stores": "Create new store"
-            },
-            "products": {
-                "GET /api/products": "Get all products",
-                "GET /api/products/<id>": "Get product by ID",
-                "POST /api/products": "Create new product"
-            },
-            "services": {
-                "GET /api/services": "Get all services",
-                "POST /api/services": "Create new service"
-            },
-            "jobs": {
-                "GET /api/jobs": "Get all jobs",
-                "POST /api/jobs": "Create new job"
-            },
-            "announcements": {
-                "GET /api/announcements": "Get all announcements",
-                "POST /api/announcements": "Create new announcement"
-            }
-        }
-    })
+    return jsonify(API_DOCS)
 
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json()
-    if not data or not data.get('username') or not data.get('password'):
+    if not has_required_fields(data, LOGIN_FIELDS):
         return jsonify({"status": "error", "message": "Username and password required"}), 400
     
     connection = get_db_connection()
@@ -221,31 +106,11 @@ def login():
     
     try:
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = %s", (data['username'],))
+        USER_BY_USERNAME.execute(cursor, (data['username'],))
         user = cursor.fetchone()
         
-        if user and bcrypt.checkpw(data['password'].encode('utf-8'), user['password_hash'].encode('utf-8')):
-            # Generate JWT token
-            payload = {
-                'user_id': user['id'],
-                'username': user['username'],
-                'role': user['role'],
-                'full_name': user['full_name']
-            }
-            token = encode_jwt(payload)
-            
-            return jsonify({
-                "status": "success",
-                "message": "Login successful",
-                "token": token,
-                "user": {
-                    "id": user['id'],
-                    "username": user['username'],
-                    "email": user['email'],
-                    "fullName": user['full_name'],
-                    "role": user['role']
-                }
-            })
+        if user and check_password(data['password'], user['password_hash']):
+            return jsonify(login_response(user))
         else:
             return jsonify({"status": "error", "message": "Invalid credentials"}), 401
             
@@ -258,9 +123,8 @@ def login():
 @app.route('/api/register', methods=['POST'])
 def register():
     data = request.get_json()
-    required_fields = ['username', 'email', 'password', 'fullName']
     
-    if not data or not all(data.get(field) for field in required_fields):
+    if not has_required_fields(data, REGISTER_FIELDS):
         return jsonify({"status": "error", "message": "All fields are required"}), 400
     
     connection = get_db_connection()
@@ -271,20 +135,15 @@ def register():
         cursor = connection.cursor()
         
         # Check if user already exists
-        cursor.execute("SELECT id FROM users WHERE username = %s OR email = %s", 
-                      (data['username'], data['email']))
+        cursor.execute(USER_EXISTS, (data['username'], data['email']))
         if cursor.fetchone():
             return jsonify({"status": "error", "message": "User already exists"}), 400
         
         # Hash password
-        password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = hash_password(data['password'])
         
         # Insert new user
-        cursor.execute("""
-            INSERT INTO users (username, email, password_hash, full_name, phone, role)
-            VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
-        """, (data['username'], data['email'], password_hash, 
-              data['fullName'], data.get('phone', ''), data.get('role', 'customer')))
+        cursor.execute(INSERT_USER, user_values(data, password_hash))
         
         user_id = cursor.fetchone()['id']
         connection.commit()
@@ -303,14 +162,21 @@ def register():
         connection.close()
 
 @app.route('/api/stores', methods=['GET'])
+@cached(['stores'])
+@coalesce()
 def get_stores():
-    connection = get_db_connection()
+    # Served from worker memory when the catalog snapshot is enabled
+    stores = active_rows('stores')
+    if stores is not None:
+        return jsonify({"status": "success", "stores": stores})
+    
+    connection = get_db_connection(read_only=True)
     if not connection:
         return jsonify({"status": "error", "message": "Database connection failed"}), 500
     
     try:
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM stores WHERE is_active = TRUE ORDER BY created_at DESC")
+        cursor.execute(LIST_ACTIVE['stores'])
         stores = cursor.fetchall()
         
         return jsonify({
@@ -325,14 +191,21 @@ def get_stores():
         connection.close()
 
 @app.route('/api/products', methods=['GET'])
+@cached(['products'])
+@coalesce()
 def get_products():
-    connection = get_db_connection()
+    # Served from worker memory when the catalog snapshot is enabled
+    products = active_rows('products')
+    if products is not None:
+        return jsonify({"status": "success", "products": products})
+    
+    connection = get_db_connection(read_only=True)
     if not connection:
         return jsonify({"status": "error", "message": "Database connection failed"}), 500
     
     try:
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM products WHERE is_active = TRUE ORDER BY created_at DESC")
+        cursor.execute(LIST_ACTIVE['products'])
         products = cursor.fetchall()
         
         return jsonify({
@@ -347,14 +220,21 @@ def get_products():
         connection.close()
 
 @app.route('/api/services', methods=['GET'])
+@cached(['services'])
+@coalesce()
 def get_services():
-    connection = get_db_connection()
+    # Served from worker memory when the catalog snapshot is enabled
+    services = active_rows('services')
+    if services is not None:
+        return jsonify({"status": "success", "services": services})
+    
+    connection = get_db_connection(read_only=True)
     if not connection:
         return jsonify({"status": "error", "message": "Database connection failed"}), 500
     
     try:
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM services WHERE is_active = TRUE ORDER BY created_at DESC")
+        cursor.execute(LIST_ACTIVE['services'])
         services = cursor.fetchall()
         
         return jsonify({
@@ -369,14 +249,21 @@ def get_services():
         connection.close()
 
 @app.route('/api/jobs', methods=['GET'])
+@cached(['jobs'])
+@coalesce()
 def get_jobs():
-    connection = get_db_connection()
+    # Served from worker memory when the catalog snapshot is enabled
+    jobs = active_rows('jobs')
+    if jobs is not None:
+        return jsonify({"status": "success", "jobs": jobs})
+    
+    connection = get_db_connection(read_only=True)
     if not connection:
         return jsonify({"status": "error", "message": "Database connection failed"}), 500
     
     try:
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM jobs WHERE is_active = TRUE ORDER BY created_at DESC")
+        cursor.execute(LIST_ACTIVE['jobs'])
         jobs = cursor.fetchall()
         
         return jsonify({
@@ -391,14 +278,21 @@ def get_jobs():
         connection.close()
 
 @app.route('/api/announcements', methods=['GET'])
+@cached(['announcements'])
+@coalesce()
 def get_announcements():
-    connection = get_db_connection()
+    # Served from worker memory when the catalog snapshot is enabled
+    announcements = active_rows('announcements')
+    if announcements is not None:
+        return jsonify({"status": "success", "announcements": announcements})
+    
+    connection = get_db_connection(read_only=True)
     if not connection:
         return jsonify({"status": "error", "message": "Database connection failed"}), 500
     
     try:
         cursor = connection.cursor()
-        cursor.execute("SELECT * FROM announcements WHERE is_active = TRUE ORDER BY created_at DESC")
+        cursor.execute(LIST_ACTIVE['announcements'])
         announcements = cursor.fetchall()
         
         return jsonify({
@@ -412,20 +306,6 @@ def get_announcements():
         cursor.close()
         connection.close()
 
-# JWT Authentication Helper
-def verify_jwt_token(request):
-    """Verify JWT token from request headers"""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None
-    
-    token = auth_header.split(' ')[1]
-    try:
-        payload = decode_jwt(token)
-        return payload
-    except Exception:
-        return None
-
 # Edit endpoints for store owners
 @app.route('/api/stores/<int:store_id>', methods=['PUT'])
 def edit_store(store_id):
@@ -446,42 +326,21 @@ def edit_store(store_id):
         cursor = connection.cursor()
         
         # Check if user owns this store or is admin
-        cursor.execute("SELECT owner_id FROM stores WHERE id = %s", (store_id,))
+        STORE_OWNER.execute(cursor, (store_id,))
         store = cursor.fetchone()
         
         if not store:
             return jsonify({"status": "error", "message": "Store not found"}), 404
         
-        if store['owner_id'] != user_payload['user_id'] and user_payload['role'] != 'admin':
+        if not can_manage(store['owner_id'], user_payload):
             return jsonify({"status": "error", "message": "Unauthorized"}), 403
         
         # Update store
-        update_fields = []
-        update_values = []
-        
-        if 'name' in data:
-            update_fields.append("name = %s")
-            update_values.append(data['name'])
-        if 'description' in data:
-            update_fields.append("description = %s")
-            update_values.append(data['description'])
-        if 'category' in data:
-            update_fields.append("category = %s")
-            update_values.append(data['category'])
-        if 'address' in data:
-            update_fields.append("address = %s")
-            update_values.append(data['address'])
-        if 'phone' in data:
-            update_fields.append("phone = %s")
-            update_values.append(data['phone'])
-        
-        if not update_fields:
+        query, update_values = STORE_UPDATE.build(data, store_id)
+        if not query:
             return jsonify({"status": "error", "message": "No valid fields to update"}), 400
         
-        update_values.append(store_id)
-        query = f"UPDATE stores SET {', '.join(update_fields)} WHERE id = %s RETURNING *"
-        
-        cursor.execute(query, update_values)
+        execute_prepared(cursor, query, update_values)
         updated_store = cursor.fetchone()
         connection.commit()
         
@@ -517,44 +376,21 @@ def edit_product(product_id):
         cursor = connection.cursor()
         
         # Check if user owns this product (through store ownership) or is admin
-        cursor.execute("""
-            SELECT p.*, s.owner_id 
-            FROM products p 
-            JOIN stores s ON p.store_id = s.id 
-            WHERE p.id = %s
-        """, (product_id,))
+        cursor.execute(PRODUCT_WITH_OWNER, (product_id,))
         product = cursor.fetchone()
         
         if not product:
             return jsonify({"status": "error", "message": "Product not found"}), 404
         
-        if product['owner_id'] != user_payload['user_id'] and user_payload['role'] != 'admin':
+        if not can_manage(product['owner_id'], user_payload):
             return jsonify({"status": "error", "message": "Unauthorized"}), 403
         
         # Update product
-        update_fields = []
-        update_values = []
-        
-        if 'name' in data:
-            update_fields.append("name = %s")
-            update_values.append(data['name'])
-        if 'description' in data:
-            update_fields.append("description = %s")
-            update_values.append(data['description'])
-        if 'price' in data:
-            update_fields.append("price = %s")
-            update_values.append(float(data['price']))
-        if 'category' in data:
-            update_fields.append("category = %s")
-            update_values.append(data['category'])
-        
-        if not update_fields:
+        query, update_values = PRODUCT_UPDATE.build(data, product_id)
+        if not query:
             return jsonify({"status": "error", "message": "No valid fields to update"}), 400
         
-        update_values.append(product_id)
-        query = f"UPDATE products SET {', '.join(update_fields)} WHERE id = %s RETURNING *"
-        
-        cursor.execute(query, update_values)
+        execute_prepared(cursor, query, update_values)
         updated_product = cursor.fetchone()
         connection.commit()
         
@@ -580,9 +416,8 @@ def admin_create_store():
         return jsonify({"status": "error", "message": "Admin access required"}), 403
     
     data = request.get_json()
-    required_fields = ['name', 'ownerId', 'category']
     
-    if not data or not all(data.get(field) for field in required_fields):
+    if not has_required_fields(data, ADMIN_STORE_FIELDS):
         return jsonify({"status": "error", "message": "Missing required fields"}), 400
     
     connection = get_db_connection()
@@ -593,11 +428,7 @@ def admin_create_store():
         cursor = connection.cursor()
         
         # Insert new store
-        cursor.execute("""
-            INSERT INTO stores (name, description, owner_id, category, address, phone)
-            VALUES (%s, %s, %s, %s, %s, %s) RETURNING *
-        """, (data['name'], data.get('description', ''), data['ownerId'], 
-              data['category'], data.get('address', ''), data.get('phone', '')))
+        cursor.execute(INSERT_STORE, store_values(data, data['ownerId']))
         
         new_store = cursor.fetchone()
         connection.commit()
@@ -623,9 +454,8 @@ def admin_create_product():
         return jsonify({"status": "error", "message": "Admin access required"}), 403
     
     data = request.get_json()
-    required_fields = ['name', 'price', 'storeId', 'category']
     
-    if not data or not all(data.get(field) for field in required_fields):
+    if not has_required_fields(data, PRODUCT_FIELDS):
         return jsonify({"status": "error", "message": "Missing required fields"}), 400
     
     connection = get_db_connection()
@@ -636,13 +466,10 @@ def admin_create_product():
         cursor = connection.cursor()
         
         # Insert new product
-        cursor.execute("""
-            INSERT INTO products (name, description, price, store_id, category)
-            VALUES (%s, %s, %s, %s, %s) RETURNING *
-        """, (data['name'], data.get('description', ''), float(data['price']), 
-              int(data['storeId']), data['category']))
+        cursor.execute(INSERT_PRODUCT, product_values(data))
         
         new_product = cursor.fetchone()
+        track_product(cursor, new_product['id'])
         connection.commit()
         
         return jsonify({
@@ -666,9 +493,8 @@ def create_store():
         return jsonify({"status": "error", "message": "Authentication required"}), 401
     
     data = request.get_json()
-    required_fields = ['name', 'category']
     
-    if not data or not all(data.get(field) for field in required_fields):
+    if not has_required_fields(data, STORE_FIELDS):
         return jsonify({"status": "error", "message": "Missing required fields"}), 400
     
     connection = get_db_connection()
@@ -679,11 +505,7 @@ def create_store():
         cursor = connection.cursor()
         
         # Insert new store
-        cursor.execute("""
-            INSERT INTO stores (name, description, owner_id, category, address, phone)
-            VALUES (%s, %s, %s, %s, %s, %s) RETURNING *
-        """, (data['name'], data.get('description', ''), user_payload['user_id'], 
-              data['category'], data.get('address', ''), data.get('phone', '')))
+        cursor.execute(INSERT_STORE, store_values(data, user_payload['user_id']))
         
         new_store = cursor.fetchone()
         connection.commit()
@@ -708,9 +530,8 @@ def create_product():
         return jsonify({"status": "error", "message": "Authentication required"}), 401
     
     data = request.get_json()
-    required_fields = ['name', 'price', 'storeId', 'category']
     
-    if not data or not all(data.get(field) for field in required_fields):
+    if not has_required_fields(data, PRODUCT_FIELDS):
         return jsonify({"status": "error", "message": "Missing required fields"}), 400
     
     connection = get_db_connection()
@@ -721,23 +542,20 @@ def create_product():
         cursor = connection.cursor()
         
         # Check if user owns the store or is admin
-        cursor.execute("SELECT owner_id FROM stores WHERE id = %s", (int(data['storeId']),))
+        STORE_OWNER.execute(cursor, (int(data['storeId']),))
         store = cursor.fetchone()
         
         if not store:
             return jsonify({"status": "error", "message": "Store not found"}), 404
         
-        if store['owner_id'] != user_payload['user_id'] and user_payload['role'] != 'admin':
+        if not can_manage(store['owner_id'], user_payload):
             return jsonify({"status": "error", "message": "Unauthorized"}), 403
         
         # Insert new product
-        cursor.execute("""
-            INSERT INTO products (name, description, price, store_id, category)
-            VALUES (%s, %s, %s, %s, %s) RETURNING *
-        """, (data['name'], data.get('description', ''), float(data['price']), 
-              int(data['storeId']), data['category']))
+        cursor.execute(INSERT_PRODUCT, product_values(data))
         
         new_product = cursor.fetchone()
+        track_product(cursor, new_product['id'])
         connection.commit()
         
         return jsonify({
@@ -0,0 +1,532 @@
+import asyncio
+import os
+import sys
+from functools import lru_cache
+import asyncpg
+from dotenv import load_dotenv
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+
+load_dotenv()
+
+# Shared modules live in api/ and are imported flat, as in app.py
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from announcement_stream import (
+    ANNOUNCEMENT_EVENT_ROW, SSE_CLIENT_BUFFER, SSE_KEEPALIVE_SECONDS, SSE_RETRY_MS,
+    StreamClient, describe_change, format_event, wants
+)
+from auth_utils import hash_password, check_password
+from batch_reads import run_batch
+from change_events import CHANGE_LISTENER_RETRY_SECONDS, parse_change
+from db_config import CHANGE_CHANNEL, get_pool, init_database
+from delta_sync import start_change_log_pruner, sync_changes
+from facets import start_facets
+from follow_store import set_following
+from get_facets import facet_counts
+from get_feed import feed_page
+from get_trending import trending_page
+from marketplace import (
+    ADMIN_STORE_FIELDS, API_DOCS, INSERT_PRODUCT, INSERT_STORE, INSERT_USER, LIST_ACTIVE, LOGIN_FIELDS,
+    PRODUCT_FIELDS, PRODUCT_UPDATE, PRODUCT_WITH_OWNER, REGISTER_FIELDS, STORE_FIELDS,
+    STORE_UPDATE, USER_EXISTS, can_manage, has_required_fields, login_response, product_values,
+    store_values, user_values, verify_jwt_token
+)
+from prepared_statements import STORE_OWNER, USER_BY_USERNAME, to_positional
+from trending import start_trending
+from view_counter import TRACK_PRODUCT
+
+# ASGI variant of app.py: same routes and response bodies, but every request
+# awaits the database on an asyncpg pool instead of holding a worker thread.
+# The follow, feed, trending, facet, sync and batch routes reuse their api/
+# modules (several dependent statements each) on the sync pool, in a thread.
+# Run with: uvicorn asgi_app:app --port 5000
+ASYNC_DB_POOL_MIN = int(os.environ.get('ASYNC_DB_POOL_MIN', '2'))
+ASYNC_DB_POOL_MAX = int(os.environ.get('ASYNC_DB_POOL_MAX', '20'))
+ASYNC_DB_COMMAND_TIMEOUT = float(os.environ.get('ASYNC_DB_COMMAND_TIMEOUT', '30'))
+
+app = cors(Quart(__name__))
+app.secret_key = os.environ.get("SESSION_SECRET", "fallback-secret-key")
+
+_db_pool = None
+_listen_task = None
+# Connected announcement stream clients (StreamClient over an asyncio.Queue)
+_stream_clients = set()
+
+@lru_cache(maxsize=256)
+def pg(query):
+    """The shared %s-style SQL with asyncpg's $n placeholders"""
+    return to_positional(query)[0]
+
+@app.before_serving
+async def open_db_pool():
+    global _db_pool
+    # Same schema bootstrap as app.py, on the sync driver, before serving
+    await asyncio.to_thread(init_database)
+    await asyncio.to_thread(get_pool().closeall)
+    # Same background refreshers as app.py, on the sync pool
+    start_trending()
+    start_facets()
+    start_change_log_pruner()
+    # asyncpg prepares and caches every statement per connection by itself
+    _db_pool = await asyncpg.create_pool(
+        os.environ.get('DATABASE_URL'),
+        min_size=ASYNC_DB_POOL_MIN,
+        max_size=ASYNC_DB_POOL_MAX,
+        command_timeout=ASYNC_DB_COMMAND_TIMEOUT
+    )
+    global _listen_task
+    _listen_task = asyncio.create_task(listen_for_changes())
+
+@app.after_serving
+async def close_db_pool():
+    if _listen_task is not None:
+        _listen_task.cancel()
+    if _db_pool is not None:
+        await _db_pool.close()
+
+async def listen_for_changes():
+    """One LISTEN connection per process feeding the announcement stream"""
+    while True:
+        closed = asyncio.Event()
+        try:
+            connection = await asyncpg.connect(os.environ.get('DATABASE_URL'))
+            connection.add_termination_listener(lambda _: closed.set())
+            await connection.add_listener(CHANGE_CHANNEL, on_change)
+            try:
+                await closed.wait()
+            finally:
+                await connection.close()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Change listener error: {e}")
+        await asyncio.sleep(CHANGE_LISTENER_RETRY_SECONDS)
+
+def on_change(connection, pid, channel, payload):
+    change = parse_change(payload)
+    if change and change[0] == 'announcements' and _stream_clients:
+        asyncio.create_task(publish_announcement(change[1]))
+
+async def publish_announcement(row_id):
+    """Fetch a changed announcement once and queue its event for every matching client"""
+    try:
+        async with _db_pool.acquire() as connection:
+            row = await connection.fetchrow(pg(ANNOUNCEMENT_EVENT_ROW), row_id)
+    except Exception as e:
+        print(f"Announcement stream error: {e}")
+        return
+    event, data = describe_change(row_id, dict(row) if row else None)
+    message = format_event(event, data)
+    for client in list(_stream_clients):
+        if client.dropped or not wants(client.filters, data):
+            continue
+        try:
+            client.events.put_nowait(message)
+        except asyncio.QueueFull:
+            # Too far behind: its stream ends and EventSource reconnects
+            client.dropped = True
+
+def db_error():
+    return jsonify({"status": "error", "message": "Database connection failed"}), 500
+
+def unauthorized():
+    """auth_utils.require_jwt_auth's response"""
+    return jsonify({"status": "error", "message": "Unauthorized: Invalid or missing JWT token"}), 401
+
+async def acquire():
+    try:
+        return await _db_pool.acquire()
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        return None
+
+# Routes
+@app.route('/', methods=['GET'])
+async def home():
+    return jsonify({
+        "status": "success",
+        "message": "Welcome to Bayt AlSudani - Sudanese Marketplace API",
+        "version": "1.0.0",
+        "documentation": "/api/docs",
+        "health": "/api/health"
+    })
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({
+        "status": "success",
+        "message": "Bayt AlSudani API is running",
+        "version": "1.0.0"
+    })
+
+@app.route('/api/ready', methods=['GET'])
+async def readiness_check():
+    try:
+        async with _db_pool.acquire() as connection:
+            version = await connection.fetchval("SELECT MAX(version) FROM schema_migrations")
+    except Exception as e:
+        return jsonify({"status": "error", "message": "Bayt AlSudani API is not ready", "error": str(e)}), 503
+    return jsonify({
+        "status": "success",
+        "message": "Bayt AlSudani API is ready",
+        "checks": {
+            "database": {
+                "status": "success",
+                "schema_version": version,
+                "pool": {"size": _db_pool.get_size(), "idle": _db_pool.get_idle_size(), "max": _db_pool.get_max_size()}
+            }
+        }
+    })
+
+@app.route('/api/docs', methods=['GET'])
+async def api_docs():
+    return jsonify(API_DOCS)
+
+@app.route('/api/announcements/stream', methods=['GET'])
+async def stream_announcements():
+    store_id = request.args.get('storeId', type=int)
+    category = request.args.get('category') or None
+    client = StreamClient((store_id, category), asyncio.Queue(SSE_CLIENT_BUFFER))
+
+    async def generate():
+        _stream_clients.add(client)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n".encode('utf-8')
+            while not client.dropped:
+                try:
+                    message = await asyncio.wait_for(client.events.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    message = ": keepalive\n\n"
+                yield message.encode('utf-8')
+        finally:
+            _stream_clients.discard(client)
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Streams stay open indefinitely
+    response.timeout = None
+    return response
+
+# Incremental sync for the mobile app and PWA
+@app.route('/api/sync', methods=['GET'])
+async def sync_catalog():
+    if not verify_jwt_token(request):
+        return unauthorized()
+
+    body, status = await asyncio.to_thread(sync_changes, request.args.get('since'))
+    return jsonify(body), status
+
+# Store follows and personal announcement feeds
+@app.route('/api/stores/<int:store_id>/follow', methods=['POST'])
+async def follow_store(store_id):
+    user_payload = verify_jwt_token(request)
+    if not user_payload:
+        return unauthorized()
+
+    body, status = await asyncio.to_thread(set_following, user_payload['user_id'], store_id, True)
+    return jsonify(body), status
+
+@app.route('/api/stores/<int:store_id>/follow', methods=['DELETE'])
+async def unfollow_store(store_id):
+    user_payload = verify_jwt_token(request)
+    if not user_payload:
+        return unauthorized()
+
+    body, status = await asyncio.to_thread(set_following, user_payload['user_id'], store_id, False)
+    return jsonify(body), status
+
+@app.route('/api/feed', methods=['GET'])
+async def get_feed():
+    user_payload = verify_jwt_token(request)
+    if not user_payload:
+        return unauthorized()
+
+    body, status = await asyncio.to_thread(feed_page, user_payload['user_id'], request.args)
+    return jsonify(body), status
+
+# Trending products and stores, from scores refreshed in the background
+@app.route('/api/trending', methods=['GET'])
+async def get_trending():
+    if not verify_jwt_token(request):
+        return unauthorized()
+
+    body, status = await asyncio.to_thread(trending_page, request.args)
+    return jsonify(body), status
+
+# Facet counts for the product and service filters, from a per-worker index
+@app.route('/api/facets', methods=['GET'])
+async def get_facets():
+    if not verify_jwt_token(request):
+        return unauthorized()
+
+    # Waits for the index's first build
+    body, status = await asyncio.to_thread(facet_counts, request.args)
+    return jsonify(body), status
+
+# Many small reads in one request, id lookups coalesced per table (admin dashboard)
+@app.route('/api/batch', methods=['POST'])
+async def batch_read():
+    if not verify_jwt_token(request):
+        return unauthorized()
+
+    data = await request.get_json(silent=True) or {}
+    body, status = await asyncio.to_thread(run_batch, data)
+    return jsonify(body), status
+
+@app.route('/api/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    if not has_required_fields(data, LOGIN_FIELDS):
+        return jsonify({"status": "error", "message": "Username and password required"}), 400
+
+    connection = await acquire()
+    if not connection:
+        return db_error()
+
+    try:
+        user = await connection.fetchrow(pg(USER_BY_USERNAME.sql), data['username'])
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        await _db_pool.release(connection)
+
+    # bcrypt is CPU-bound; keep it off the event loop
+    if user and await asyncio.to_thread(check_password, data['password'], user['password_hash']):
+        return jsonify(login_response(dict(user)))
+    return jsonify({"status": "error", "message": "Invalid credentials"}), 401
+
+@app.route('/api/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    if not has_required_fields(data, REGISTER_FIELDS):
+        return jsonify({"status": "error", "message": "All fields are required"}), 400
+
+    connection = await acquire()
+    if not connection:
+        return db_error()
+
+    try:
+        if await connection.fetchrow(pg(USER_EXISTS), data['username'], data['email']):
+            return jsonify({"status": "error", "message": "User already exists"}), 400
+
+        password_hash = await asyncio.to_thread(hash_password, data['password'])
+        user_id = await connection.fetchval(pg(INSERT_USER), *user_values(data, password_hash))
+
+        return jsonify({
+            "status": "success",
+            "message": "User registered successfully",
+            "user_id": user_id
+        })
+
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        await _db_pool.release(connection)
+
+async def list_active(resource):
+    connection = await acquire()
+    if not connection:
+        return db_error()
+
+    try:
+        rows = await connection.fetch(pg(LIST_ACTIVE[resource]))
+        return jsonify({
+            "status": "success",
+            resource: [dict(row) for row in rows]
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        await _db_pool.release(connection)
+
+@app.route('/api/stores', methods=['GET'])
+async def get_stores():
+    return await list_active('stores')
+
+@app.route('/api/products', methods=['GET'])
+async def get_products():
+    return await list_active('products')
+
+@app.route('/api/services', methods=['GET'])
+async def get_services():
+    return await list_active('services')
+
+@app.route('/api/jobs', methods=['GET'])
+async def get_jobs():
+    return await list_active('jobs')
+
+@app.route('/api/announcements', methods=['GET'])
+async def get_announcements():
+    return await list_active('announcements')
+
+async def update_owned(user_payload, owner_query, row_id, update, data, key, not_found, updated):
+    """Check ownership of a store or product, then apply a partial update"""
+    connection = await acquire()
+    if not connection:
+        return db_error()
+
+    try:
+        async with connection.transaction():
+            row = await connection.fetchrow(pg(owner_query), row_id)
+            if not row:
+                return jsonify({"status": "error", "message": not_found}), 404
+            if not can_manage(row['owner_id'], user_payload):
+                return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+            query, values = update.build(data, row_id)
+            if not query:
+                return jsonify({"status": "error", "message": "No valid fields to update"}), 400
+            result = await connection.fetchrow(pg(query), *values)
+
+        return jsonify({
+            "status": "success",
+            "message": updated,
+            key: dict(result)
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        await _db_pool.release(connection)
+
+# Edit endpoints for store owners
+@app.route('/api/stores/<int:store_id>', methods=['PUT'])
+async def edit_store(store_id):
+    user_payload = verify_jwt_token(request)
+    if not user_payload:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+
+    data = await request.get_json()
+    if not data:
+        return jsonify({"status": "error", "message": "No data provided"}), 400
+
+    return await update_owned(user_payload, STORE_OWNER.sql, store_id, STORE_UPDATE, data,
+                              'store', "Store not found", "Store updated successfully")
+
+@app.route('/api/products/<int:product_id>', methods=['PUT'])
+async def edit_product(product_id):
+    user_payload = verify_jwt_token(request)
+    if not user_payload:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+
+    data = await request.get_json()
+    if not data:
+        return jsonify({"status": "error", "message": "No data provided"}), 400
+
+    return await update_owned(user_payload, PRODUCT_WITH_OWNER, product_id, PRODUCT_UPDATE, data,
+                              'product', "Product not found", "Product updated successfully")
+
+async def insert_row(query, values, key, message):
+    connection = await acquire()
+    if not connection:
+        return db_error()
+
+    try:
+        row = await connection.fetchrow(pg(query), *values)
+        return jsonify({
+            "status": "success",
+            "message": message,
+            key: dict(row)
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        await _db_pool.release(connection)
+
+async def insert_product(connection, data):
+    """INSERT_PRODUCT and the product's product_views row (see view_counter.track_product), in one transaction"""
+    async with connection.transaction():
+        product = await connection.fetchrow(pg(INSERT_PRODUCT), *product_values(data))
+        await connection.execute(pg(TRACK_PRODUCT), product['id'])
+    return product
+
+# Admin endpoints for creation/approval
+@app.route('/api/admin/stores', methods=['POST'])
+async def admin_create_store():
+    user_payload = verify_jwt_token(request)
+    if not user_payload or user_payload['role'] != 'admin':
+        return jsonify({"status": "error", "message": "Admin access required"}), 403
+
+    data = await request.get_json()
+    if not has_required_fields(data, ADMIN_STORE_FIELDS):
+        return jsonify({"status": "error", "message": "Missing required fields"}), 400
+
+    return await insert_row(INSERT_STORE, store_values(data, data['ownerId']),
+                            'store', "Store created successfully by admin")
+
+@app.route('/api/admin/products', methods=['POST'])
+async def admin_create_product():
+    user_payload = verify_jwt_token(request)
+    if not user_payload or user_payload['role'] != 'admin':
+        return jsonify({"status": "error", "message": "Admin access required"}), 403
+
+    data = await request.get_json()
+    if not has_required_fields(data, PRODUCT_FIELDS):
+        return jsonify({"status": "error", "message": "Missing required fields"}), 400
+
+    connection = await acquire()
+    if not connection:
+        return db_error()
+
+    try:
+        product = await insert_product(connection, data)
+        return jsonify({
+            "status": "success",
+            "message": "Product created successfully by admin",
+            "product": dict(product)
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        await _db_pool.release(connection)
+
+# Store/Product creation endpoints (with approval)
+@app.route('/api/stores', methods=['POST'])
+async def create_store():
+    user_payload = verify_jwt_token(request)
+    if not user_payload:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+
+    data = await request.get_json()
+    if not has_required_fields(data, STORE_FIELDS):
+        return jsonify({"status": "error", "message": "Missing required fields"}), 400
+
+    return await insert_row(INSERT_STORE, store_values(data, user_payload['user_id']),
+                            'store', "Store created successfully")
+
+@app.route('/api/products', methods=['POST'])
+async def create_product():
+    user_payload = verify_jwt_token(request)
+    if not user_payload:
+        return jsonify({"status": "error", "message": "Authentication required"}), 401
+
+    data = await request.get_json()
+    if not has_required_fields(data, PRODUCT_FIELDS):
+        return jsonify({"status": "error", "message": "Missing required fields"}), 400
+
+    connection = await acquire()
+    if not connection:
+        return db_error()
+
+    try:
+        store = await connection.fetchrow(pg(STORE_OWNER.sql), int(data['storeId']))
+        if not store:
+            return jsonify({"status": "error", "message": "Store not found"}), 404
+        if not can_manage(store['owner_id'], user_payload):
+            return jsonify({"status": "error", "message": "Unauthorized"}), 403
+
+        product = await insert_product(connection, data)
+        return jsonify({
+            "status": "success",
+            "message": "Product created successfully",
+            "product": dict(product)
+        })
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    finally:
+        await _db_pool.release(connection)
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 5000))
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+
+# Workers write their Prometheus samples here so /metrics can aggregate
+# counters across processes. Must be set before the app is imported.
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'baytalsudani-metrics')
+)
+os.makedirs(metrics_dir, exist_ok=True)
+
+# Worker model. 'sync' handles one request per worker at a time; 'gevent'
+# multiplexes up to worker_connections requests per worker, with psycopg2
+# waiting cooperatively and bcrypt on a thread pool (api/gevent_support.py):
+#   GUNICORN_WORKER_CLASS=gevent gunicorn --bind 0.0.0.0:5000 main:app
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', '1000'))
+    # The app must be imported after gevent patches the worker, so its locks
+    # and the connection pool's condition variable are greenlet-aware
+    preload_app = False
+    # Requests now queue on the connection pool rather than on the listen
+    # socket, so let them wait as long as the worker timeout would
+    os.environ.setdefault('DB_POOL_TIMEOUT', '30')
+
+# Lock and body files of cross-worker request coalescing (api/single_flight.py)
+flights_dir = os.environ.get('SINGLE_FLIGHT_DIR', os.path.join(tempfile.gettempdir(), 'baytalsudani-flights'))
+
+def on_starting(server):
+    # Start every run from empty files; stale samples would be summed in
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+    shutil.rmtree(flights_dir, ignore_errors=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+def worker_exit(server, worker):
+    # Write the worker's buffered product views and store visitors before it goes away
+    from store_visitors import flush_visits
+    from view_counter import flush_views
+    flush_views()
+    flush_visits()
\ No newline at end of file